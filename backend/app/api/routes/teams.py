@@ -12,6 +12,7 @@ from app.api.deps import (
     SessionDep,
 )
 from app.core.graph.build import generator
+from app.core.graph.rag.answer_cache import invalidate_team_answers
 from app.models import (
     Member,
     Message,
@@ -156,10 +157,16 @@ def update_team(
     if not current_user.is_superuser and (team.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
     update_dict = team_in.model_dump(exclude_unset=True)
+    # Stop keeping answers of teams that opt out
+    opted_out = (
+        team.enable_answer_cache and update_dict.get("enable_answer_cache") is False
+    )
     team.sqlmodel_update(update_dict)
     session.add(team)
     session.commit()
     session.refresh(team)
+    if opted_out:
+        invalidate_team_answers(id)
     return team
 
 
@@ -173,8 +180,11 @@ def delete_team(session: SessionDep, current_user: CurrentUser, id: int) -> Any:
         raise HTTPException(status_code=404, detail="Team not found")
     if not current_user.is_superuser and (team.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
+    answer_cache_enabled = team.enable_answer_cache
     session.delete(team)
     session.commit()
+    if answer_cache_enabled:
+        invalidate_team_answers(id)
     return Message(message="Team deleted successfully")
 
 
@@ -1,10 +1,13 @@
+import hashlib
 import os
-import shutil
+import tarfile
 import uuid
+import zipfile
+from collections.abc import Iterator
 from datetime import datetime
-from tempfile import NamedTemporaryFile
-from typing import IO, Annotated, Any
+from typing import IO, Annotated, Any, NamedTuple
 
+from celery import group
 from fastapi import (
     APIRouter,
     Depends,
@@ -15,16 +18,27 @@ from fastapi import (
     UploadFile,
 )
 from sqlalchemy import ColumnElement
-from sqlmodel import and_, func, select
+from sqlmodel import and_, col, func, select
 from starlette import status
 
 from app.api.deps import CurrentUser, SessionDep
+from app.core.celery_app import ingestion_priority
 from app.core.config import settings
+from app.core.graph.rag.ingestion import batched
+from app.core.graph.rag.qdrant import QdrantStore
+from app.core.graph.rag.qdrant_retriever import combine_modes
 from app.models import (
     Message,
+    RetrievalMode,
     Upload,
+    UploadBatch,
+    UploadBatchOut,
     UploadCreate,
     UploadOut,
+    UploadSearch,
+    UploadSearchDocument,
+    UploadSearchOut,
+    UploadSearchResult,
     UploadsOut,
     UploadStatus,
     UploadUpdate,
@@ -33,6 +47,10 @@ from app.tasks.tasks import add_upload, edit_upload, remove_upload
 
 router = APIRouter()
 
+UPLOAD_DATA_DIR = "/app/upload-data"
+RECEIVE_CHUNK_SIZE = 1024 * 1024
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
 
 async def valid_content_length(
     content_length: int = Header(..., le=settings.MAX_UPLOAD_SIZE),
@@ -40,54 +58,151 @@ async def valid_content_length(
     return content_length
 
 
-def save_file_if_within_size_limit(file: UploadFile, file_size: int) -> IO[bytes]:
+async def valid_bulk_content_length(
+    content_length: int = Header(..., le=settings.MAX_BULK_UPLOAD_SIZE),
+) -> int:
+    return content_length
+
+
+class ReceivedFile(NamedTuple):
+    """An uploaded file written to its owner's upload folder, not yet in place."""
+
+    temp_path: str
+    content_hash: str
+    size: int
+
+    def store(self, upload_id: int) -> str:
+        """
+        Move the file to its upload's path in the same folder and return the path.
+        Being on the same filesystem, the move is a rename rather than a copy. The path
+        is unique to the upload and version, as the ingestion task removes the file.
+        """
+        file_path = os.path.join(
+            os.path.dirname(self.temp_path), f"{upload_id}-{self.content_hash}.pdf"
+        )
+        os.replace(self.temp_path, file_path)
+        os.chmod(file_path, 0o775)
+        return file_path
+
+    def discard(self) -> None:
+        os.remove(self.temp_path)
+
+
+def create_temp_path(owner_id: int) -> str:
+    """
+    Path to receive a file at, in its owner's upload folder. Content addresses are per
+    owner, so that an upload never reveals whether another user has the same file.
     """
-    Check if the uploaded file size is smaller than the specified file size.
-    This is to restrict an attacker from sending a valid Content-Length header and a
-    body bigger than what the app can take.
-    If the file size exceeds the limit, raise an HTTP 413 error. Otherwise, save the file
-    to a temporary location and return the temporary file.
+    directory = os.path.join(UPLOAD_DATA_DIR, str(owner_id))
+    os.makedirs(directory, mode=0o775, exist_ok=True)
+    return os.path.join(directory, f".{uuid.uuid4()}.part")
 
-    Args:
-        file (UploadFile): The file uploaded by the user.
-        file_size (int): The file size in bytes.
+
+def check_size(size: int, file_size: int) -> None:
+    """
+    Check that a file being received is within its size limit. This is to restrict an
+    attacker from sending a valid Content-Length header and a body bigger than what the
+    app can take, or an archive whose members are bigger than they claim.
 
     Raises:
         HTTPException: If the file size exceeds the maximum allowed size.
-
-    Returns:
-        IO: A temporary file containing the uploaded data.
     """
-    # Check file size
-    real_file_size = 0
-    temp: IO[bytes] = NamedTemporaryFile(delete=False)
-    for chunk in file.file:
-        real_file_size += len(chunk)
-        if real_file_size > file_size:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Too large"
-            )
-        temp.write(chunk)
-    temp.close()
-    return temp
+    if size > file_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Too large"
+        )
 
 
-def move_upload_to_shared_folder(filename: str, temp_file_dir: str) -> str:
+def receive_file(source: IO[bytes], owner_id: int, file_size: int) -> ReceivedFile:
     """
-    Move an uploaded file to a shared folder with a unique name and set its permissions.
+    Copy an uploaded file into its owner's upload folder, hashing it as it is written.
+    Starlette has already spooled the request body, so this copies from its spool, or
+    from an archive being extracted.
 
     Args:
-        filename (str): The original name of the uploaded file.
-        temp_file_dir (str): The directory of the temporary file.
+        source (IO[bytes]): The contents of the file uploaded by the user.
+        owner_id (int): The ID of the owner of the upload.
+        file_size (int): The maximum file size in bytes.
 
-    Returns:
-        str: The new file path in the shared folder.
+    Raises:
+        HTTPException: If the file size exceeds the maximum allowed size.
     """
-    file_name = f"{uuid.uuid4()}-{filename}"
-    file_path = f"/app/upload-data/{file_name}"
-    shutil.move(temp_file_dir, file_path)
-    os.chmod(file_path, 0o775)
-    return file_path
+    temp_path = create_temp_path(owner_id)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, "wb") as temp:
+            while chunk := source.read(RECEIVE_CHUNK_SIZE):
+                size += len(chunk)
+                check_size(size, file_size)
+                digest.update(chunk)
+                temp.write(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return ReceivedFile(temp_path, digest.hexdigest(), size)
+
+
+def remove_stored_file(received_file: ReceivedFile, file_path: str | None) -> None:
+    """Remove an upload's file after its ingestion failed to be enqueued."""
+    for path in (received_file.temp_path, file_path):
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+def find_duplicate(
+    session: SessionDep, owner_id: int, content_hash: str
+) -> Upload | None:
+    """An upload of the owner with the same contents that has not failed, if any."""
+    statement = select(Upload).where(
+        Upload.owner_id == owner_id,
+        Upload.content_hash == content_hash,
+        Upload.status != UploadStatus.FAILED,
+    )
+    return session.exec(statement).first()
+
+
+def is_pdf_name(filename: str) -> bool:
+    name = os.path.basename(filename)
+    # Skips resource forks that macOS adds to archives
+    return name.lower().endswith(".pdf") and not name.startswith("._")
+
+
+def iter_pdfs(file: UploadFile) -> Iterator[tuple[str, IO[bytes]]]:
+    """
+    Yield the name and contents of each PDF in an uploaded file, which is either a PDF
+    or a zip or tar archive of PDFs. Archive members are read one at a time.
+
+    Raises:
+        HTTPException: If the file is neither a PDF nor a readable archive.
+    """
+    filename = file.filename or ""
+    lower_filename = filename.lower()
+    try:
+        if lower_filename.endswith(".zip"):
+            with zipfile.ZipFile(file.file) as zip_archive:
+                for info in zip_archive.infolist():
+                    if not info.is_dir() and is_pdf_name(info.filename):
+                        with zip_archive.open(info) as member:
+                            yield info.filename, member
+        elif lower_filename.endswith(TAR_SUFFIXES):
+            # Stream mode reads the archive sequentially, without seeking
+            with tarfile.open(fileobj=file.file, mode="r|*") as tar_archive:
+                for tar_info in tar_archive:
+                    if tar_info.isfile() and is_pdf_name(tar_info.name):
+                        tar_member = tar_archive.extractfile(tar_info)
+                        if tar_member:
+                            yield tar_info.name, tar_member
+        elif file.content_type == "application/pdf":
+            yield filename, file.file
+        else:
+            raise HTTPException(
+                status_code=400, detail=f"Invalid document type: {filename}"
+            )
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        raise HTTPException(
+            status_code=400, detail=f"Invalid archive: {filename}"
+        ) from e
 
 
 @router.get("/", response_model=UploadsOut)
@@ -118,6 +233,165 @@ def read_uploads(
     return UploadsOut(data=uploads, count=count)
 
 
+def get_upload_batch_out(session: SessionDep, batch: UploadBatch) -> UploadBatchOut:
+    uploads = session.exec(select(Upload).where(Upload.batch_id == batch.id)).all()
+    counts = dict.fromkeys(UploadStatus, 0)
+    for upload in uploads:
+        counts[upload.status] += 1
+    if counts[UploadStatus.IN_PROGRESS]:
+        batch_status = UploadStatus.IN_PROGRESS
+    elif counts[UploadStatus.FAILED]:
+        batch_status = UploadStatus.FAILED
+    else:
+        batch_status = UploadStatus.COMPLETED
+    return UploadBatchOut(
+        id=batch.id,
+        created_at=batch.created_at,
+        duplicates=batch.duplicates,
+        status=batch_status,
+        total=len(uploads),
+        in_progress=counts[UploadStatus.IN_PROGRESS],
+        completed=counts[UploadStatus.COMPLETED],
+        failed=counts[UploadStatus.FAILED],
+        uploads=uploads,
+    )
+
+
+@router.get("/batches/{id}", response_model=UploadBatchOut)
+def read_upload_batch(session: SessionDep, current_user: CurrentUser, id: int) -> Any:
+    """
+    Get the status of a bulk upload and of each of its uploads.
+    """
+    batch = session.get(UploadBatch, id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Upload batch not found")
+    if not current_user.is_superuser and batch.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return get_upload_batch_out(session, batch)
+
+
+@router.post("/batches", response_model=UploadBatchOut)
+def create_upload_batch(
+    session: SessionDep,
+    current_user: CurrentUser,
+    files: list[UploadFile],
+    chunk_size: Annotated[int, Form(ge=0)],
+    chunk_overlap: Annotated[int, Form(ge=0)],
+    description: Annotated[str, Form()] = "",
+    retrieval_mode: Annotated[RetrievalMode, Form()] = RetrievalMode.HYBRID,
+    _content_length: int = Depends(valid_bulk_content_length),
+) -> Any:
+    """
+    Create an upload for each PDF among the files, which may be PDFs or zip or tar
+    archives of PDFs. The uploads are created in a single transaction and their
+    ingestion is enqueued in groups. Poll the returned batch for their status.
+
+    Documents that the user has already uploaded, or that are repeated within the
+    batch, are skipped and counted as duplicates.
+    """
+    if current_user.id is None:
+        raise HTTPException(status_code=500, detail="Failed to retrieve user ID")
+
+    received: list[tuple[str, ReceivedFile]] = []
+    # The request's Content-Length only limits the compressed archives, so the
+    # documents extracted from them are limited in total too
+    received_size = 0
+    try:
+        for file in files:
+            for filename, contents in iter_pdfs(file):
+                if len(received) >= settings.MAX_BULK_UPLOAD_FILES:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="Too many documents",
+                    )
+                received_file = receive_file(
+                    contents,
+                    current_user.id,
+                    min(
+                        settings.MAX_UPLOAD_SIZE,
+                        settings.MAX_BULK_UPLOAD_SIZE - received_size,
+                    ),
+                )
+                received.append((os.path.basename(filename), received_file))
+                received_size += received_file.size
+        if not received:
+            raise HTTPException(status_code=400, detail="No PDF documents found")
+    except BaseException:
+        for _, received_file in received:
+            received_file.discard()
+        raise
+
+    statement = select(Upload.content_hash).where(
+        Upload.owner_id == current_user.id,
+        col(Upload.content_hash).in_(
+            {received_file.content_hash for _, received_file in received}
+        ),
+        Upload.status != UploadStatus.FAILED,
+    )
+    content_hashes = set(session.exec(statement).all())
+
+    batch = UploadBatch(owner_id=current_user.id)
+    uploads: list[Upload] = []
+    received_files: list[ReceivedFile] = []
+    for name, received_file in received:
+        if received_file.content_hash in content_hashes:
+            received_file.discard()
+            batch.duplicates += 1
+            continue
+        content_hashes.add(received_file.content_hash)
+        received_files.append(received_file)
+        uploads.append(
+            Upload.model_validate(
+                UploadCreate(
+                    name=os.path.splitext(name)[0],
+                    description=description,
+                    retrieval_mode=retrieval_mode,
+                ),
+                update={
+                    "owner_id": current_user.id,
+                    "status": UploadStatus.IN_PROGRESS,
+                    "content_hash": received_file.content_hash,
+                    "chunk_size": chunk_size,
+                    "chunk_overlap": chunk_overlap,
+                },
+            )
+        )
+
+    session.add(batch)
+    session.flush()
+    for upload in uploads:
+        upload.batch_id = batch.id
+    session.add_all(uploads)
+    # Flushing assigns the uploads their IDs without a query per upload
+    session.flush()
+    tasks = [
+        add_upload.s(
+            received_file.store(upload.id),  # type: ignore[arg-type]
+            upload.id,
+            current_user.id,
+            chunk_size,
+            chunk_overlap,
+        ).set(priority=ingestion_priority(received_file.size))
+        for upload, received_file in zip(uploads, received_files, strict=True)
+    ]
+    session.commit()
+
+    enqueued = 0
+    try:
+        for signatures in batched(tasks, settings.BULK_UPLOAD_ENQUEUE_BATCH_SIZE):
+            # A group publishes its tasks over a single connection
+            group(signatures).apply_async()
+            enqueued += len(signatures)
+    except Exception as e:
+        for upload in uploads[enqueued:]:
+            upload.status = UploadStatus.FAILED
+            session.add(upload)
+        session.commit()
+        raise HTTPException(status_code=500, detail="Failed to enqueue uploads") from e
+
+    return get_upload_batch_out(session, batch)
+
+
 @router.post("/", response_model=UploadOut)
 def create_upload(
     session: SessionDep,
@@ -127,35 +401,52 @@ def create_upload(
     file: UploadFile,
     chunk_size: Annotated[int, Form(ge=0)],
     chunk_overlap: Annotated[int, Form(ge=0)],
+    retrieval_mode: Annotated[RetrievalMode, Form()] = RetrievalMode.HYBRID,
     file_size: int = Depends(valid_content_length),
 ) -> Any:
     """Create upload"""
     if file.content_type not in ["application/pdf"]:
         raise HTTPException(status_code=400, detail="Invalid document type")
+    # To appease type-checking. This should never happen.
+    if current_user.id is None:
+        raise HTTPException(status_code=500, detail="Failed to retrieve user ID")
+
+    received_file = receive_file(file.file, current_user.id, file_size)
+    # An identical document is not ingested again
+    duplicate = find_duplicate(session, current_user.id, received_file.content_hash)
+    if duplicate:
+        received_file.discard()
+        raise HTTPException(
+            status_code=409,
+            detail=f"This document has already been uploaded as '{duplicate.name}'",
+        )
 
-    temp_file = save_file_if_within_size_limit(file, file_size)
     upload = Upload.model_validate(
-        UploadCreate(name=name, description=description),
-        update={"owner_id": current_user.id, "status": UploadStatus.IN_PROGRESS},
+        UploadCreate(name=name, description=description, retrieval_mode=retrieval_mode),
+        update={
+            "owner_id": current_user.id,
+            "status": UploadStatus.IN_PROGRESS,
+            "content_hash": received_file.content_hash,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+        },
     )
     session.add(upload)
     session.commit()
 
+    file_path = None
     try:
         # To appease type-checking. This should never happen.
-        if current_user.id is None or upload.id is None:
-            raise HTTPException(
-                status_code=500, detail="Failed to retrieve user and upload ID"
-            )
+        if upload.id is None:
+            raise HTTPException(status_code=500, detail="Failed to retrieve upload ID")
 
-        if not file.filename or not isinstance(temp_file.name, str):
-            raise HTTPException(status_code=500, detail="Failed to upload file")
-
-        file_path = move_upload_to_shared_folder(file.filename, temp_file.name)
-        add_upload.delay(
-            file_path, upload.id, current_user.id, chunk_size, chunk_overlap
+        file_path = received_file.store(upload.id)
+        add_upload.apply_async(
+            (file_path, upload.id, current_user.id, chunk_size, chunk_overlap),
+            priority=ingestion_priority(received_file.size),
         )
     except Exception as e:
+        remove_stored_file(received_file, file_path)
         session.delete(upload)
         session.commit()
         raise e
@@ -175,7 +466,10 @@ def update_upload(
     file: UploadFile | None = File(None),
     file_size: int = Depends(valid_content_length),
 ) -> Any:
-    """Update upload"""
+    """
+    Update upload. A file with the same contents as the upload's, sent with the same
+    chunk size and overlap, is not ingested again, unless the upload's ingestion failed.
+    """
     upload = session.get(Upload, id)
     if not upload:
         raise HTTPException(status_code=404, detail="Upload not found")
@@ -196,7 +490,6 @@ def update_upload(
     if file:
         if file.content_type not in ["application/pdf"]:
             raise HTTPException(status_code=400, detail="Invalid document type")
-        temp_file = save_file_if_within_size_limit(file, file_size)
         if upload.owner_id is None:
             raise HTTPException(status_code=500, detail="Failed to retrieve owner ID")
         if chunk_overlap is None or chunk_size is None:
@@ -204,23 +497,95 @@ def update_upload(
                 status_code=400,
                 detail="If file is provided, chunk size and chunk overlap must be provided.",
             )
-
-        # Set upload status to in progress
-        upload.status = UploadStatus.IN_PROGRESS
-        session.add(upload)
-        session.commit()
-
-        if not file.filename or not isinstance(temp_file.name, str):
-            raise HTTPException(status_code=500, detail="Failed to upload file")
-
-        file_path = move_upload_to_shared_folder(file.filename, temp_file.name)
-        edit_upload.delay(file_path, id, upload.owner_id, chunk_size, chunk_overlap)
+        received_file = receive_file(file.file, upload.owner_id, file_size)
+        if (
+            received_file.content_hash == upload.content_hash
+            and chunk_size == upload.chunk_size
+            and chunk_overlap == upload.chunk_overlap
+            and upload.status != UploadStatus.FAILED
+        ):
+            # Ingesting it again would store the same chunks
+            received_file.discard()
+        else:
+            previous = upload.model_dump(
+                include={"status", "content_hash", "chunk_size", "chunk_overlap"}
+            )
+            # Set upload status to in progress
+            upload.status = UploadStatus.IN_PROGRESS
+            upload.content_hash = received_file.content_hash
+            upload.chunk_size = chunk_size
+            upload.chunk_overlap = chunk_overlap
+            session.add(upload)
+            session.commit()
+
+            file_path = None
+            try:
+                file_path = received_file.store(id)
+                edit_upload.apply_async(
+                    (file_path, id, upload.owner_id, chunk_size, chunk_overlap),
+                    priority=ingestion_priority(received_file.size),
+                )
+            except Exception as e:
+                remove_stored_file(received_file, file_path)
+                upload.sqlmodel_update(previous)
+                session.add(upload)
+                session.commit()
+                raise e
 
     session.commit()
     session.refresh(upload)
     return upload
 
 
+@router.post("/search", response_model=UploadSearchOut)
+def search_uploads(
+    session: SessionDep, current_user: CurrentUser, search: UploadSearch
+) -> Any:
+    """
+    Search uploads for several queries at once. The queries are embedded in one batch
+    and searched in one request. Results are grouped per query, in query order.
+    """
+    uploads = session.exec(
+        select(Upload).where(col(Upload.id).in_(search.upload_ids))
+    ).all()
+    if len(uploads) < len(set(search.upload_ids)):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if not current_user.is_superuser and any(
+        upload.owner_id != current_user.id for upload in uploads
+    ):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    results = QdrantStore().search(
+        user_ids=sorted(
+            {upload.owner_id for upload in uploads if upload.owner_id is not None}
+        ),
+        upload_names={
+            upload.id: upload.name for upload in uploads if upload.id is not None
+        },
+        queries=search.queries,
+        config=search.retrieval,
+        mode=combine_modes(upload.retrieval_mode for upload in uploads),
+    )
+    return UploadSearchOut(
+        data=[
+            UploadSearchResult(
+                query=query,
+                documents=[
+                    UploadSearchDocument(
+                        content=document.page_content,
+                        score=document.metadata.get("score"),
+                        upload_id=document.metadata["upload_id"],
+                        source=document.metadata["source"],
+                        chunk_index=document.metadata.get("chunk_index"),
+                    )
+                    for document in documents
+                ],
+            )
+            for query, documents in zip(search.queries, results, strict=True)
+        ]
+    )
+
+
 @router.delete("/{id}")
 def delete_upload(session: SessionDep, current_user: CurrentUser, id: int) -> Message:
     upload = session.get(Upload, id)
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends
 from pydantic.networks import EmailStr
 
 from app.api.deps import get_current_active_superuser
+from app.core.graph.cache import CacheStats, get_llm_cache
 from app.models import Message
 from app.utils import generate_test_email, send_email
 
@@ -24,3 +25,15 @@ def test_email(email_to: EmailStr) -> Message:
         html_content=email_data.html_content,
     )
     return Message(message="Test email sent")
+
+
+@router.get(
+    "/llm-cache-stats/",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=CacheStats,
+)
+def llm_cache_stats() -> CacheStats:
+    """
+    Hit and miss counts of the llm response cache in this process.
+    """
+    return get_llm_cache().stats()
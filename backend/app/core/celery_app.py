@@ -1,4 +1,5 @@
 from celery import Celery
+from kombu import Queue  # type: ignore[import-untyped]
 
 from app.core.config import settings
 
@@ -6,9 +7,49 @@ celery_app = Celery(
     "worker",
     broker=settings.CELERY_BROKER_URL,
     backend=settings.CELERY_RESULT_BACKEND,
-    include=["app.tasks.tasks"],
+    include=["app.tasks.tasks", "app.tasks.worker"],
 )
 
+# Embedding work is kept apart from quick, interactive tasks, so that a backlog of
+# ingestion does not delay them. Each queue is consumed by its own workers, with their
+# own concurrency and prefetch.
+INGEST_HEAVY_QUEUE = "ingest-heavy"
+INGEST_LIGHT_QUEUE = "ingest-light"
+
 celery_app.conf.update(
     result_expires=3600,
+    task_queues=[
+        Queue(INGEST_HEAVY_QUEUE),
+        Queue(INGEST_LIGHT_QUEUE),
+    ],
+    task_default_queue=INGEST_LIGHT_QUEUE,
+    task_routes={
+        "app.tasks.tasks.add_upload": {"queue": INGEST_HEAVY_QUEUE},
+        "app.tasks.tasks.edit_upload": {"queue": INGEST_HEAVY_QUEUE},
+        "app.tasks.tasks.count_upload_part_edge_lines": {"queue": INGEST_HEAVY_QUEUE},
+        "app.tasks.tasks.fingerprint_upload_part": {"queue": INGEST_HEAVY_QUEUE},
+        "app.tasks.tasks.ingest_upload_part": {"queue": INGEST_HEAVY_QUEUE},
+        "app.tasks.tasks.fingerprint_upload": {"queue": INGEST_LIGHT_QUEUE},
+        "app.tasks.tasks.plan_upload": {"queue": INGEST_LIGHT_QUEUE},
+        "app.tasks.tasks.finish_upload": {"queue": INGEST_LIGHT_QUEUE},
+        "app.tasks.tasks.fail_upload": {"queue": INGEST_LIGHT_QUEUE},
+        "app.tasks.tasks.remove_upload": {"queue": INGEST_LIGHT_QUEUE},
+    },
+    # Redis emulates priorities with a list per priority step. 0 is the highest.
+    broker_transport_options={
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+    },
+    # Prefetched tasks skip the priority order, so workers reserve one task at a time
+    # unless their command line says otherwise
+    worker_prefetch_multiplier=1,
 )
+
+
+def ingestion_priority(file_size: int) -> int:
+    """
+    Priority of ingesting a file, so that small documents are not stuck behind giant
+    ones: 0 for files under 1 MB, then one step lower each time the size doubles.
+    """
+    return min(9, (file_size // 1_000_000).bit_length())
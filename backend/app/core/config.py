@@ -142,8 +142,31 @@ class Settings(BaseSettings):
 
     # Qdrant
     QDRANT__SERVICE__API_KEY: str
+    # "server" uses the Qdrant service at QDRANT_URL. "local" runs Qdrant's local mode
+    # in-process on QDRANT_LOCAL_PATH, or in memory if it is ":memory:". Local storage
+    # can only be opened by one process at a time, so it suits tests, benchmarks and
+    # single-process deployments.
+    QDRANT_BACKEND: Literal["server", "local"] = "server"
+    QDRANT_LOCAL_PATH: str = "/app/qdrant-local"
     QDRANT_URL: str = "http://qdrant:6334"
     QDRANT_COLLECTION: str = "uploads"
+    # Index uploads per user with Qdrant's tenant-aware indexing. Run
+    # app/qdrant_pre_start.py to migrate an existing collection.
+    QDRANT_MULTITENANT: bool = False
+    # Edges per node of the per-tenant HNSW graphs in multitenant mode
+    QDRANT_TENANT_PAYLOAD_M: int = 16
+    # Storage profile of the uploads collection, applied at creation and by
+    # app/qdrant_pre_start.py. Quantized vectors are kept in RAM and searches rescore
+    # the oversampled candidates with the original vectors.
+    QDRANT_QUANTIZATION: Literal["none", "scalar", "binary"] = "none"
+    QDRANT_QUANTIZATION_ALWAYS_RAM: bool = True
+    QDRANT_QUANTIZATION_RESCORE: bool = True
+    QDRANT_QUANTIZATION_OVERSAMPLING: float = 2.0
+    # Keep original vectors and the sparse index on disk instead of in RAM
+    QDRANT_VECTORS_ON_DISK: bool = False
+    # HNSW graph parameters. If empty, Qdrant's defaults are used.
+    QDRANT_HNSW_M: int | None = None
+    QDRANT_HNSW_EF_CONSTRUCT: int | None = None
 
     # Celery
     CELERY_BROKER_URL: str
@@ -153,11 +176,79 @@ class Settings(BaseSettings):
     DENSE_EMBEDDING_MODEL: str
     SPARSE_EMBEDDING_MODEL: str
     FASTEMBED_CACHE_PATH: str
+    # Cache of document embeddings by model and text hash. "sqlite" stores it in
+    # FASTEMBED_CACHE_PATH, shared by the processes of a host. Entries of either
+    # backend expire after EMBEDDING_CACHE_TTL seconds. EMBEDDING_CACHE_REDIS_URL
+    # falls back to the Celery broker.
+    EMBEDDING_CACHE_BACKEND: Literal["none", "sqlite", "redis"] = "sqlite"
+    EMBEDDING_CACHE_REDIS_URL: str | None = None
+    EMBEDDING_CACHE_TTL: int = 30 * 24 * 3600
+    # Query embeddings kept in each process's LRU cache
+    QUERY_EMBEDDING_CACHE_SIZE: int = 1024
+    # Seconds that knowledge base results are cached per process. Results are also
+    # dropped once an upload they searched is re-ingested. 0 disables the cache.
+    RETRIEVAL_CACHE_TTL: int = 300
+    RETRIEVAL_CACHE_MAX_SIZE: int = 1000
+    # Threads that embed queries for async runs, off the event loop
+    EMBEDDING_THREADS: int = 4
+    # Ingestion of uploads. Page ranges are extracted in a pool of worker processes,
+    # then chunks are embedded and upserted in fixed-size batches.
+    INGESTION_WORKERS: int = 2
+    INGESTION_PAGES_PER_TASK: int = 20
+    INGESTION_BATCH_SIZE: int = 64
+    # Documents with more pages than this are ingested by chords of Celery subtasks of
+    # INGESTION_PAGES_PER_SUBTASK pages each, spread across workers. None disables it.
+    INGESTION_DISTRIBUTED_MIN_PAGES: int | None = 200
+    INGESTION_PAGES_PER_SUBTASK: int = 50
+    # Strip headers and footers, i.e. lines repeated at the top or bottom of pages
+    INGESTION_STRIP_BOILERPLATE: bool = True
+    # Drop chunks whose SimHash is within this many bits of an earlier chunk's. 0 drops
+    # exact duplicates only, and None keeps every chunk.
+    INGESTION_NEAR_DUPLICATE_DISTANCE: int | None = 6
+    # Load the embedding models and Qdrant client when a Celery worker process starts,
+    # rather than in whichever task first needs them
+    WORKER_PRELOAD_MODELS: bool = True
 
     MAX_UPLOAD_SIZE: int = 50_000_000
+    # Bulk uploads, of many PDFs or of archives of PDFs. Each PDF is still limited to
+    # MAX_UPLOAD_SIZE. Their ingestion tasks are enqueued in groups.
+    MAX_BULK_UPLOAD_SIZE: int = 2_000_000_000
+    MAX_BULK_UPLOAD_FILES: int = 5000
+    BULK_UPLOAD_ENQUEUE_BATCH_SIZE: int = 100
 
     # LangGraph config
     RECURSION_LIMIT: int = 25
+    # Wall-clock budget of a run in seconds. If empty, runs have no deadline.
+    RUN_TIMEOUT: float | None = 300
+    # Seconds kept back at the end of a run for the final answer, given by the summariser
+    # of hierarchical teams and the last member of sequential teams
+    FINAL_ANSWER_RESERVE: float = 30
+    # Budgets of single calls, shrunk to the time remaining as the deadline approaches
+    LLM_CALL_TIMEOUT: float = 120
+    TOOL_CALL_TIMEOUT: float = 60
+    # Timeout of requests to Qdrant, e.g. for retrieval
+    QDRANT_TIMEOUT: int = 30
+
+    # LLM hedging. A fallback model is tried when the primary has not produced its
+    # first token within this percentile of its recent time to first token.
+    LLM_HEDGE_PERCENTILE: float = 0.95
+    # Delay used until enough latency samples have been collected
+    LLM_HEDGE_DEFAULT_DELAY: float = 10.0
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_HEDGE_WINDOW_SIZE: int = 200
+
+    # Exact-match cache for deterministic llm calls of teams that enable it
+    LLM_CACHE_BACKEND: Literal["memory", "redis"] = "memory"
+    LLM_CACHE_TTL: int = 60 * 60
+    # Maximum number of entries of the in-memory backend
+    LLM_CACHE_MAX_SIZE: int = 1000
+    # Defaults to CELERY_BROKER_URL if empty
+    LLM_CACHE_REDIS_URL: str | None = None
+
+    # Semantic cache of final answers for teams that enable it
+    ANSWER_CACHE_COLLECTION: str = "answers"
+    # Minimum cosine similarity between queries to serve a cached answer
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.95
 
 
 settings = Settings()  # type: ignore
@@ -1,6 +1,7 @@
 import asyncio
 from collections import defaultdict, deque
-from collections.abc import AsyncGenerator, Hashable, Mapping
+from collections.abc import AsyncGenerator, AsyncIterator, Hashable, Mapping
+from contextlib import AsyncExitStack
 from functools import partial
 from typing import Any, cast
 from uuid import uuid4
@@ -22,7 +23,20 @@ from langgraph.prebuilt import ToolNode
 from psycopg import AsyncConnection
 
 from app.core.config import settings
+from app.core.graph.coalesce import (
+    can_coalesce,
+    get_coalesce_key,
+    run_coalescer,
+)
+from app.core.graph.deadline import (
+    create_deadline_config,
+    get_timeout,
+    is_expired,
+    iterate_with_deadline,
+)
 from app.core.graph.members import (
+    GraphFallback,
+    GraphKnowledgeBase,
     GraphLeader,
     GraphMember,
     GraphSkill,
@@ -35,7 +49,42 @@ from app.core.graph.members import (
     WorkerNode,
 )
 from app.core.graph.messages import ChatResponse, event_to_response
-from app.models import ChatMessage, Interrupt, InterruptDecision, Member, Team
+from app.core.graph.rag.answer_cache import AnswerCache, get_team_version
+from app.models import (
+    ChatMessage,
+    Interrupt,
+    InterruptDecision,
+    Member,
+    RetrievalConfig,
+    Team,
+)
+
+
+def get_fallbacks(member: Member) -> list[GraphFallback]:
+    """The member's fallback models, validated from their stored definitions."""
+    return [
+        GraphFallback.model_validate(fallback) for fallback in member.fallbacks or []
+    ]
+
+
+def get_knowledge_base(member: Member) -> list[GraphKnowledgeBase]:
+    """Group the member's uploads into a single knowledge base tool, if it has any."""
+    uploads = [
+        GraphUpload(
+            name=upload.name,
+            description=upload.description,
+            owner_id=upload.owner_id,
+            upload_id=cast(int, upload.id),
+            last_modified=upload.last_modified,
+            retrieval_mode=upload.retrieval_mode,
+        )
+        for upload in member.uploads
+        if upload.owner_id is not None
+    ]
+    if not uploads:
+        return []
+    retrieval = RetrievalConfig.model_validate(member.retrieval_config or {})
+    return [GraphKnowledgeBase(uploads=uploads, retrieval=retrieval)]
 
 
 def convert_hierarchical_team_to_dict(
@@ -93,6 +142,7 @@ def convert_hierarchical_team_to_dict(
                 members={},
                 provider=member.provider,
                 temperature=member.temperature,
+                fallbacks=get_fallbacks(member),
             )
         # If member is not root team leader, add as a member
         if member.type != "root" and member.source:
@@ -100,7 +150,7 @@ def convert_hierarchical_team_to_dict(
             leader = members_lookup[member.source]
             leader_name = leader.name
             if member.type == "worker":
-                tools: list[GraphSkill | GraphUpload]
+                tools: list[GraphSkill | GraphKnowledgeBase]
                 tools = [
                     GraphSkill(
                         name=skill.name,
@@ -109,16 +159,7 @@ def convert_hierarchical_team_to_dict(
                     )
                     for skill in member.skills
                 ]
-                tools += [
-                    GraphUpload(
-                        name=upload.name,
-                        description=upload.description,
-                        owner_id=upload.owner_id,
-                        upload_id=cast(int, upload.id),
-                    )
-                    for upload in member.uploads
-                    if upload.owner_id is not None
-                ]
+                tools += get_knowledge_base(member)
                 teams[leader_name].members[member_name] = GraphMember(
                     name=member_name,
                     backstory=member.backstory or "",
@@ -128,6 +169,7 @@ def convert_hierarchical_team_to_dict(
                     model=member.model,
                     base_url=member.base_url,
                     temperature=member.temperature,
+                    fallbacks=get_fallbacks(member),
                     interrupt=member.interrupt,
                 )
             elif member.type == "leader":
@@ -139,6 +181,7 @@ def convert_hierarchical_team_to_dict(
                     model=member.model,
                     base_url=member.base_url,
                     temperature=member.temperature,
+                    fallbacks=get_fallbacks(member),
                 )
         for nei_id in out_counts[member_id]:
             in_counts[nei_id] -= 1
@@ -172,7 +215,7 @@ def convert_sequential_team_to_dict(members: list[Member]) -> Mapping[str, Graph
     while queue:
         member_id = queue.popleft()
         memberModel = members_lookup[member_id]
-        tools: list[GraphSkill | GraphUpload]
+        tools: list[GraphSkill | GraphKnowledgeBase]
         tools = [
             GraphSkill(
                 name=skill.name,
@@ -181,16 +224,7 @@ def convert_sequential_team_to_dict(members: list[Member]) -> Mapping[str, Graph
             )
             for skill in memberModel.skills
         ]
-        tools += [
-            GraphUpload(
-                name=upload.name,
-                description=upload.description,
-                owner_id=upload.owner_id,
-                upload_id=cast(int, upload.id),
-            )
-            for upload in memberModel.uploads
-            if upload.owner_id is not None
-        ]
+        tools += get_knowledge_base(memberModel)
         graph_member = GraphMember(
             name=memberModel.name,
             backstory=memberModel.backstory or "",
@@ -200,6 +234,7 @@ def convert_sequential_team_to_dict(members: list[Member]) -> Mapping[str, Graph
             model=memberModel.model,
             base_url=memberModel.base_url,
             temperature=memberModel.temperature,
+            fallbacks=get_fallbacks(memberModel),
             interrupt=memberModel.interrupt,
         )
         team_dict[graph_member.name] = graph_member
@@ -253,7 +288,7 @@ def should_continue(state: TeamState) -> str:
 def create_tools_condition(
     current_member_name: str,
     next_member_name: str,
-    tools: list[GraphSkill | GraphUpload],
+    tools: list[GraphSkill | GraphKnowledgeBase],
 ) -> dict[Hashable, str]:
     """Creates the mapping for conditional edges
     The tool node must be in format: '{current_member_name}_tools'
@@ -281,6 +316,43 @@ def ask_human(state: TeamState) -> None:
     pass
 
 
+def create_tool_node(
+    tools: list[BaseTool],
+) -> RunnableLambda[TeamState, dict[str, Any]]:
+    """
+    Create the node that calls a member's tools within the tool call budget, shrunk to
+    the run's deadline. Calls that time out are answered with an error so the member can
+    carry on.
+    """
+    tool_node = ToolNode(tools)
+
+    async def call_tools(state: TeamState, config: RunnableConfig) -> dict[str, Any]:
+        timeout = get_timeout(config, settings.TOOL_CALL_TIMEOUT)
+        try:
+            if is_expired(config):
+                # Do not start calls that have no time to complete
+                raise asyncio.TimeoutError
+            result: dict[str, Any] = await asyncio.wait_for(
+                tool_node.ainvoke(state, config), timeout
+            )
+            return result
+        except asyncio.TimeoutError:
+            message = state["messages"][-1]
+            assert isinstance(message, AIMessage), "message is unexpectedly not an AI"
+            return {
+                "messages": [
+                    ToolMessage(
+                        content="Tool call timed out.",
+                        tool_call_id=str(tool_call["id"]),
+                        name=tool_call["name"],
+                    )
+                    for tool_call in message.tool_calls
+                ]
+            }
+
+    return RunnableLambda(call_tools)
+
+
 def create_hierarchical_graph(
     teams: dict[str, GraphTeam],
     leader_name: str,
@@ -310,6 +382,7 @@ def create_hierarchical_graph(
                 teams[leader_name].model,
                 teams[leader_name].base_url,
                 teams[leader_name].temperature,
+                teams[leader_name].fallbacks,
             ).delegate  # type: ignore[arg-type]
         ),
     )
@@ -321,6 +394,7 @@ def create_hierarchical_graph(
                 teams[leader_name].model,
                 teams[leader_name].base_url,
                 teams[leader_name].temperature,
+                teams[leader_name].fallbacks,
             ).summarise  # type: ignore[arg-type]
         ),
     )
@@ -336,6 +410,7 @@ def create_hierarchical_graph(
                         member.model,
                         member.base_url,
                         member.temperature,
+                        member.fallbacks,
                     ).work  # type: ignore[arg-type]
                 ),
             )
@@ -353,7 +428,7 @@ def create_hierarchical_graph(
 
                 if normal_tools:
                     # Add node for normal tools
-                    build.add_node(f"{name}_tools", ToolNode(normal_tools))
+                    build.add_node(f"{name}_tools", create_tool_node(normal_tools))
                     build.add_edge(f"{name}_tools", name)
 
                     # Interrupt for normal tools only if member.interrupt is True
@@ -422,6 +497,7 @@ def create_sequential_graph(
                     member.model,
                     member.base_url,
                     member.temperature,
+                    member.fallbacks,
                 ).work  # type: ignore[arg-type]
             ),
         )
@@ -440,7 +516,7 @@ def create_sequential_graph(
 
             if normal_tools:
                 # Add node for normal tools
-                graph.add_node(f"{member.name}_tools", ToolNode(normal_tools))
+                graph.add_node(f"{member.name}_tools", create_tool_node(normal_tools))
                 graph.add_edge(f"{member.name}_tools", member.name)
 
                 # Interrupt for normal tools only if member.interrupt is True
@@ -512,12 +588,16 @@ async def generator(
         else AIMessage(content=message.content)
         for message in messages
     ]
+    final_values: dict[str, Any] | None = None
 
     try:
-        async with await AsyncConnection.connect(
-            settings.PG_DATABASE_URI,
-            **settings.SQLALCHEMY_CONNECTION_KWARGS,
-        ) as conn:
+        async with AsyncExitStack() as stack:
+            conn = await stack.enter_async_context(
+                await AsyncConnection.connect(
+                    settings.PG_DATABASE_URI,
+                    **settings.SQLALCHEMY_CONNECTION_KWARGS,
+                )
+            )
             checkpointer = AsyncPostgresSaver(conn=conn)
             if team.workflow == "hierarchical":
                 teams = convert_hierarchical_team_to_dict(team, members)
@@ -525,6 +605,8 @@ async def generator(
                 root = create_hierarchical_graph(
                     teams, leader_name=team_leader, checkpointer=checkpointer
                 )
+                final_node = "FinalAnswer"
+                final_name = f"{team_leader}_answer"
                 state: dict[str, Any] | None = {
                     "history": formatted_messages,
                     "messages": [],
@@ -536,6 +618,7 @@ async def generator(
                 member_dict = convert_sequential_team_to_dict(members)
                 root = create_sequential_graph(member_dict, checkpointer)
                 first_member = list(member_dict.values())[0]
+                final_node = final_name = list(member_dict)[-1]
                 state = {
                     "history": formatted_messages,
                     "team": GraphTeam(
@@ -547,6 +630,7 @@ async def generator(
                         model=first_member.model,
                         base_url=first_member.base_url,
                         temperature=first_member.temperature,
+                        fallbacks=first_member.fallbacks,
                     ),
                     "messages": [],
                     "next": first_member.name,
@@ -554,9 +638,57 @@ async def generator(
                 }
 
             config: RunnableConfig = {
-                "configurable": {"thread_id": thread_id},
+                "configurable": {
+                    "thread_id": thread_id,
+                    "enable_llm_cache": team.enable_llm_cache,
+                    # Keep time back for the node that gives the final answer
+                    **create_deadline_config(
+                        settings.RUN_TIMEOUT, reserve=settings.FINAL_ANSWER_RESERVE
+                    ),
+                },
                 "recursion_limit": settings.RECURSION_LIMIT,
             }
+
+            team_id = cast(int, team.id)
+            query = formatted_messages[-1].content if formatted_messages else None
+            coalesce = can_coalesce(team, members)
+            # Only the answer cache and run coalescing look up new questions by team
+            # version, so other runs skip fingerprinting the team and reading its state
+            team_version = ""
+            new_question = False
+            if team.enable_answer_cache or coalesce:
+                team_version = get_team_version(team, members)
+                # The first question of a new thread does not depend on any history
+                new_question = (
+                    interrupt is None
+                    and len(formatted_messages) == 1
+                    and isinstance(query, str)
+                    and not (await root.aget_state(config)).values
+                )
+
+            # Serve near-duplicate questions to new threads from the answer cache
+            answer_cache: AnswerCache | None = None
+            if team.enable_answer_cache and new_question and isinstance(query, str):
+                answer_cache = await asyncio.to_thread(AnswerCache)
+                answer = await answer_cache.alookup(team_id, team_version, query)
+                if answer is not None:
+                    answer_message = AIMessage(content=answer, name=final_name)
+                    assert state is not None
+                    await root.aupdate_state(
+                        config,
+                        {
+                            **state,
+                            "history": formatted_messages + [answer_message],
+                            "all_messages": formatted_messages + [answer_message],
+                        },
+                        as_node=final_node,
+                    )
+                    response = ChatResponse(
+                        type="ai", id=str(uuid4()), name=final_node, content=answer
+                    )
+                    yield f"data: {response.model_dump_json()}\n\n"
+                    return
+
             # Handle interrupt logic by orriding state
             if interrupt and interrupt.decision == InterruptDecision.APPROVED:
                 state = None
@@ -602,36 +734,82 @@ async def generator(
                             if tool_call["name"] == "AskHuman"
                         ]
                     }
-            async for event in root.astream_events(state, version="v2", config=config):
-                response = event_to_response(event, streaming)
-                if response:
-                    formatted_output = f"data: {response.model_dump_json()}\n\n"
-                    yield formatted_output
-            snapshot = await root.aget_state(config)
-            if snapshot.next:
-                # Interrupt occured
-                message = snapshot.values["messages"][-1]
-                if not isinstance(message, AIMessage):
-                    return
-                # Determine if should return default or askhuman interrupt based on whether AskHuman tool was called.
-                for tool_call in message.tool_calls:
-                    if tool_call["name"] == "AskHuman":
+
+            async def execute() -> AsyncIterator[str]:
+                """Execute the run and yield its frames."""
+                nonlocal final_values
+                async for event in iterate_with_deadline(
+                    root.astream_events(state, version="v2", config=config), config
+                ):
+                    response = event_to_response(event, streaming)
+                    if response:
+                        yield f"data: {response.model_dump_json()}\n\n"
+                snapshot = await root.aget_state(config)
+                if snapshot.next:
+                    # Interrupt occured
+                    message = snapshot.values["messages"][-1]
+                    if not isinstance(message, AIMessage):
+                        return
+                    # Determine if should return default or askhuman interrupt based on whether AskHuman tool was called.
+                    for tool_call in message.tool_calls:
+                        if tool_call["name"] == "AskHuman":
+                            response = ChatResponse(
+                                type="interrupt",
+                                name="human",
+                                tool_calls=message.tool_calls,
+                                id=str(uuid4()),
+                            )
+                            break
+                    else:
                         response = ChatResponse(
                             type="interrupt",
-                            name="human",
+                            name="interrupt",
                             tool_calls=message.tool_calls,
                             id=str(uuid4()),
                         )
-                        break
+                    formatted_output = f"data: {response.model_dump_json()}\n\n"
+                    yield formatted_output
                 else:
-                    response = ChatResponse(
-                        type="interrupt",
-                        name="interrupt",
-                        tool_calls=message.tool_calls,
-                        id=str(uuid4()),
+                    final_values = snapshot.values
+                    final_message = snapshot.values["all_messages"][-1]
+                    if (
+                        answer_cache is not None
+                        and isinstance(query, str)
+                        and isinstance(final_message, AIMessage)
+                        and isinstance(final_message.content, str)
+                    ):
+                        await answer_cache.astore(
+                            team_id, team_version, query, final_message.content
+                        )
+
+            # Attach identical concurrent questions to a single run
+            if new_question and isinstance(query, str) and coalesce:
+                coalesce_key = get_coalesce_key(team_id, team_version, query, streaming)
+                inflight, is_leader = run_coalescer.join(coalesce_key)
+                if is_leader:
+                    # The run takes over the connection, so it outlives this request
+                    run_coalescer.start(
+                        coalesce_key,
+                        inflight,
+                        execute(),
+                        lambda: final_values,
+                        stack.pop_all(),
                     )
-                formatted_output = f"data: {response.model_dump_json()}\n\n"
-                yield formatted_output
+                async for frame in inflight.subscribe():
+                    yield frame
+                if inflight.values is None:
+                    raise ValueError(
+                        inflight.error or "The shared run for this question failed."
+                    )
+                if not is_leader:
+                    # Copy the final state of the shared run into this thread
+                    await root.aupdate_state(
+                        config, inflight.values, as_node=final_node
+                    )
+                return
+
+            async for frame in execute():
+                yield frame
     except Exception as e:
         response = ChatResponse(
             type="error", content=str(e), id=str(uuid4()), name="error"
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, cast
+from uuid import uuid4
+
+from langchain_core.callbacks.manager import adispatch_custom_event
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from pydantic import BaseModel
+from redis import asyncio as aioredis
+
+from app.core.config import settings
+
+# Name of the custom event dispatched when a node's response is served from cache
+CACHE_HIT_EVENT = "llm_cache_hit"
+
+
+class CacheStats(BaseModel):
+    backend: str
+    hits: int
+    misses: int
+
+
+class LLMCache(ABC):
+    """Exact-match cache of chat model responses, keyed by a hash of the call."""
+
+    backend: str
+
+    def __init__(self, ttl: int) -> None:
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    async def _get(self, key: str) -> str | None:
+        ...
+
+    @abstractmethod
+    async def _set(self, key: str, value: str) -> None:
+        ...
+
+    async def lookup(self, key: str) -> AIMessage | None:
+        """Return the cached response for the key, if any."""
+        value = await self._get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        message = cast(AIMessage, messages_from_dict([json.loads(value)])[0])
+        # Give every replay fresh ids so it is not merged with an earlier replay in the
+        # same thread's history
+        message.id = str(uuid4())
+        for tool_call in message.tool_calls:
+            tool_call["id"] = f"call_{uuid4().hex}"
+        return message
+
+    async def update(self, key: str, message: AIMessage) -> None:
+        """Cache the response for the key."""
+        await self._set(key, json.dumps(message_to_dict(message)))
+
+    def stats(self) -> CacheStats:
+        """Hit and miss counts of this process."""
+        return CacheStats(backend=self.backend, hits=self.hits, misses=self.misses)
+
+
+class InMemoryLLMCache(LLMCache):
+    """Per-process LRU cache with a TTL on every entry."""
+
+    backend = "memory"
+
+    def __init__(self, ttl: int, max_size: int) -> None:
+        super().__init__(ttl)
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    async def _get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def _set(self, key: str, value: str) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class RedisLLMCache(LLMCache):
+    """Cache shared by every process through Redis. Expiry is handled by Redis."""
+
+    backend = "redis"
+    prefix = "llm-cache:"
+
+    def __init__(self, ttl: int, url: str) -> None:
+        super().__init__(ttl)
+        self.client = aioredis.Redis.from_url(url)
+
+    async def _get(self, key: str) -> str | None:
+        value = await self.client.get(self.prefix + key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    async def _set(self, key: str, value: str) -> None:
+        await self.client.set(self.prefix + key, value, ex=self.ttl)
+
+
+@lru_cache
+def get_llm_cache() -> LLMCache:
+    """Return the process-wide LLM cache for the configured backend."""
+    if settings.LLM_CACHE_BACKEND == "redis":
+        return RedisLLMCache(
+            ttl=settings.LLM_CACHE_TTL,
+            url=settings.LLM_CACHE_REDIS_URL or settings.CELERY_BROKER_URL,
+        )
+    return InMemoryLLMCache(
+        ttl=settings.LLM_CACHE_TTL, max_size=settings.LLM_CACHE_MAX_SIZE
+    )
+
+
+def _message_fingerprint(message: BaseMessage) -> list[Any]:
+    """The parts of a message that reach the model. Ids vary between runs."""
+    tool_calls = [
+        [tool_call["name"], tool_call["args"]]
+        for tool_call in getattr(message, "tool_calls", [])
+    ]
+    return [message.type, message.name, message.content, tool_calls]
+
+
+def llm_cache_key(namespace: Any, prompt: PromptValue) -> str:
+    """
+    Hash a chat model call.
+
+    Args:
+        namespace: Identifies the model, its parameters and bound tools.
+        prompt: The rendered prompt passed to the model.
+    """
+    messages = [_message_fingerprint(message) for message in prompt.to_messages()]
+    payload = json.dumps([namespace, messages], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def create_cached_runnable(
+    runnable: Runnable[Any, Any], namespace: Any
+) -> Runnable[Any, Any]:
+    """
+    Wrap a chat model runnable so that its responses are cached.
+
+    Caching only applies to runs where the team has opted in through the
+    `enable_llm_cache` configurable. On a hit the model is not called, so a custom
+    event carrying the cached message is dispatched in place of the model's events.
+    """
+
+    async def acached(input: PromptValue, config: RunnableConfig) -> Any:
+        if not config.get("configurable", {}).get("enable_llm_cache"):
+            return await runnable.ainvoke(input, config)
+        cache = get_llm_cache()
+        key = llm_cache_key(namespace, input)
+        message = await cache.lookup(key)
+        if message is not None:
+            await adispatch_custom_event(
+                CACHE_HIT_EVENT, {"message": message}, config=config
+            )
+            return message
+        result = await runnable.ainvoke(input, config)
+        if isinstance(result, AIMessage) and not result.invalid_tool_calls:
+            await cache.update(key, result)
+        return result
+
+    return RunnableLambda(acached, name="CachedModel")
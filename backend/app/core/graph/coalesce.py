@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import json
+import logging
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+from contextlib import AsyncExitStack
+from typing import Any
+
+from app.models import Member, Team
+
+logger = logging.getLogger(__name__)
+
+
+class InflightRun:
+    """
+    A graph run shared by identical concurrent requests.
+
+    The run's frames are buffered so that requests joining late replay them from the
+    start. When the run finishes, its final state is kept for followers to copy into
+    their own threads.
+    """
+
+    def __init__(self) -> None:
+        self.frames: list[str] = []
+        self.done = False
+        self.values: dict[str, Any] | None = None
+        # Why the run failed, if it did
+        self.error: str | None = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, frame: str) -> None:
+        async with self._changed:
+            self.frames.append(frame)
+            self._changed.notify_all()
+
+    async def finish(
+        self, values: dict[str, Any] | None, error: str | None = None
+    ) -> None:
+        """Mark the run as done. `values` is None if the run failed."""
+        async with self._changed:
+            self.values = values
+            self.error = error
+            self.done = True
+            self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncGenerator[str, None]:
+        """Yield every frame of the run, including those published before joining."""
+        index = 0
+        while True:
+            async with self._changed:
+                while not self.done and index >= len(self.frames):
+                    await self._changed.wait()
+                frames = self.frames[index:]
+                done = self.done
+            for frame in frames:
+                yield frame
+            index += len(frames)
+            if done and index >= len(self.frames):
+                return
+
+
+class RunCoalescer:
+    """Single-flight registry of in-flight runs in this process."""
+
+    def __init__(self) -> None:
+        self._runs: dict[str, InflightRun] = {}
+        # Runs executing in the background, referenced until they finish
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def join(self, key: str) -> tuple[InflightRun, bool]:
+        """
+        Join the in-flight run for the key, or register a new one.
+
+        Returns:
+            The run and whether the caller is its leader, i.e. must execute it.
+        """
+        run = self._runs.get(key)
+        if run is not None:
+            return run, False
+        run = self._runs[key] = InflightRun()
+        return run, True
+
+    def start(
+        self,
+        key: str,
+        run: InflightRun,
+        frames: AsyncIterator[str],
+        get_values: Callable[[], dict[str, Any] | None],
+        resources: AsyncExitStack,
+    ) -> None:
+        """
+        Execute the leader's run in a task of its own, publishing its frames. The run
+        does not depend on the leader's request, so it completes and serves its
+        followers even if the leader's client goes away.
+
+        Args:
+            frames: The frames of the run, which executes as they are iterated.
+            get_values: Returns the final state of the run once its frames are
+                exhausted, or None if it did not complete.
+            resources: What the run needs, e.g. its database connection. Released when
+                the run finishes.
+        """
+
+        async def execute() -> None:
+            values: dict[str, Any] | None = None
+            error: str | None = None
+            try:
+                async with resources:
+                    async for frame in frames:
+                        await run.publish(frame)
+                    values = get_values()
+            except Exception as e:
+                logger.exception("Shared run failed")
+                error = str(e)
+            finally:
+                await self.finish(key, values, error)
+
+        task = asyncio.create_task(execute())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def finish(
+        self, key: str, values: dict[str, Any] | None, error: str | None = None
+    ) -> None:
+        """Finish the run and stop new requests from joining it."""
+        run = self._runs.pop(key, None)
+        if run is not None:
+            await run.finish(values, error)
+
+
+run_coalescer = RunCoalescer()
+
+
+def can_coalesce(team: Team, members: list[Member]) -> bool:
+    """
+    Whether runs of the team may be shared. Teams opt in, as callers would otherwise
+    share the side effects of a single run, e.g. of tools that send emails. Runs that
+    may interrupt for human input cannot be shared between threads.
+    """
+    if not team.enable_run_coalescing:
+        return False
+    for member in members:
+        if member.interrupt:
+            return False
+        if any(skill.name == "ask-human" for skill in member.skills):
+            return False
+    return True
+
+
+def get_coalesce_key(
+    team_id: int, team_version: str, query: str, streaming: bool
+) -> str:
+    """Key identical requests by team version and normalised input."""
+    normalised_query = " ".join(query.lower().split())
+    payload = json.dumps([team_id, team_version, normalised_query, streaming])
+    return hashlib.sha256(payload.encode()).hexdigest()
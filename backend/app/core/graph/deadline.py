@@ -0,0 +1,104 @@
+import asyncio
+import sys
+import time
+from collections.abc import AsyncGenerator, AsyncIterator
+from typing import TypeVar
+
+from langchain_core.runnables import RunnableConfig
+
+T = TypeVar("T")
+
+# Seconds the event stream is allowed past the deadline, so that nodes that run out of
+# time can still answer before the stream is stopped
+STREAM_GRACE = 5.0
+
+
+def create_deadline_config(timeout: float | None, reserve: float) -> dict[str, float]:
+    """
+    Return the configurable values that bound a run to `timeout` seconds from now.
+
+    Args:
+        timeout: The run's wall-clock budget. None for no deadline.
+        reserve: Seconds kept back at the end of the run for the final answer. Work
+            nodes treat the deadline as `reserve` seconds earlier than it is.
+    """
+    if timeout is None:
+        return {}
+    return {"deadline": time.monotonic() + timeout, "deadline_reserve": reserve}
+
+
+def get_deadline(config: RunnableConfig, final: bool = False) -> float | None:
+    """
+    The run's deadline in `time.monotonic()` seconds, or None if it has no deadline.
+
+    Args:
+        final: Whether the caller produces the final answer and may use the reserve.
+    """
+    configurable = config.get("configurable", {})
+    deadline: float | None = configurable.get("deadline")
+    if deadline is None or final:
+        return deadline
+    reserve: float = configurable.get("deadline_reserve", 0)
+    return deadline - reserve
+
+
+def time_remaining(config: RunnableConfig, final: bool = False) -> float | None:
+    """Seconds left before the run's deadline, or None if the run has no deadline."""
+    deadline = get_deadline(config, final)
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def get_timeout(config: RunnableConfig, budget: float, final: bool = False) -> float:
+    """Timeout for a call: its node type's budget, shrunk to the time remaining."""
+    remaining = time_remaining(config, final)
+    if remaining is None:
+        return budget
+    return max(0.0, min(budget, remaining))
+
+
+def is_expired(config: RunnableConfig, final: bool = False) -> bool:
+    """Whether there is no time left for another call."""
+    remaining = time_remaining(config, final)
+    return remaining is not None and remaining <= 0
+
+
+async def iterate_with_deadline(
+    stream: AsyncIterator[T], config: RunnableConfig
+) -> AsyncIterator[T]:
+    """
+    Yield from the stream until shortly after the run's deadline, then stop it.
+
+    Raises:
+        TimeoutError: If the stream has not ended by then.
+    """
+    deadline = get_deadline(config, final=True)
+    if deadline is not None:
+        deadline += STREAM_GRACE
+    try:
+        if deadline is None:
+            async for item in stream:
+                yield item
+        elif sys.version_info >= (3, 11):
+            # A single timeout for the whole stream. It is paused while the caller
+            # handles an item, so that it only ever interrupts the stream.
+            async with asyncio.timeout_at(deadline) as scope:
+                async for item in stream:
+                    scope.reschedule(None)
+                    yield item
+                    scope.reschedule(deadline)
+        else:
+            while True:
+                try:
+                    item = await asyncio.wait_for(
+                        stream.__anext__(), deadline - time.monotonic()
+                    )
+                except StopAsyncIteration:
+                    return
+                yield item
+    except asyncio.TimeoutError:
+        raise TimeoutError("The run did not complete before its deadline.")
+    finally:
+        if isinstance(stream, AsyncGenerator):
+            await stream.aclose()
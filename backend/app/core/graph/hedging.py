@@ -0,0 +1,160 @@
+import asyncio
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Sequence
+from contextlib import suppress
+from typing import Any
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessageChunk,
+    message_chunk_to_message,
+)
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+from app.core.config import settings
+
+
+class LatencyTracker:
+    """
+    Tracks the time to first token of recent calls for each model endpoint.
+
+    The hedging delay for an endpoint is the configured percentile of its recent
+    latencies. Until enough samples have been collected, a default delay is used.
+    """
+
+    def __init__(
+        self,
+        window_size: int,
+        min_samples: int,
+        percentile: float,
+        default_delay: float,
+    ) -> None:
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self._samples: dict[str, deque[float]] = {}
+
+    def record(self, key: str, latency: float) -> None:
+        """Record the time to first token of a successful call."""
+        samples = self._samples.setdefault(key, deque(maxlen=self.window_size))
+        samples.append(latency)
+
+    def threshold(self, key: str) -> float:
+        """Return how long to wait for the first token before hedging."""
+        samples = self._samples.get(key)
+        if not samples or len(samples) < self.min_samples:
+            return self.default_delay
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return ordered[index]
+
+
+latency_tracker = LatencyTracker(
+    window_size=settings.LLM_HEDGE_WINDOW_SIZE,
+    min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+    percentile=settings.LLM_HEDGE_PERCENTILE,
+    default_delay=settings.LLM_HEDGE_DEFAULT_DELAY,
+)
+
+
+async def _first_chunk(
+    runnable: Runnable[Any, Any], input: Any, config: RunnableConfig
+) -> tuple[AsyncIterator[Any], Any, float]:
+    """Start streaming from the runnable and wait for its first chunk."""
+    start = time.monotonic()
+    stream = runnable.astream(input, config)
+    try:
+        chunk = await stream.__anext__()
+    except StopAsyncIteration:
+        raise ValueError("Model returned an empty response")
+    return stream, chunk, time.monotonic() - start
+
+
+async def hedged_ainvoke(
+    candidates: Sequence[tuple[str, Runnable[Any, Any]]],
+    input: Any,
+    config: RunnableConfig,
+    tracker: LatencyTracker = latency_tracker,
+) -> Any:
+    """
+    Invoke the first candidate and hedge with the next ones if it is slow or failing.
+
+    A backup candidate is started when none of the running candidates has produced its
+    first token within the hedging delay of the most recently started one, or as soon
+    as a candidate fails. The first candidate to produce a token wins and the others are
+    cancelled, so only one response is ever streamed back to the client.
+
+    Args:
+        candidates: (key, runnable) pairs in order of preference. The key identifies
+            the model endpoint for latency tracking.
+        input: The input passed to every candidate.
+        config: The config passed to every candidate.
+        tracker: The latency tracker used to derive hedging delays.
+
+    Returns:
+        The aggregated output of the winning candidate.
+
+    Raises:
+        Exception: The last error raised if every candidate fails.
+    """
+    remaining = list(candidates)
+    running: dict[asyncio.Task[tuple[AsyncIterator[Any], Any, float]], str] = {}
+    last_error: BaseException | None = None
+
+    def launch() -> float | None:
+        key, runnable = remaining.pop(0)
+        task = asyncio.create_task(_first_chunk(runnable, input, config))
+        running[task] = key
+        return tracker.threshold(key) if remaining else None
+
+    delay = launch()
+    try:
+        while running:
+            done, _ = await asyncio.wait(
+                running, timeout=delay, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                # No first token yet, fire a backup request
+                delay = launch()
+                continue
+            for task in done:
+                key = running.pop(task)
+                if task.exception() is None:
+                    stream, output, latency = task.result()
+                    tracker.record(key, latency)
+                    break
+                last_error = task.exception()
+            else:
+                # Every finished candidate failed, fail over to the next one
+                if remaining:
+                    delay = launch()
+                continue
+            break
+        else:
+            raise last_error or ValueError("No model candidates provided")
+    finally:
+        for task in running:
+            task.cancel()
+        for task in running:
+            with suppress(BaseException):
+                abandoned, *_ = await task
+                await abandoned.aclose()  # type: ignore[attr-defined]
+
+    async for chunk in stream:
+        output += chunk
+    if isinstance(output, BaseMessageChunk):
+        return message_chunk_to_message(output)
+    return output
+
+
+def create_hedged_runnable(
+    candidates: Sequence[tuple[str, Runnable[Any, Any]]],
+) -> Runnable[Any, AIMessage]:
+    """Wrap candidates in a runnable that hedges and fails over between them."""
+
+    async def ahedge(input: Any, config: RunnableConfig) -> Any:
+        return await hedged_ainvoke(candidates, input, config)
+
+    return RunnableLambda(ahedge, name="HedgedModel")
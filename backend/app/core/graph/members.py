@@ -1,11 +1,20 @@
-from collections.abc import Mapping, Sequence
+import asyncio
+from collections.abc import Callable, Mapping, Sequence
+from datetime import datetime
 from typing import Annotated, Any
 
 from langchain.chat_models import init_chat_model
+from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import AIMessage, AnyMessage
 from langchain_core.output_parsers.openai_tools import JsonOutputKeyToolsParser
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.prompts import (
+    ChatPromptTemplate,
+    MessagesPlaceholder,
+    PromptTemplate,
+)
 from langchain_core.runnables import (
+    Runnable,
+    RunnableBinding,
     RunnableConfig,
     RunnableLambda,
     RunnableSerializable,
@@ -17,10 +26,16 @@ from langgraph.graph import add_messages
 from pydantic import BaseModel, Field
 from typing_extensions import NotRequired, TypedDict
 
+from app.core.config import settings
+from app.core.graph.cache import create_cached_runnable
+from app.core.graph.deadline import get_timeout, is_expired
+from app.core.graph.hedging import create_hedged_runnable
 from app.core.graph.rag.qdrant import QdrantStore
+from app.core.graph.rag.qdrant_retriever import combine_modes
 from app.core.graph.skills import managed_skills
 from app.core.graph.skills.api_tool import dynamic_api_tool
 from app.core.graph.skills.retriever_tool import create_retriever_tool
+from app.models import RetrievalConfig, RetrievalMode
 
 
 class GraphSkill(BaseModel):
@@ -45,11 +60,55 @@ class GraphUpload(BaseModel):
     description: str = Field(description="Description of the upload")
     owner_id: int = Field(description="Id of the user that owns this upload")
     upload_id: int = Field(description="Id of the upload")
+    last_modified: datetime = Field(
+        description="When the upload was last modified or ingested"
+    )
+    retrieval_mode: RetrievalMode = Field(
+        default=RetrievalMode.HYBRID,
+        description="Which embeddings the upload is searched with",
+    )
+
+
+class GraphKnowledgeBase(BaseModel):
+    name: str = Field(default="KnowledgeBase", description="Name of the tool")
+    uploads: list[GraphUpload] = Field(description="The uploads to search")
+    retrieval: RetrievalConfig = Field(
+        default_factory=RetrievalConfig,
+        description="Limits and post-processing of the results",
+    )
 
     @property
     def tool(self) -> BaseTool:
-        retriever = QdrantStore().retriever(self.owner_id, self.upload_id)
-        return create_retriever_tool(retriever)
+        """A single tool that searches all of the uploads in one query."""
+        retriever = QdrantStore().retriever(
+            user_ids=sorted({upload.owner_id for upload in self.uploads}),
+            upload_names={upload.upload_id: upload.name for upload in self.uploads},
+            config=self.retrieval,
+            upload_versions={
+                upload.upload_id: upload.last_modified.isoformat()
+                for upload in self.uploads
+            },
+            mode=combine_modes(upload.retrieval_mode for upload in self.uploads),
+        )
+        contents = "\n".join(
+            f"- {upload.name}: {upload.description}" for upload in self.uploads
+        )
+        return create_retriever_tool(
+            retriever,
+            document_prompt=PromptTemplate.from_template(
+                "Source: {source}\n{page_content}"
+            ),
+            description=f"Query documents for answers. The documents are:\n{contents}",
+        )
+
+
+class GraphFallback(BaseModel):
+    provider: str = Field(description="The provider for the fallback llm model")
+    model: str = Field(description="The fallback llm model")
+    base_url: str | None = Field(
+        default=None,
+        description="Use a proxy to serve llm model",
+    )
 
 
 class GraphPerson(BaseModel):
@@ -62,6 +121,10 @@ class GraphPerson(BaseModel):
         description="Use a proxy to serve llm model",
     )
     temperature: float = Field(description="The temperature of the llm model")
+    fallbacks: list[GraphFallback] = Field(
+        default_factory=list,
+        description="Alternate llm models to hedge or fail over to, in order of preference",
+    )
     backstory: str = Field(
         description="Description of the person's experience, motives and concerns."
     )
@@ -72,7 +135,7 @@ class GraphPerson(BaseModel):
 
 
 class GraphMember(GraphPerson):
-    tools: list[GraphSkill | GraphUpload] = Field(
+    tools: list[GraphSkill | GraphKnowledgeBase] = Field(
         description="The list of tools that the person can use."
     )
     interrupt: bool = Field(
@@ -103,6 +166,10 @@ class GraphTeam(BaseModel):
     temperature: float = Field(
         description="The temperature of the team leader's llm model"
     )
+    fallbacks: list[GraphFallback] = Field(
+        default_factory=list,
+        description="Alternate llm models for the team leader, in order of preference",
+    )
 
     @property
     def persona(self) -> str:
@@ -151,30 +218,118 @@ class ReturnTeamState(TypedDict):
     task: NotRequired[list[AnyMessage]]
 
 
+def init_model(
+    provider: str, model: str, base_url: str | None, temperature: float
+) -> BaseChatModel:
+    """Initialise the chat model for a provider"""
+    # If using proxy, then we need to pass base url
+    # TODO: Include ollama here once langchain-ollama bug is fixed
+    if provider in ["openai"] and base_url:
+        return init_chat_model(
+            model,
+            model_provider=provider,
+            temperature=temperature,
+            base_url=base_url,
+        )
+    elif provider == "ollama":
+        return ChatOllama(
+            model=model,
+            temperature=temperature,
+            base_url=base_url if base_url else "http://host.docker.internal:11434",
+        )
+    else:
+        return init_chat_model(
+            model, model_provider=provider, temperature=0, streaming=True
+        )
+
+
+OUT_OF_TIME_MESSAGE = "I ran out of time before I could complete this task."
+OUT_OF_TIME_ANSWER = (
+    "The team ran out of time before it could complete this task. "
+    "Its latest response was:\n\n{response}"
+)
+
+
 class BaseNode:
+    # Cache this node's calls even if its model is not deterministic
+    cache_any_temperature = False
+
     def __init__(
-        self, provider: str, model: str, base_url: str | None, temperature: float
+        self,
+        provider: str,
+        model: str,
+        base_url: str | None,
+        temperature: float,
+        fallbacks: Sequence[GraphFallback] = (),
     ):
-        # If using proxy, then we need to pass base url
-        # TODO: Include ollama here once langchain-ollama bug is fixed
-        if provider in ["openai"] and base_url:
-            self.model = init_chat_model(
-                model,
-                model_provider=provider,
-                temperature=temperature,
-                base_url=base_url,
-            )
-        elif provider == "ollama":
-            self.model = ChatOllama(
-                model=model,
-                temperature=temperature,
-                base_url=base_url if base_url else "http://host.docker.internal:11434",
-            )
-        else:
-            self.model = init_chat_model(
-                model, model_provider=provider, temperature=0, streaming=True
+        self.model = init_model(provider, model, base_url, temperature)
+        self.model_key = f"{provider}:{model}:{base_url}"
+        self.fallback_models = [
+            (
+                f"{fallback.provider}:{fallback.model}:{fallback.base_url}",
+                init_model(
+                    fallback.provider, fallback.model, fallback.base_url, temperature
+                ),
             )
-        self.final_answer_model = self.model
+            for fallback in fallbacks
+        ]
+
+    def hedge(
+        self, bind: Callable[[BaseChatModel], Runnable[Any, Any]] | None = None
+    ) -> Runnable[Any, Any]:
+        """
+        Return the node's model, hedged with its fallback models if it has any.
+
+        Args:
+            bind: Applied to every candidate model, e.g. to bind tools.
+        """
+        bind = bind or (lambda model: model)
+        if not self.fallback_models:
+            return bind(self.model)
+        return create_hedged_runnable(
+            [(self.model_key, bind(self.model))]
+            + [(key, bind(model)) for key, model in self.fallback_models]
+        )
+
+    def get_model(
+        self, bind: Callable[[BaseChatModel], Runnable[Any, Any]] | None = None
+    ) -> Runnable[Any, Any]:
+        """
+        Return the node's model runnable, hedged with its fallback models and cached
+        if the call is deterministic.
+
+        Args:
+            bind: Applied to every candidate model, e.g. to bind tools.
+        """
+        bind = bind or (lambda model: model)
+        runnable = self.hedge(bind)
+        deterministic = getattr(self.model, "temperature", None) == 0
+        if not (deterministic or self.cache_any_temperature):
+            return runnable
+        bound = bind(self.model)
+        bound_kwargs = bound.kwargs if isinstance(bound, RunnableBinding) else {}
+        return create_cached_runnable(
+            runnable, [self.model_key, self.model.dict(), bound_kwargs]
+        )
+
+    async def ainvoke_with_deadline(
+        self,
+        chain: Runnable[Any, Any],
+        state: TeamState,
+        config: RunnableConfig,
+        final: bool = False,
+    ) -> Any:
+        """
+        Invoke the chain within the llm call budget, shrunk to the run's deadline.
+
+        Raises:
+            asyncio.TimeoutError: If the call does not complete in time.
+        """
+        if is_expired(config, final):
+            # Do not start a call that has no time to complete
+            raise asyncio.TimeoutError
+        timeout = get_timeout(config, settings.LLM_CALL_TIMEOUT, final)
+        return await asyncio.wait_for(chain.ainvoke(state, config), timeout)
 
     def tag_with_name(self, ai_message: AIMessage, name: str) -> AIMessage:
         """Tag a name to the AI message"""
@@ -228,15 +383,21 @@ class WorkerNode(BaseNode):
         # If member has no tools, then use a regular model instead of an agent
         if len(member.tools) >= 1:
             tools: Sequence[BaseTool] = [tool.tool for tool in member.tools]
-            chain = prompt | self.model.bind_tools(tools)
+            chain = prompt | self.get_model(lambda model: model.bind_tools(tools))
         else:
             chain: RunnableSerializable[dict[str, Any], AnyMessage] = (  # type: ignore[no-redef]
-                prompt | self.model
+                prompt | self.get_model()
             )
         work_chain: RunnableSerializable[dict[str, Any], Any] = chain | RunnableLambda(
             self.tag_with_name  # type: ignore[arg-type]
         ).bind(name=member.name)
-        result: AIMessage = await work_chain.ainvoke(state, config)  # type: ignore[arg-type]
+        try:
+            result: AIMessage = await self.ainvoke_with_deadline(
+                work_chain, state, config
+            )
+        except asyncio.TimeoutError:
+            # Let the team carry on without this member's answer
+            result = AIMessage(content=OUT_OF_TIME_MESSAGE, name=member.name)
         if result.tool_calls:
             return {"messages": [result]}
         else:
@@ -291,15 +452,23 @@ class SequentialWorkerNode(WorkerNode):
         # If member has no tools, then use a regular model instead of an agent
         if len(member.tools) >= 1:
             tools: Sequence[BaseTool] = [tool.tool for tool in member.tools]
-            chain = prompt | self.model.bind_tools(tools)
+            chain = prompt | self.get_model(lambda model: model.bind_tools(tools))
         else:
             chain: RunnableSerializable[dict[str, Any], AnyMessage] = (  # type: ignore[no-redef]
-                prompt | self.model
+                prompt | self.get_model()
             )
         work_chain: RunnableSerializable[dict[str, Any], Any] = chain | RunnableLambda(
             self.tag_with_name  # type: ignore[arg-type]
         ).bind(name=member.name)
-        result: AIMessage = await work_chain.ainvoke(state, config)  # type: ignore[arg-type]
+        # The last member gives the final answer, so it may use the reserve
+        final = self.get_next_member_in_sequence(team.members, name) is None
+        try:
+            result: AIMessage = await self.ainvoke_with_deadline(
+                work_chain, state, config, final
+            )
+        except asyncio.TimeoutError:
+            # Let the team carry on without this member's answer
+            result = AIMessage(content=OUT_OF_TIME_MESSAGE, name=member.name)
         # if agent is calling a tool, set the next member_name to be itself. This is so that when an agent triggers a
         # tool and the tool returns the response back, the next value will be the agent's name
         next: str | None
@@ -317,6 +486,9 @@ class SequentialWorkerNode(WorkerNode):
 
 
 class LeaderNode(BaseNode):
+    # Routing decisions are replayed from cache even when sampled
+    cache_any_temperature = True
+
     leader_prompt = ChatPromptTemplate.from_messages(
         [
             (
@@ -399,11 +571,14 @@ class LeaderNode(BaseNode):
         team_members_info = self.get_team_members_info(team.members)
         options = list(team.members) + ["FINISH"]
         tools = [self.get_tool_definition(options)]
-        # Disable default parallel tool calls from ChatOpenAI
-        if isinstance(self.model, ChatOpenAI):
-            bind_tool = self.model.bind_tools(tools=tools, parallel_tool_calls=False)
-        else:
-            bind_tool = self.model.bind_tools(tools=tools)
+
+        def bind_route_tool(model: BaseChatModel) -> Runnable[Any, Any]:
+            # Disable default parallel tool calls from ChatOpenAI
+            if isinstance(model, ChatOpenAI):
+                return model.bind_tools(tools=tools, parallel_tool_calls=False)
+            return model.bind_tools(tools=tools)
+
+        bind_tool = self.get_model(bind_route_tool)
         delegate_chain: RunnableSerializable[Any, Any] = (
             self.leader_prompt.partial(
                 team_name=team.name,
@@ -417,7 +592,13 @@ class LeaderNode(BaseNode):
             | bind_tool
             | JsonOutputKeyToolsParser(key_name="route", first_tool_only=True)
         )
-        result: dict[str, Any] = await delegate_chain.ainvoke(state, config)
+        try:
+            result: dict[str, Any] = await self.ainvoke_with_deadline(
+                delegate_chain, state, config
+            )
+        except asyncio.TimeoutError:
+            # Out of time, finish with what the team has so far
+            result = {}
         if not result or result.get("next") is None or result["next"] == "FINISH":
             return {
                 "next": "FINISH",
@@ -464,8 +645,20 @@ class SummariserNode(BaseNode):
                 team_task=team_task,
                 history_string=format_messages(state["history"]),
             )
-            | self.final_answer_model
+            | self.get_model()
             | RunnableLambda(self.tag_with_name).bind(name=f"{team.name}_answer")  # type: ignore[arg-type]
         )
-        result = await summarise_chain.ainvoke(state, config)
+        try:
+            result = await self.ainvoke_with_deadline(
+                summarise_chain, state, config, final=True
+            )
+        except asyncio.TimeoutError:
+            # Answer with the latest response of the team instead of failing the run
+            response = state["history"][-1].content if state["history"] else ""
+            result = AIMessage(
+                content=OUT_OF_TIME_ANSWER.format(response=response)
+                if response
+                else OUT_OF_TIME_MESSAGE,
+                name=f"{team.name}_answer",
+            )
         return {"history": [result], "all_messages": [result]}
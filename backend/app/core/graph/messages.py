@@ -1,5 +1,5 @@
 import json
-from typing import Any
+from typing import Any, cast
 
 from langchain_core.documents import Document
 from langchain_core.messages import (
@@ -11,9 +11,11 @@ from langchain_core.messages import (
     ToolMessage,
     ToolMessageChunk,
 )
-from langchain_core.runnables.schema import StreamEvent
+from langchain_core.runnables.schema import CustomStreamEvent, StreamEvent
 from pydantic import BaseModel
 
+from app.core.graph.cache import CACHE_HIT_EVENT
+
 
 class ChatResponse(BaseModel):
     type: str  # ai | human | tool
@@ -38,6 +40,20 @@ def get_message_type(message: Any) -> str | None:
         return None
 
 
+def get_message_content(message: AIMessage | AIMessageChunk) -> str:
+    """Return the message's text content"""
+    content: str = ""
+    if isinstance(message.content, list):
+        for c in message.content:
+            if isinstance(c, str):
+                content += c
+            elif isinstance(c, dict):
+                content += c.get("text", "")
+    else:
+        content = message.content
+    return content
+
+
 def event_to_response(event: StreamEvent, streaming: bool) -> ChatResponse | None:
     """Convert event to ChatResponse"""
     kind = event["event"]
@@ -52,15 +68,7 @@ def event_to_response(event: StreamEvent, streaming: bool) -> ChatResponse | Non
             else event["data"]["output"]
         )
         type = get_message_type(chat_message)
-        content: str = ""
-        if isinstance(chat_message.content, list):
-            for c in chat_message.content:
-                if isinstance(c, str):
-                    content += c
-                elif isinstance(c, dict):
-                    content += c.get("text", "")
-        else:
-            content = chat_message.content
+        content = get_message_content(chat_message)
         tool_calls = chat_message.tool_calls
         if content and type:
             return ChatResponse(
@@ -77,6 +85,21 @@ def event_to_response(event: StreamEvent, streaming: bool) -> ChatResponse | Non
                 name=name,
                 tool_calls=tool_calls,
             )
+    elif kind == "on_custom_event" and event["name"] == CACHE_HIT_EVENT:
+        # The model was not called, so replay the cached message as a whole
+        custom_event = cast(CustomStreamEvent, event)
+        cached_message: AIMessage = custom_event["data"]["message"]
+        name = event["metadata"]["langgraph_node"]
+        if cached_message.tool_calls:
+            return ChatResponse(
+                type="tool",
+                id=id,
+                name=name,
+                tool_calls=cached_message.tool_calls,
+            )
+        content = get_message_content(cached_message)
+        if content:
+            return ChatResponse(type="ai", id=id, name=name, content=content)
 
     elif kind == "on_tool_end":
         tool_output: ToolMessage | None = event["data"].get("output")
@@ -90,6 +113,7 @@ def event_to_response(event: StreamEvent, streaming: bool) -> ChatResponse | Non
                     {
                         "score": doc.metadata["score"],
                         "content": doc.page_content,
+                        "source": doc.metadata.get("source", ""),
                     }
                 )
         if tool_output:
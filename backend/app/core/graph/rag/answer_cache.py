@@ -0,0 +1,166 @@
+import hashlib
+import json
+import logging
+import uuid
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from app.core.config import settings
+from app.core.graph.rag.embeddings import (
+    dense_vector_name,
+    dense_vector_params,
+    embed_dense_query,
+    run_in_embedding_executor,
+)
+from app.core.graph.rag.qdrant import get_async_client, get_client
+from app.models import Member, Team
+
+logger = logging.getLogger(__name__)
+
+
+def get_team_version(team: Team, members: list[Member]) -> str:
+    """
+    Fingerprint everything about a team that can change its answers.
+
+    Any edit to the team, its members, their skills or their uploads results in a new
+    version, so cached answers of previous versions are never served.
+    """
+    definition = {
+        "workflow": team.workflow,
+        "members": [
+            {
+                "id": member.id,
+                "name": member.name,
+                "type": member.type,
+                "role": member.role,
+                "backstory": member.backstory,
+                "source": member.source,
+                "provider": member.provider,
+                "model": member.model,
+                "base_url": member.base_url,
+                "temperature": member.temperature,
+                "fallbacks": member.fallbacks,
+                "retrieval_config": member.retrieval_config,
+                "skills": sorted(
+                    (skill.name, json.dumps(skill.tool_definition, sort_keys=True))
+                    for skill in member.skills
+                ),
+                "uploads": sorted(
+                    (upload.id or 0, upload.last_modified.isoformat())
+                    for upload in member.uploads
+                ),
+            }
+            for member in sorted(members, key=lambda member: member.id or 0)
+        ],
+    }
+    payload = json.dumps(definition, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class AnswerCache:
+    """
+    Semantic cache of final answers of team runs, stored in Qdrant.
+
+    Queries are embedded with the dense embedding model used for uploads. A cached answer
+    is served when a previous query to the same team version is similar enough.
+    """
+
+    collection_name = settings.ANSWER_CACHE_COLLECTION
+
+    def __init__(self) -> None:
+        self.client = self._create_collection()
+
+    def _create_collection(self) -> QdrantClient:
+        """Creates the dense-only answers collection if it does not already exist."""
+        client = get_client()
+        if not client.collection_exists(self.collection_name):
+            client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=dense_vector_params(),
+            )
+        return client
+
+    def _team_filter(self, team_id: int) -> rest.FieldCondition:
+        return rest.FieldCondition(key="team_id", match=rest.MatchValue(value=team_id))
+
+    async def alookup(self, team_id: int, team_version: str, query: str) -> str | None:
+        """Return the answer of the most similar cached query above the threshold."""
+        embedding = await run_in_embedding_executor(embed_dense_query, query)
+        response = await get_async_client().query_points(
+            collection_name=self.collection_name,
+            query=embedding,
+            using=dense_vector_name(),
+            query_filter=rest.Filter(
+                must=[
+                    self._team_filter(team_id),
+                    rest.FieldCondition(
+                        key="team_version", match=rest.MatchValue(value=team_version)
+                    ),
+                ]
+            ),
+            limit=1,
+            with_payload=True,
+        )
+        results = response.points
+        if not results or results[0].score < settings.ANSWER_CACHE_SIMILARITY_THRESHOLD:
+            return None
+        answer: str = (results[0].payload or {})["answer"]
+        return answer
+
+    async def astore(
+        self, team_id: int, team_version: str, query: str, answer: str
+    ) -> None:
+        """Cache the answer and drop answers cached for previous team versions."""
+        client = get_async_client()
+        await client.delete(
+            collection_name=self.collection_name,
+            points_selector=rest.FilterSelector(
+                filter=rest.Filter(
+                    must=[self._team_filter(team_id)],
+                    must_not=[
+                        rest.FieldCondition(
+                            key="team_version",
+                            match=rest.MatchValue(value=team_version),
+                        )
+                    ],
+                )
+            ),
+        )
+        embedding = await run_in_embedding_executor(embed_dense_query, query)
+        await client.upsert(
+            collection_name=self.collection_name,
+            points=[
+                rest.PointStruct(
+                    id=uuid.uuid4().hex,
+                    vector={dense_vector_name(): embedding},
+                    payload={
+                        "document": query,
+                        "team_id": team_id,
+                        "team_version": team_version,
+                        "answer": answer,
+                    },
+                )
+            ],
+        )
+
+    def invalidate(self, team_id: int) -> None:
+        """Delete every answer cached for the team."""
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=rest.FilterSelector(
+                filter=rest.Filter(must=[self._team_filter(team_id)])
+            ),
+        )
+
+
+def invalidate_team_answers(team_id: int) -> None:
+    """
+    Delete the answers cached for a team. Answers are keyed by team version, so stale
+    ones are never served anyway: a failure is logged rather than raised, so that a
+    Qdrant outage does not stop teams from being edited or deleted.
+    """
+    try:
+        AnswerCache().invalidate(team_id)
+    except Exception:
+        logger.exception(f"Failed to invalidate the cached answers of team {team_id}")
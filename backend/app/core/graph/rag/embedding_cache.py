@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+from functools import lru_cache
+from typing import TypeVar
+
+import redis
+
+from app.core.config import settings
+from app.core.graph.rag.ingestion import batched, chunk_hash
+
+T = TypeVar("T")
+
+# SQLite limits the number of parameters of a statement
+SQLITE_BATCH_SIZE = 500
+
+
+class EmbeddingCache(ABC):
+    """Cache of document embeddings, keyed by embedding model and text hash."""
+
+    @abstractmethod
+    def get_many(self, keys: list[str]) -> dict[str, bytes]:
+        """Return the cached values of the keys that are cached."""
+
+    @abstractmethod
+    def set_many(self, items: dict[str, bytes]) -> None:
+        ...
+
+
+class SqliteEmbeddingCache(EmbeddingCache):
+    """
+    Cache in a SQLite database on local disk, shared by the processes of a host.
+    Entries expire after `ttl` seconds and are deleted as new entries are written.
+    """
+
+    def __init__(self, path: str, ttl: int) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._connection:
+            # Lets readers and a writer from other processes work concurrently
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS embedding_cache_expires_at "
+                "ON embedding_cache (expires_at)"
+            )
+
+    def get_many(self, keys: list[str]) -> dict[str, bytes]:
+        values: dict[str, bytes] = {}
+        now = time.time()
+        with self._lock:
+            for batch in batched(keys, SQLITE_BATCH_SIZE):
+                placeholders = ", ".join("?" * len(batch))
+                rows = self._connection.execute(
+                    "SELECT key, value FROM embedding_cache "
+                    f"WHERE key IN ({placeholders}) AND expires_at > ?",
+                    [*batch, now],
+                )
+                values.update(rows)
+        return values
+
+    def set_many(self, items: dict[str, bytes]) -> None:
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM embedding_cache WHERE expires_at <= ?", (now,)
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, value, expires_at) "
+                "VALUES (?, ?, ?)",
+                [(key, value, now + self.ttl) for key, value in items.items()],
+            )
+
+
+class RedisEmbeddingCache(EmbeddingCache):
+    """Cache shared by every host through Redis. Expiry is handled by Redis."""
+
+    prefix = "embedding-cache:"
+
+    def __init__(self, url: str, ttl: int) -> None:
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get_many(self, keys: list[str]) -> dict[str, bytes]:
+        if not keys:
+            return {}
+        values = self.client.mget([self.prefix + key for key in keys])
+        return {
+            key: value
+            for key, value in zip(keys, values, strict=True)
+            if isinstance(value, bytes)
+        }
+
+    def set_many(self, items: dict[str, bytes]) -> None:
+        pipeline = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipeline.set(self.prefix + key, value, ex=self.ttl)
+        pipeline.execute()
+
+
+@lru_cache
+def get_embedding_cache() -> EmbeddingCache | None:
+    """Return the process-wide embedding cache for the configured backend, if any."""
+    if settings.EMBEDDING_CACHE_BACKEND == "sqlite":
+        return SqliteEmbeddingCache(
+            os.path.join(settings.FASTEMBED_CACHE_PATH, "embeddings.sqlite3"),
+            ttl=settings.EMBEDDING_CACHE_TTL,
+        )
+    if settings.EMBEDDING_CACHE_BACKEND == "redis":
+        return RedisEmbeddingCache(
+            url=settings.EMBEDDING_CACHE_REDIS_URL or settings.CELERY_BROKER_URL,
+            ttl=settings.EMBEDDING_CACHE_TTL,
+        )
+    return None
+
+
+def embedding_cache_key(model_name: str, text: str) -> str:
+    return f"{model_name}:{chunk_hash(text)}"
+
+
+def cached_embed(
+    cache: EmbeddingCache | None,
+    model_name: str,
+    texts: list[str],
+    embed: Callable[[list[str]], list[T]],
+    encode: Callable[[T], bytes],
+    decode: Callable[[bytes], T],
+) -> list[T]:
+    """
+    Embed texts, looking up the cache in one batch first. Only the distinct texts that
+    are not cached are embedded, and their embeddings are then cached.
+    """
+    if cache is None:
+        return embed(texts)
+    keys = [embedding_cache_key(model_name, text) for text in texts]
+    embeddings = {key: decode(value) for key, value in cache.get_many(keys).items()}
+    missing = {
+        key: text
+        for key, text in zip(keys, texts, strict=True)
+        if key not in embeddings
+    }
+    if missing:
+        computed = dict(zip(missing, embed(list(missing.values())), strict=True))
+        cache.set_many({key: encode(embedding) for key, embedding in computed.items()})
+        embeddings.update(computed)
+    return [embeddings[key] for key in keys]
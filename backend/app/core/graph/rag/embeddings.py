@@ -0,0 +1,182 @@
+import asyncio
+from array import array
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import NamedTuple, ParamSpec, TypeVar
+
+from fastembed import SparseTextEmbedding, TextEmbedding  # type: ignore[import-untyped]
+from qdrant_client.http import models as rest
+
+from app.core.config import settings
+from app.core.graph.rag.embedding_cache import cached_embed, get_embedding_cache
+from app.models import RetrievalMode
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+# Embedding is CPU bound. It runs in its own pool so that it neither blocks the event
+# loop nor starves the default executor that sync tools and callbacks run in.
+embedding_executor = ThreadPoolExecutor(
+    max_workers=settings.EMBEDDING_THREADS, thread_name_prefix="embedding"
+)
+
+
+class QueryEmbedding(NamedTuple):
+    # None if the query is not searched with that kind of embedding
+    dense: list[float] | None
+    sparse: rest.SparseVector | None
+
+
+@lru_cache
+def get_dense_model() -> TextEmbedding:
+    """Return the process-wide dense embedding model, loading it on first use."""
+    return TextEmbedding(
+        model_name=settings.DENSE_EMBEDDING_MODEL,
+        cache_dir=settings.FASTEMBED_CACHE_PATH,
+    )
+
+
+@lru_cache
+def get_sparse_model() -> SparseTextEmbedding:
+    """Return the process-wide sparse embedding model, loading it on first use."""
+    return SparseTextEmbedding(
+        model_name=settings.SPARSE_EMBEDDING_MODEL,
+        cache_dir=settings.FASTEMBED_CACHE_PATH,
+    )
+
+
+# Vector names and params match those of qdrant-client's fastembed integration, so
+# collections created by `QdrantClient.add` remain compatible.
+
+
+def dense_vector_name() -> str:
+    return f"fast-{settings.DENSE_EMBEDDING_MODEL.split('/')[-1].lower()}"
+
+
+def sparse_vector_name() -> str:
+    return f"fast-sparse-{settings.SPARSE_EMBEDDING_MODEL.split('/')[-1].lower()}"
+
+
+def dense_vector_params(
+    on_disk: bool | None = None,
+) -> dict[str, rest.VectorParams]:
+    """Vector params of the dense embedding model, looked up without loading it."""
+    for description in TextEmbedding.list_supported_models():
+        if description["model"] == settings.DENSE_EMBEDDING_MODEL:
+            return {
+                dense_vector_name(): rest.VectorParams(
+                    size=description["dim"],
+                    distance=rest.Distance.COSINE,
+                    on_disk=on_disk,
+                )
+            }
+    raise ValueError(f"Unsupported embedding model: {settings.DENSE_EMBEDDING_MODEL}")
+
+
+def sparse_vector_params(
+    on_disk: bool | None = None,
+) -> dict[str, rest.SparseVectorParams]:
+    """Sparse vector params, with IDF if the sparse embedding model requires it."""
+    requires_idf = any(
+        description["model"] == settings.SPARSE_EMBEDDING_MODEL
+        and description.get("requires_idf")
+        for description in SparseTextEmbedding.list_supported_models()
+    )
+    return {
+        sparse_vector_name(): rest.SparseVectorParams(
+            index=rest.SparseIndexParams(on_disk=on_disk),
+            modifier=rest.Modifier.IDF if requires_idf else None,
+        )
+    }
+
+
+def embed_dense(texts: list[str]) -> list[list[float]]:
+    """Embed documents with the dense embedding model, through the embedding cache."""
+    return cached_embed(
+        get_embedding_cache(),
+        settings.DENSE_EMBEDDING_MODEL,
+        texts,
+        embed=lambda texts: [
+            embedding.tolist() for embedding in get_dense_model().embed(texts)
+        ],
+        # fastembed's dense embeddings are float32, so this round trip is lossless
+        encode=lambda embedding: array("f", embedding).tobytes(),
+        decode=lambda value: array("f", value).tolist(),
+    )
+
+
+def embed_sparse(texts: list[str]) -> list[rest.SparseVector]:
+    """Embed documents with the sparse embedding model, through the embedding cache."""
+    return cached_embed(
+        get_embedding_cache(),
+        settings.SPARSE_EMBEDDING_MODEL,
+        texts,
+        embed=lambda texts: [
+            rest.SparseVector(
+                indices=embedding.indices.tolist(), values=embedding.values.tolist()
+            )
+            for embedding in get_sparse_model().embed(texts)
+        ],
+        encode=lambda embedding: embedding.model_dump_json().encode(),
+        decode=rest.SparseVector.model_validate_json,
+    )
+
+
+# Queries are embedded through LRU caches, as agents often repeat a query. The returned
+# embeddings are shared and must not be mutated.
+@lru_cache(maxsize=settings.QUERY_EMBEDDING_CACHE_SIZE)
+def embed_dense_query(query: str) -> list[float]:
+    """Embed a query with the dense embedding model."""
+    embedding = next(iter(get_dense_model().query_embed(query)))
+    return embedding.tolist()  # type: ignore[no-any-return]
+
+
+@lru_cache(maxsize=settings.QUERY_EMBEDDING_CACHE_SIZE)
+def embed_sparse_query(query: str) -> rest.SparseVector:
+    """Embed a query with the sparse embedding model."""
+    sparse = next(iter(get_sparse_model().query_embed(query)))
+    return rest.SparseVector(
+        indices=sparse.indices.tolist(), values=sparse.values.tolist()
+    )
+
+
+def embed_query(
+    query: str, mode: RetrievalMode = RetrievalMode.HYBRID
+) -> QueryEmbedding:
+    """Embed a query with the embedding models of the retrieval mode."""
+    return QueryEmbedding(
+        dense=embed_dense_query(query) if mode != RetrievalMode.SPARSE else None,
+        sparse=embed_sparse_query(query) if mode != RetrievalMode.DENSE else None,
+    )
+
+
+def embed_queries(
+    queries: list[str], mode: RetrievalMode = RetrievalMode.HYBRID
+) -> list[QueryEmbedding]:
+    """Embed several queries in one batch per embedding model of the retrieval mode."""
+    dense: list[list[float] | None] = [None] * len(queries)
+    sparse: list[rest.SparseVector | None] = [None] * len(queries)
+    if mode != RetrievalMode.SPARSE:
+        dense = [
+            embedding.tolist() for embedding in get_dense_model().query_embed(queries)
+        ]
+    if mode != RetrievalMode.DENSE:
+        sparse = [
+            rest.SparseVector(
+                indices=embedding.indices.tolist(), values=embedding.values.tolist()
+            )
+            for embedding in get_sparse_model().query_embed(queries)
+        ]
+    return [
+        QueryEmbedding(dense=dense_embedding, sparse=sparse_embedding)
+        for dense_embedding, sparse_embedding in zip(dense, sparse, strict=True)
+    ]
+
+
+async def run_in_embedding_executor(
+    func: Callable[P, T], *args: P.args, **kwargs: P.kwargs
+) -> T:
+    """Run an embedding function off the event loop, in the embedding executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(embedding_executor, lambda: func(*args, **kwargs))
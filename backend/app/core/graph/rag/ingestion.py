@@ -0,0 +1,318 @@
+import hashlib
+import re
+import uuid
+from collections import Counter, defaultdict, deque
+from collections.abc import Iterable, Iterator
+from itertools import islice
+from typing import Any, NamedTuple, TypeVar
+
+import pymupdf  # type: ignore[import-untyped]
+from billiard import Pool  # type: ignore[import-untyped]
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# Namespace of the deterministic ids of chunk points
+CHUNK_NAMESPACE = uuid.UUID("5b0c3f3e-8d1a-4d0b-9c59-2f0e6f1a7c21")
+
+# Lines at the top and bottom of a page that may be headers or footers
+BOILERPLATE_EDGE_LINES = 3
+# A line is boilerplate if it is at the edge of at least this share of the pages...
+BOILERPLATE_MIN_PAGE_SHARE = 0.5
+# ...and of at least this many pages
+BOILERPLATE_MIN_PAGES = 3
+# Longer lines are body text, however often they repeat
+BOILERPLATE_MAX_LINE_LENGTH = 200
+# Pages, spread evenly across a document, whose edges are read to find its boilerplate
+BOILERPLATE_SAMPLE_PAGES = 20
+
+SIMHASH_BITS = 64
+# Words per shingle of a chunk's SimHash
+SIMHASH_SHINGLE_SIZE = 3
+
+
+class Chunk(NamedTuple):
+    id: str
+    # Position of the chunk in its document, from 0
+    position: int
+    page: int
+    hash: str
+    text: str
+
+
+class IngestionProgress(NamedTuple):
+    # Pages whose chunks are all stored
+    pages_processed: int
+    pages_total: int
+    # Chunks that are stored, in order from the start of the document
+    chunks_embedded: int
+
+
+class IngestionPart(NamedTuple):
+    """A range of pages that a subtask ingests, as planned by the coordinator."""
+
+    # Pages [start, stop), numbered from 0
+    start: int
+    stop: int
+    # Position of the range's first chunk in the document
+    first_index: int
+    # Point id of each chunk of the range, or None if the chunk is already stored
+    ids: list[str | None]
+    # Positions among the range's chunk texts of those dropped as duplicates
+    dropped: list[int]
+    # Normalised header and footer lines to strip from the range's pages
+    boilerplate: list[str]
+
+
+class ChunkFingerprint(NamedTuple):
+    """What planning a distributed ingestion needs to know of a chunk, but its text."""
+
+    page: int
+    hash: str
+    # SimHash of the text, or 0 if near duplicates are not filtered
+    simhash: int
+
+
+class IngestionPlan(NamedTuple):
+    parts: list[IngestionPart]
+    # New positions of the existing points of chunks that moved, by id
+    moved: dict[str, int]
+    # Existing points whose chunks are no longer in the document
+    vanished: list[str]
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def chunk_id(upload_id: int, digest: str, occurrence: int) -> str:
+    """
+    Deterministic point id of a chunk, so that an unchanged chunk keeps its point when
+    its upload is re-ingested. `occurrence` tells apart identical chunks of the upload.
+    """
+    return str(uuid.uuid5(CHUNK_NAMESPACE, f"{upload_id}:{digest}:{occurrence}"))
+
+
+def identify_chunks(
+    texts: Iterable[tuple[int, str]], upload_id: int
+) -> Iterator[Chunk]:
+    """Give the chunk texts of a document, with their page numbers, their point ids."""
+    occurrences: Counter[str] = Counter()
+    for index, (page, text) in enumerate(texts):
+        digest = chunk_hash(text)
+        point_id = chunk_id(upload_id, digest, occurrences[digest])
+        occurrences[digest] += 1
+        yield Chunk(id=point_id, position=index, page=page, hash=digest, text=text)
+
+
+def normalise_line(line: str) -> str:
+    """Normalise a line so that headers and footers match across pages."""
+    # Digits are masked so that page numbers and dates do not tell pages apart
+    return re.sub(r"\d+", "#", " ".join(line.split()).lower())
+
+
+def edge_lines(content: str) -> tuple[list[str], list[str], list[str]]:
+    """Split a page into its leading edge lines, its body and its trailing edge lines."""
+    lines = content.splitlines()
+    head = min(BOILERPLATE_EDGE_LINES, len(lines))
+    tail = min(BOILERPLATE_EDGE_LINES, len(lines) - head)
+    return lines[:head], lines[head : len(lines) - tail], lines[len(lines) - tail :]
+
+
+def count_edge_lines(pages: Iterable[str]) -> tuple[Counter[str], int]:
+    """
+    Count the pages whose top or bottom has each normalised line, and the pages. The
+    counts of the parts of a document add up to those of the whole document.
+    """
+    counts: Counter[str] = Counter()
+    page_count = 0
+    for content in pages:
+        page_count += 1
+        head, _, tail = edge_lines(content)
+        counts.update(
+            {
+                normalised
+                for line in head + tail
+                if (normalised := normalise_line(line))
+                and len(normalised) <= BOILERPLATE_MAX_LINE_LENGTH
+            }
+        )
+    return counts, page_count
+
+
+def select_boilerplate(counts: Counter[str], page_count: int) -> set[str]:
+    """The edge lines counted on enough pages of a document to be boilerplate."""
+    min_pages = max(BOILERPLATE_MIN_PAGES, BOILERPLATE_MIN_PAGE_SHARE * page_count)
+    return {line for line, count in counts.items() if count >= min_pages}
+
+
+def find_boilerplate(pages: Iterable[str]) -> set[str]:
+    """
+    Find the headers and footers of a document: the normalised lines that recur at the
+    top or bottom of many of its pages.
+    """
+    return select_boilerplate(*count_edge_lines(pages))
+
+
+def strip_boilerplate(content: str, boilerplate: set[str]) -> str:
+    """Remove the header and footer lines from the edges of a page."""
+    if not boilerplate:
+        return content
+    head, body, tail = edge_lines(content)
+    return "\n".join(
+        [line for line in head if normalise_line(line) not in boilerplate]
+        + body
+        + [line for line in tail if normalise_line(line) not in boilerplate]
+    )
+
+
+def simhash(text: str) -> int:
+    """
+    SimHash of a text's word shingles. Similar texts have hashes that differ in few
+    bits.
+    """
+    words = re.findall(r"\w+", text.lower())
+    shingle_count = max(1, len(words) - SIMHASH_SHINGLE_SIZE + 1)
+    weights = [0] * SIMHASH_BITS
+    for start in range(shingle_count):
+        shingle = " ".join(words[start : start + SIMHASH_SHINGLE_SIZE])
+        digest = hashlib.blake2b(shingle.encode(), digest_size=SIMHASH_BITS // 8)
+        value = int.from_bytes(digest.digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+class DuplicateFilter:
+    """
+    Tells apart the chunks of a document that duplicate an earlier chunk, exactly or
+    nearly, i.e. with SimHashes at most `max_distance` bits apart.
+
+    SimHashes are indexed in `max_distance + 1` bands of bits. Hashes that differ in
+    at most `max_distance` bits agree on at least one band, so only the hashes that
+    share a band with a chunk's are compared with it.
+    """
+
+    def __init__(self, max_distance: int) -> None:
+        self.max_distance = max_distance
+        self._band_bits = SIMHASH_BITS // (max_distance + 1)
+        self._hashes: set[str] = set()
+        self._bands: list[defaultdict[int, list[int]]] = [
+            defaultdict(list) for _ in range(max_distance + 1)
+        ]
+
+    def _band_keys(self, fingerprint: int) -> list[int]:
+        mask = (1 << self._band_bits) - 1
+        return [
+            fingerprint >> (band * self._band_bits) & mask
+            for band in range(len(self._bands))
+        ]
+
+    def is_duplicate(self, text: str) -> bool:
+        """Whether the text duplicates one seen before. If not, it is remembered."""
+        fingerprint = simhash(text) if self.max_distance else 0
+        return self.is_duplicate_hash(chunk_hash(text), fingerprint)
+
+    def is_duplicate_hash(self, digest: str, fingerprint: int) -> bool:
+        """Like `is_duplicate`, given the text's hash and SimHash."""
+        if digest in self._hashes:
+            return True
+        if self.max_distance == 0:
+            self._hashes.add(digest)
+            return False
+        keys = self._band_keys(fingerprint)
+        for band, key in zip(self._bands, keys, strict=True):
+            for candidate in band.get(key, ()):
+                if (candidate ^ fingerprint).bit_count() <= self.max_distance:
+                    return True
+        self._hashes.add(digest)
+        for band, key in zip(self._bands, keys, strict=True):
+            band[key].append(fingerprint)
+        return False
+
+
+def create_duplicate_filter() -> DuplicateFilter | None:
+    """Return a duplicate filter for a document, or None if chunks are not deduplicated."""
+    distance = settings.INGESTION_NEAR_DUPLICATE_DISTANCE
+    return None if distance is None else DuplicateFilter(distance)
+
+
+def drop_duplicates(
+    texts: Iterable[tuple[int, str]], duplicates: DuplicateFilter | None
+) -> Iterator[tuple[int, str]]:
+    """Drop the chunk texts that duplicate an earlier one, exactly or nearly."""
+    for page, text in texts:
+        if duplicates is None or not duplicates.is_duplicate(text):
+            yield page, text
+
+
+def batched(iterable: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Yield lists of up to `size` items from the iterable, without reading ahead."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def page_ranges(page_count: int, size: int) -> list[tuple[int, int]]:
+    """Split the pages of a document into [start, stop) ranges of up to `size` pages."""
+    return [
+        (start, min(start + size, page_count)) for start in range(0, page_count, size)
+    ]
+
+
+def extract_pages(file_path: str, start: int, stop: int) -> list[str]:
+    """Extract the text of a range of pages. Runs in a worker process."""
+    with pymupdf.open(file_path) as doc:
+        return [doc[number].get_text() for number in range(start, stop)]
+
+
+def sample_pages(page_count: int, size: int) -> list[int]:
+    """The numbers of up to `size` pages spread evenly across a document."""
+    if page_count <= size:
+        return list(range(page_count))
+    return [index * page_count // size for index in range(size)]
+
+
+def count_pages(file_path: str) -> int:
+    with pymupdf.open(file_path) as doc:
+        return doc.page_count  # type: ignore[no-any-return]
+
+
+def iter_pages(file_path: str) -> Iterator[str]:
+    """
+    Yield the text of every page of a PDF in order.
+
+    Page ranges are extracted in parallel in a process pool. At most two ranges per
+    worker are in flight, so memory stays bounded however large the document is. The
+    pool is billiard's, Celery's fork of multiprocessing, whose processes may be
+    created by daemonic processes such as Celery's prefork children.
+    """
+    ranges = page_ranges(count_pages(file_path), settings.INGESTION_PAGES_PER_TASK)
+
+    if settings.INGESTION_WORKERS <= 1 or len(ranges) <= 1:
+        for start, stop in ranges:
+            yield from extract_pages(file_path, start, stop)
+        return
+
+    max_in_flight = 2 * settings.INGESTION_WORKERS
+    with Pool(processes=min(settings.INGESTION_WORKERS, len(ranges))) as pool:
+        pending: deque[Any] = deque()
+        for start, stop in ranges:
+            if len(pending) >= max_in_flight:
+                yield from pending.popleft().get()
+            pending.append(pool.apply_async(extract_pages, (file_path, start, stop)))
+        while pending:
+            yield from pending.popleft().get()
+
+
+def document_boilerplate(file_path: str) -> set[str]:
+    """
+    Find the headers and footers of a PDF, if they are to be stripped. Only a sample
+    of its pages is extracted for this, so that large documents are not read twice.
+    """
+    if not settings.INGESTION_STRIP_BOILERPLATE:
+        return set()
+    with pymupdf.open(file_path) as doc:
+        numbers = sample_pages(doc.page_count, BOILERPLATE_SAMPLE_PAGES)
+        return find_boilerplate(doc[number].get_text() for number in numbers)
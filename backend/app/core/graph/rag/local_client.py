@@ -0,0 +1,22 @@
+import asyncio
+from typing import Any
+
+from qdrant_client import QdrantClient
+
+
+class LocalAsyncClient:
+    """
+    Async interface to a local Qdrant client. Local storage can only be opened once per
+    process, so async calls are made with the sync client, in a thread.
+    """
+
+    def __init__(self, client: QdrantClient) -> None:
+        self._client = client
+
+    def __getattr__(self, name: str) -> Any:
+        method = getattr(self._client, name)
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            return await asyncio.to_thread(method, *args, **kwargs)
+
+        return call
@@ -1,14 +1,156 @@
-from collections.abc import Callable
+import asyncio
+import logging
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from typing import Any
+from weakref import WeakKeyDictionary
 
-import pymupdf  # type: ignore[import-untyped]
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.http import models as rest
 
 from app.core.config import settings
-from app.core.graph.rag.qdrant_retriever import QdrantRetriever
+from app.core.graph.rag.embeddings import (
+    dense_vector_name,
+    dense_vector_params,
+    embed_dense,
+    embed_sparse,
+    sparse_vector_name,
+    sparse_vector_params,
+)
+from app.core.graph.rag.ingestion import (
+    Chunk,
+    ChunkFingerprint,
+    IngestionPart,
+    IngestionPlan,
+    IngestionProgress,
+    batched,
+    chunk_hash,
+    chunk_id,
+    count_pages,
+    create_duplicate_filter,
+    document_boilerplate,
+    drop_duplicates,
+    extract_pages,
+    identify_chunks,
+    iter_pages,
+    simhash,
+    strip_boilerplate,
+)
+from app.core.graph.rag.local_client import LocalAsyncClient
+from app.core.graph.rag.qdrant_retriever import (
+    QdrantRetriever,
+)
+from app.models import RetrievalConfig, RetrievalMode
+
+logger = logging.getLogger(__name__)
+
+# Payload field that groups points by tenant, for Qdrant's tenant-aware indexing
+TENANT_FIELD = "group_id"
+
+# Collections that this process has already ensured exist, with their payload indexes
+_ensured_collections: set[str] = set()
+
+
+def tenant_id(user_id: int) -> str:
+    return str(user_id)
+
+
+def split_pages(
+    pages: Iterable[str], first_page: int, chunk_size: int, chunk_overlap: int
+) -> Iterator[tuple[int, str]]:
+    """Split pages into chunk texts, each with the number of its page."""
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
+    for page, content in enumerate(pages, start=first_page):
+        for text in text_splitter.split_text(content):
+            yield page, text
+
+
+def split_page_range(
+    file_path: str,
+    start: int,
+    stop: int,
+    boilerplate: set[str],
+    chunk_size: int,
+    chunk_overlap: int,
+) -> Iterator[tuple[int, str]]:
+    """Extract a range of pages of a PDF and split them into chunk texts."""
+    pages = [
+        strip_boilerplate(page, boilerplate)
+        for page in extract_pages(file_path, start, stop)
+    ]
+    return split_pages(pages, start + 1, chunk_size, chunk_overlap)
+
+
+def fingerprint_page_range(
+    file_path: str,
+    start: int,
+    stop: int,
+    boilerplate: set[str],
+    chunk_size: int,
+    chunk_overlap: int,
+) -> list[ChunkFingerprint]:
+    """
+    Fingerprint the chunks of a range of pages, so that a distributed ingestion can be
+    planned without extracting the whole document in one place.
+    """
+    near_duplicates = bool(settings.INGESTION_NEAR_DUPLICATE_DISTANCE)
+    return [
+        ChunkFingerprint(
+            page, chunk_hash(text), simhash(text) if near_duplicates else 0
+        )
+        for page, text in split_page_range(
+            file_path, start, stop, boilerplate, chunk_size, chunk_overlap
+        )
+    ]
+
+
+@lru_cache
+def get_client() -> QdrantClient:
+    """Return the process-wide Qdrant client, so that its connection is reused."""
+    if settings.QDRANT_BACKEND == "local":
+        if settings.QDRANT_LOCAL_PATH == ":memory:":
+            return QdrantClient(location=":memory:")
+        return QdrantClient(path=settings.QDRANT_LOCAL_PATH)
+    return QdrantClient(
+        url=settings.QDRANT_URL,
+        api_key=settings.QDRANT__SERVICE__API_KEY,
+        prefer_grpc=True,
+        timeout=settings.QDRANT_TIMEOUT,
+    )
+
+
+# Async clients by event loop, as their connections are bound to the loop they are used in
+_async_clients: WeakKeyDictionary[
+    asyncio.AbstractEventLoop, AsyncQdrantClient | LocalAsyncClient
+] = WeakKeyDictionary()
+
+
+def get_async_client() -> AsyncQdrantClient | LocalAsyncClient:
+    """
+    Return the async Qdrant client of the running event loop, so that its connections
+    are reused by the loop without being shared with other loops, e.g. Celery tasks'.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        if settings.QDRANT_BACKEND == "local":
+            client = LocalAsyncClient(get_client())
+        else:
+            client = AsyncQdrantClient(
+                url=settings.QDRANT_URL,
+                api_key=settings.QDRANT__SERVICE__API_KEY,
+                prefer_grpc=True,
+                timeout=settings.QDRANT_TIMEOUT,
+            )
+        _async_clients[loop] = client
+    return client
 
 
 class QdrantStore:
@@ -17,7 +159,6 @@ class QdrantStore:
     """
 
     collection_name = settings.QDRANT_COLLECTION
-    url = settings.QDRANT_URL
 
     def __init__(self) -> None:
         self.client = self._create_collection()
@@ -30,43 +171,303 @@ class QdrantStore:
         chunk_size: int = 500,
         chunk_overlap: int = 50,
         callback: Callable[[], None] | None = None,
+        progress: Callable[[IngestionProgress], None] | None = None,
+        mode: RetrievalMode = RetrievalMode.HYBRID,
     ) -> None:
         """
         Uploads a PDF document to the Qdrant vector store after converting it to markdown and splitting into chunks.
 
+        Chunks already stored by an earlier, interrupted attempt are not embedded again, so a retried
+        ingestion resumes after the last batch it committed.
+
         Args:
             upload_name (str): The name of the upload (PDF file path).
             user_id (int): The ID of the user uploading the document.
             chunk_size (int, optional): The size of each text chunk. Defaults to 500.
             chunk_overlap (int, optional): The overlap size between chunks. Defaults to 50.
+            progress (Callable, optional): Called with the progress after each committed batch.
+            mode (RetrievalMode, optional): Which embeddings the chunks are given. Defaults to hybrid.
         """
-        doc = pymupdf.open(file_path)
-        documents = [
-            Document(
-                page_content=page.get_text().encode("utf8"),
-                metadata={"user_id": user_id, "upload_id": upload_id},
-            )
-            for page in doc
-        ]
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
+        existing = self._existing_chunks(upload_id, user_id)
+        self._ingest(
+            file_path,
+            upload_id,
+            user_id,
+            chunk_size,
+            chunk_overlap,
+            existing,
+            progress,
+            mode,
         )
-        docs = text_splitter.split_documents(documents)
+        callback() if callback else None
 
-        doc_texts: list[str] = []
-        metadata: list[dict[Any, Any]] = []
-        for doc in docs:
-            doc_texts.append(doc.page_content)
-            metadata.append(doc.metadata)
+    def _ingest(
+        self,
+        file_path: str,
+        upload_id: int,
+        user_id: int,
+        chunk_size: int,
+        chunk_overlap: int,
+        existing: dict[str, int | None],
+        progress: Callable[[IngestionProgress], None] | None = None,
+        mode: RetrievalMode = RetrievalMode.HYBRID,
+    ) -> set[str]:
+        """
+        Embed and upsert the chunks of a PDF that are not among the upload's existing
+        points. Existing points of chunks that moved are given their new position.
 
-        self.client.add(
-            collection_name=self.collection_name,
-            documents=doc_texts,
-            metadata=metadata,
+        Args:
+            existing (dict[str, int | None]): Position of each existing point, by id.
+            progress (Callable, optional): Called with the progress after each batch
+                is committed, and once more when all chunks are stored.
+
+        Returns:
+            set[str]: The ids of the points of all of the PDF's chunks.
+        """
+        pages_total = count_pages(file_path)
+        boilerplate = document_boilerplate(file_path)
+        # Pages are chunked as they are extracted, so the document is never held in memory
+        pages = (strip_boilerplate(page, boilerplate) for page in iter_pages(file_path))
+        texts = drop_duplicates(
+            split_pages(pages, 1, chunk_size, chunk_overlap), create_duplicate_filter()
         )
+        seen: set[str] = set()
+        moved: dict[str, int] = {}
 
-        callback() if callback else None
+        def new_chunks() -> Iterator[Chunk]:
+            for chunk in identify_chunks(texts, upload_id):
+                seen.add(chunk.id)
+                if chunk.id not in existing:
+                    yield chunk
+                elif existing[chunk.id] != chunk.position:
+                    moved[chunk.id] = chunk.position
+
+        def committed(chunk: Chunk) -> None:
+            # Chunks are stored in order, so every chunk up to this one is stored, and
+            # so are all pages before its own
+            if progress:
+                progress(
+                    IngestionProgress(chunk.page - 1, pages_total, chunk.position + 1)
+                )
+
+        self._upsert(new_chunks(), self._metadata(upload_id, user_id), mode, committed)
+        self._move(moved)
+        if progress:
+            progress(IngestionProgress(pages_total, pages_total, len(seen)))
+        return seen
+
+    def plan(
+        self,
+        upload_id: int,
+        user_id: int,
+        ranges: list[tuple[int, int]],
+        fingerprints: list[list[ChunkFingerprint]],
+        boilerplate: set[str],
+    ) -> IngestionPlan:
+        """
+        Plan the ingestion of a PDF in parts, one per range of its pages, which can be
+        ingested concurrently with `ingest_part` and completed with `finish_ingestion`.
+
+        Chunk ids and positions depend on the chunks before them, so they are given here
+        in document order. Only the chunks' fingerprints are needed, which the ranges'
+        subtasks extract and split the pages for with `fingerprint_page_range`.
+        """
+        existing = self._existing_chunks(upload_id, user_id)
+        duplicates = create_duplicate_filter()
+        occurrences: Counter[str] = Counter()
+        seen: set[str] = set()
+        moved: dict[str, int] = {}
+        parts: list[IngestionPart] = []
+        position = 0
+        for (start, stop), range_fingerprints in zip(ranges, fingerprints, strict=True):
+            first_index = position
+            ids: list[str | None] = []
+            dropped: list[int] = []
+            for offset, fingerprint in enumerate(range_fingerprints):
+                if duplicates and duplicates.is_duplicate_hash(
+                    fingerprint.hash, fingerprint.simhash
+                ):
+                    dropped.append(offset)
+                    continue
+                point_id = chunk_id(
+                    upload_id, fingerprint.hash, occurrences[fingerprint.hash]
+                )
+                occurrences[fingerprint.hash] += 1
+                seen.add(point_id)
+                if point_id not in existing:
+                    ids.append(point_id)
+                else:
+                    ids.append(None)
+                    if existing[point_id] != position:
+                        moved[point_id] = position
+                position += 1
+            parts.append(
+                IngestionPart(
+                    start, stop, first_index, ids, dropped, sorted(boilerplate)
+                )
+            )
+        return IngestionPlan(
+            parts=parts,
+            moved=moved,
+            vanished=[point_id for point_id in existing if point_id not in seen],
+        )
+
+    def ingest_part(
+        self,
+        file_path: str,
+        upload_id: int,
+        user_id: int,
+        chunk_size: int,
+        chunk_overlap: int,
+        part: IngestionPart,
+        mode: RetrievalMode = RetrievalMode.HYBRID,
+    ) -> None:
+        """Embed and upsert the chunks of a planned part that are not stored yet."""
+        if not any(part.ids):
+            return
+        dropped = set(part.dropped)
+        texts = (
+            (page, text)
+            for offset, (page, text) in enumerate(
+                split_page_range(
+                    file_path,
+                    part.start,
+                    part.stop,
+                    set(part.boilerplate),
+                    chunk_size,
+                    chunk_overlap,
+                )
+            )
+            if offset not in dropped
+        )
+        # Fails if the part's pages no longer split into the planned chunks
+        chunks = (
+            Chunk(
+                id=point_id,
+                position=part.first_index + offset,
+                page=page,
+                hash=chunk_hash(text),
+                text=text,
+            )
+            for offset, ((page, text), point_id) in enumerate(
+                zip(texts, part.ids, strict=True)
+            )
+            if point_id is not None
+        )
+        self._upsert(chunks, self._metadata(upload_id, user_id), mode)
+
+    def finish_ingestion(self, moved: dict[str, int], vanished: list[str]) -> None:
+        """Reposition and delete the existing points of a planned ingestion."""
+        self._move(moved)
+        self._delete_points(vanished)
+
+    def _metadata(self, upload_id: int, user_id: int) -> dict[str, Any]:
+        return {
+            "user_id": user_id,
+            "upload_id": upload_id,
+            TENANT_FIELD: tenant_id(user_id),
+        }
+
+    def _upsert(
+        self,
+        chunks: Iterable[Chunk],
+        metadata: dict[str, Any],
+        mode: RetrievalMode,
+        committed: Callable[[Chunk], None] | None = None,
+    ) -> None:
+        """
+        Embed and upsert chunks in batches. `committed` is called with the last chunk
+        of each batch once the batch is stored.
+        """
+        # Embed the next batch while the previous one is upserted. Waiting for the
+        # previous upsert before submitting keeps at most one batch in flight.
+        with ThreadPoolExecutor(max_workers=1) as uploader:
+            pending: tuple[Future[Any], Chunk] | None = None
+            for batch in batched(chunks, settings.INGESTION_BATCH_SIZE):
+                points = self._points(batch, metadata, mode)
+                if pending:
+                    pending[0].result()
+                    committed(pending[1]) if committed else None
+                future = uploader.submit(
+                    self.client.upsert,
+                    collection_name=self.collection_name,
+                    points=points,
+                    wait=True,
+                )
+                pending = (future, batch[-1])
+            if pending:
+                pending[0].result()
+                committed(pending[1]) if committed else None
+
+    def _move(self, moved: dict[str, int]) -> None:
+        """Give existing points of chunks that moved their new position."""
+        for moves in batched(moved.items(), settings.INGESTION_BATCH_SIZE):
+            self.client.batch_update_points(
+                collection_name=self.collection_name,
+                update_operations=[
+                    rest.SetPayloadOperation(
+                        set_payload=rest.SetPayload(
+                            payload={"chunk_index": index}, points=[point_id]
+                        )
+                    )
+                    for point_id, index in moves
+                ],
+            )
+
+    def _delete_points(self, point_ids: list[str]) -> None:
+        for ids in batched(point_ids, 1000):
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=rest.PointIdsList(points=ids),  # type: ignore[arg-type]
+            )
+
+    def _points(
+        self, chunks: list[Chunk], metadata: dict[str, Any], mode: RetrievalMode
+    ) -> list[rest.PointStruct]:
+        """
+        Embed a batch of chunks into points. Payloads are laid out like those of
+        `QdrantClient.add`, with the position and hash of each chunk. Only the
+        embeddings of the retrieval mode are computed; points may lack either vector.
+        """
+        texts = [chunk.text for chunk in chunks]
+        vectors: list[dict[str, Any]] = [{} for _ in chunks]
+        if mode != RetrievalMode.SPARSE:
+            for vector, dense in zip(vectors, embed_dense(texts), strict=True):
+                vector[dense_vector_name()] = dense
+        if mode != RetrievalMode.DENSE:
+            for vector, sparse in zip(vectors, embed_sparse(texts), strict=True):
+                vector[sparse_vector_name()] = sparse
+        return [
+            rest.PointStruct(
+                id=chunk.id,
+                vector=vector,
+                payload={
+                    "document": chunk.text,
+                    **metadata,
+                    "chunk_index": chunk.position,
+                    "chunk_hash": chunk.hash,
+                },
+            )
+            for chunk, vector in zip(chunks, vectors, strict=True)
+        ]
+
+    def _existing_chunks(self, upload_id: int, user_id: int) -> dict[str, int | None]:
+        """Position of each point of the upload, by id."""
+        existing: dict[str, int | None] = {}
+        offset: rest.ExtendedPointId | None = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=self._upload_filter(upload_id, user_id),
+                limit=1000,
+                offset=offset,
+                with_payload=["chunk_index"],
+                with_vectors=False,
+            )
+            for point in points:
+                existing[str(point.id)] = (point.payload or {}).get("chunk_index")
+            if offset is None:
+                return existing
 
     def _create_collection(self) -> QdrantClient:
         """
@@ -77,36 +478,188 @@ class QdrantStore:
         Returns:
             QdrantClient: An instance of the Qdrant client.
         """
-        client = QdrantClient(
-            url=self.url, api_key=settings.QDRANT__SERVICE__API_KEY, prefer_grpc=True
-        )
-        client.set_model(settings.DENSE_EMBEDDING_MODEL)
-        client.set_sparse_model(settings.SPARSE_EMBEDDING_MODEL)
+        client = get_client()
+        if self.collection_name in _ensured_collections:
+            return client
         if not client.collection_exists(self.collection_name):
             client.create_collection(
                 collection_name=self.collection_name,
-                vectors_config=client.get_fastembed_vector_params(),
-                sparse_vectors_config=client.get_fastembed_sparse_vector_params(),
+                vectors_config=dense_vector_params(
+                    on_disk=settings.QDRANT_VECTORS_ON_DISK
+                ),
+                sparse_vectors_config=sparse_vector_params(
+                    on_disk=settings.QDRANT_VECTORS_ON_DISK
+                ),
+                hnsw_config=self._hnsw_config(),
+                quantization_config=self._quantization_config(),
             )
+        self._create_payload_indexes(client)
+        _ensured_collections.add(self.collection_name)
         return client
 
-    def delete(self, upload_id: int, user_id: int) -> None:
-        """Delete points from collection where upload_id and user_id in metadata matches."""
-        self.client.delete(
+    def _payload_indexes(self) -> dict[str, rest.PayloadSchemaParams]:
+        """Indexes of the payload fields that every search and delete filters on."""
+        indexes: dict[str, rest.PayloadSchemaParams] = {
+            "user_id": rest.IntegerIndexParams(
+                type=rest.IntegerIndexType.INTEGER, lookup=True, range=False
+            ),
+            "upload_id": rest.IntegerIndexParams(
+                type=rest.IntegerIndexType.INTEGER, lookup=True, range=False
+            ),
+        }
+        if settings.QDRANT_MULTITENANT:
+            # Co-locates each tenant's points and lets Qdrant build per-tenant graphs
+            indexes[TENANT_FIELD] = rest.KeywordIndexParams(
+                type=rest.KeywordIndexType.KEYWORD, is_tenant=True
+            )
+        return indexes
+
+    def _hnsw_config(self) -> rest.HnswConfigDiff | None:
+        """
+        HNSW parameters from the settings. In multitenant mode, graphs are built per
+        tenant instead of one global graph, and every search is expected to filter on
+        the tenant.
+        """
+        if settings.QDRANT_MULTITENANT:
+            return rest.HnswConfigDiff(
+                m=0,
+                payload_m=settings.QDRANT_TENANT_PAYLOAD_M,
+                ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT,
+            )
+        if settings.QDRANT_HNSW_M is None and settings.QDRANT_HNSW_EF_CONSTRUCT is None:
+            return None
+        return rest.HnswConfigDiff(
+            m=settings.QDRANT_HNSW_M, ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT
+        )
+
+    def _quantization_config(self) -> rest.QuantizationConfig | None:
+        """Quantization of the dense vectors, from the settings."""
+        if settings.QDRANT_QUANTIZATION == "scalar":
+            return rest.ScalarQuantization(
+                scalar=rest.ScalarQuantizationConfig(
+                    type=rest.ScalarType.INT8,
+                    quantile=0.99,
+                    always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM,
+                )
+            )
+        if settings.QDRANT_QUANTIZATION == "binary":
+            return rest.BinaryQuantization(
+                binary=rest.BinaryQuantizationConfig(
+                    always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM
+                )
+            )
+        return None
+
+    def _search_params(self) -> rest.SearchParams | None:
+        """Dense search params that rescore quantized results, if vectors are quantized."""
+        if settings.QDRANT_QUANTIZATION == "none":
+            return None
+        return rest.SearchParams(
+            quantization=rest.QuantizationSearchParams(
+                rescore=settings.QDRANT_QUANTIZATION_RESCORE,
+                oversampling=settings.QDRANT_QUANTIZATION_OVERSAMPLING,
+            )
+        )
+
+    def _create_payload_indexes(self, client: QdrantClient) -> None:
+        """Create the payload indexes that the collection is missing."""
+        payload_schema = client.get_collection(self.collection_name).payload_schema
+        for field_name, field_schema in self._payload_indexes().items():
+            if field_name not in payload_schema:
+                client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema,
+                    wait=True,
+                )
+
+    def migrate(self) -> None:
+        """
+        Bring an existing collection up to date with the configured layout.
+
+        Creates missing payload indexes and applies the storage profile: on-disk
+        vectors, quantization and HNSW parameters. Qdrant rebuilds the affected
+        segments in the background. In multitenant mode, also sets the tenant of points
+        ingested before multitenancy was enabled. Safe to run repeatedly.
+        """
+        self._create_payload_indexes(self.client)
+        self.client.update_collection(
             collection_name=self.collection_name,
-            points_selector=rest.FilterSelector(
-                filter=rest.Filter(
+            vectors_config={
+                dense_vector_name(): rest.VectorParamsDiff(
+                    on_disk=settings.QDRANT_VECTORS_ON_DISK
+                )
+            },
+            sparse_vectors_config=sparse_vector_params(
+                on_disk=settings.QDRANT_VECTORS_ON_DISK
+            ),
+            hnsw_config=self._hnsw_config(),
+            quantization_config=self._quantization_config() or rest.Disabled.DISABLED,
+        )
+        if not settings.QDRANT_MULTITENANT:
+            return
+        without_tenant = rest.IsEmptyCondition(
+            is_empty=rest.PayloadField(key=TENANT_FIELD)
+        )
+        # Points without a user cannot be given a tenant, so they are skipped
+        without_user = rest.IsEmptyCondition(is_empty=rest.PayloadField(key="user_id"))
+        while True:
+            points, _ = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=rest.Filter(
+                    must=[without_tenant], must_not=[without_user]
+                ),
+                limit=1,
+                with_payload=["user_id"],
+            )
+            if not points:
+                break
+            user_id = (points[0].payload or {}).get("user_id")
+            if user_id is None:
+                break
+            # Set the tenant of all of this user's remaining points at once
+            self.client.set_payload(
+                collection_name=self.collection_name,
+                payload={TENANT_FIELD: tenant_id(user_id)},
+                points=rest.Filter(
                     must=[
                         rest.FieldCondition(
-                            key="user_id",
-                            match=rest.MatchValue(value=user_id),
-                        ),
-                        rest.FieldCondition(
-                            key="upload_id",
-                            match=rest.MatchValue(value=upload_id),
+                            key="user_id", match=rest.MatchValue(value=user_id)
                         ),
+                        without_tenant,
                     ]
-                )
+                ),
+                wait=True,
+            )
+        skipped = self.client.count(
+            collection_name=self.collection_name,
+            count_filter=rest.Filter(must=[without_tenant, without_user]),
+        ).count
+        if skipped:
+            logger.warning(
+                f"Skipped {skipped} points of {self.collection_name} without a user_id"
+            )
+
+    def _upload_filter(self, upload_id: int, user_id: int) -> rest.Filter:
+        return rest.Filter(
+            must=[
+                rest.FieldCondition(
+                    key="user_id",
+                    match=rest.MatchValue(value=user_id),
+                ),
+                rest.FieldCondition(
+                    key="upload_id",
+                    match=rest.MatchValue(value=upload_id),
+                ),
+            ]
+        )
+
+    def delete(self, upload_id: int, user_id: int) -> None:
+        """Delete points from collection where upload_id and user_id in metadata matches."""
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=rest.FilterSelector(
+                filter=self._upload_filter(upload_id, user_id)
             ),
         )
 
@@ -118,74 +671,112 @@ class QdrantStore:
         chunk_size: int = 500,
         chunk_overlap: int = 50,
         callback: Callable[[], None] | None = None,
+        progress: Callable[[IngestionProgress], None] | None = None,
+        mode: RetrievalMode = RetrievalMode.HYBRID,
     ) -> None:
-        """Delete and re-upload the new PDF document to the Qdrant vector store"""
-        self.delete(user_id, upload_id)
-        self.add(file_path, upload_id, user_id, chunk_size, chunk_overlap)
+        """
+        Re-ingest a changed PDF document. Only chunks that are new or changed are
+        embedded, and only points of chunks that vanished are deleted.
+        """
+        existing = self._existing_chunks(upload_id, user_id)
+        seen = self._ingest(
+            file_path,
+            upload_id,
+            user_id,
+            chunk_size,
+            chunk_overlap,
+            existing,
+            progress,
+            mode,
+        )
+        self._delete_points([point_id for point_id in existing if point_id not in seen])
         callback() if callback else None
 
-    def retriever(self, user_id: int, upload_id: int) -> QdrantRetriever:
+    def _tenant_conditions(self, user_ids: list[int]) -> list[rest.FieldCondition]:
+        """In multitenant mode, searches must filter on the tenant to use its graph."""
+        if not settings.QDRANT_MULTITENANT:
+            return []
+        return [
+            rest.FieldCondition(
+                key=TENANT_FIELD,
+                match=rest.MatchAny(any=[tenant_id(user_id) for user_id in user_ids]),
+            )
+        ]
+
+    def retriever(
+        self,
+        user_ids: list[int],
+        upload_names: dict[int, str],
+        config: RetrievalConfig | None = None,
+        upload_versions: dict[int, str] | None = None,
+        mode: RetrievalMode = RetrievalMode.HYBRID,
+    ) -> QdrantRetriever:
         """
-        Creates a VectorStoreRetriever that retrieves results containing the specified user_id and upload_id in the metadata.
+        Creates a VectorStoreRetriever that searches several uploads in a single query. Results are attributed to
+        the upload they come from.
 
         Args:
-            user_id (int): Filters the retriever results to only include those belonging to this user.
-            upload_id (int): Filters the retriever results to only include those from this upload ID.
+            user_ids (list[int]): Filters the retriever results to only include those belonging to these users.
+            upload_names (dict[int, str]): Names of the uploads to search, by upload ID.
+            config (RetrievalConfig, optional): Limits and post-processing of the results.
+            upload_versions (dict[int, str], optional): Versions of the uploads, by upload ID. If given,
+                results are cached until an upload changes version.
+            mode (RetrievalMode, optional): Which embeddings the query is searched with, see `combine_modes`.
 
         Returns:
             VectorStoreRetriever: A VectorStoreRetriever instance.
         """
+        config = config or RetrievalConfig()
         retriever = QdrantRetriever(
             client=self.client,
+            get_async_client=get_async_client,
             collection_name=self.collection_name,
             search_kwargs=rest.Filter(
                 must=[
                     rest.FieldCondition(
                         key="user_id",
-                        match=rest.MatchValue(value=user_id),
+                        match=rest.MatchAny(any=user_ids),
                     ),
                     rest.FieldCondition(
                         key="upload_id",
-                        match=rest.MatchValue(value=upload_id),
+                        match=rest.MatchAny(any=list(upload_names)),
                     ),
+                    *self._tenant_conditions(user_ids),
                 ],
             ),
+            upload_names=upload_names,
+            upload_versions=upload_versions or {},
+            search_params=self._search_params(),
+            k=config.limit,
+            prefetch_k=config.prefetch_limit,
+            retrieval_mode=mode,
+            score_threshold=config.score_threshold,
+            max_context_chars=config.max_context_chars,
+            neighbours=config.neighbours,
         )
         return retriever
 
-    def search(self, user_id: int, upload_ids: list[int], query: str) -> list[Document]:
+    def search(
+        self,
+        user_ids: list[int],
+        upload_names: dict[int, str],
+        queries: list[str],
+        config: RetrievalConfig | None = None,
+        mode: RetrievalMode = RetrievalMode.HYBRID,
+    ) -> list[list[Document]]:
         """
-        Performs a similarity search in the Qdrant vector store for a given query, filtered by user ID and upload names.
+        Searches uploads for several queries at once, see `search_batch`.
 
         Args:
-            user_id (str): The ID of the user performing the search.
-            upload_names (list[str]): A list of upload names to filter the search.
-            query (str): The search query.
+            user_ids (list[int]): The IDs of the users whose uploads are searched.
+            upload_names (dict[int, str]): Names of the uploads to search, by upload ID.
+            queries (list[str]): The search queries.
+            config (RetrievalConfig, optional): Limits and post-processing of the results.
+            mode (RetrievalMode, optional): Which embeddings the queries are searched with.
 
         Returns:
-            List[Document]: A list of documents matching the search criteria.
+            list[list[Document]]: The documents matching each query, in query order.
         """
-        search_results = self.client.query(
-            collection_name=self.collection_name,
-            query_text=query,
-            query_filter=rest.Filter(
-                must=[
-                    rest.FieldCondition(
-                        key="user_id",
-                        match=rest.MatchValue(value=user_id),
-                    ),
-                    rest.FieldCondition(
-                        key="upload_id",
-                        match=rest.MatchAny(any=upload_ids),
-                    ),
-                ],
-            ),
+        return self.retriever(user_ids, upload_names, config, mode=mode).search_batch(
+            queries
         )
-        documents: list[Document] = []
-        for result in search_results:
-            document = Document(
-                page_content=result.document,
-                metadata={"score": result.score},
-            )
-            documents.append(document)
-        return documents
@@ -1,7 +1,291 @@
-from langchain_core.callbacks import CallbackManagerForRetrieverRun
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from itertools import chain
+from typing import Any
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
-from qdrant_client import QdrantClient, models
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+
+from app.core.config import settings
+from app.core.graph.rag.embeddings import (
+    QueryEmbedding,
+    dense_vector_name,
+    embed_queries,
+    embed_query,
+    run_in_embedding_executor,
+    sparse_vector_name,
+)
+from app.core.graph.rag.local_client import LocalAsyncClient
+from app.models import RetrievalMode
+
+# Shortest run of characters shared by the end and start of consecutive chunks that is
+# treated as their overlap when merging them
+MIN_CHUNK_OVERLAP = 10
+
+
+def hybrid_query(
+    embedding: QueryEmbedding,
+    query_filter: models.Filter | None,
+    limit: int,
+    prefetch_limit: int,
+    score_threshold: float | None = None,
+    search_params: models.SearchParams | None = None,
+) -> dict[str, Any]:
+    """
+    Arguments of a `query_points` call that fuses dense and sparse search results with
+    reciprocal rank fusion, as `QdrantClient.query` does. If the query has only one
+    kind of embedding, it is a single search with that embedding instead.
+
+    Fused scores are ranks, so the score threshold applies to the dense similarity of
+    the dense candidates. The search params apply to the dense search, e.g. to rescore
+    quantized vectors.
+    """
+    if embedding.sparse is None:
+        return {
+            "query": embedding.dense,
+            "using": dense_vector_name(),
+            "query_filter": query_filter,
+            "limit": limit,
+            "score_threshold": score_threshold,
+            "search_params": search_params,
+            "with_payload": True,
+        }
+    if embedding.dense is None:
+        return {
+            "query": embedding.sparse,
+            "using": sparse_vector_name(),
+            "query_filter": query_filter,
+            "limit": limit,
+            "with_payload": True,
+        }
+    return {
+        "prefetch": [
+            models.Prefetch(
+                query=embedding.dense,
+                using=dense_vector_name(),
+                filter=query_filter,
+                limit=prefetch_limit,
+                score_threshold=score_threshold,
+                params=search_params,
+            ),
+            models.Prefetch(
+                query=embedding.sparse,
+                using=sparse_vector_name(),
+                filter=query_filter,
+                limit=prefetch_limit,
+            ),
+        ],
+        "query": models.FusionQuery(fusion=models.Fusion.RRF),
+        "limit": limit,
+        "with_payload": True,
+    }
+
+
+def to_query_request(query_kwargs: dict[str, Any]) -> models.QueryRequest:
+    """Turn the arguments of a `query_points` call into a request of a batch query."""
+    kwargs = dict(query_kwargs)
+    return models.QueryRequest(
+        filter=kwargs.pop("query_filter", None),
+        params=kwargs.pop("search_params", None),
+        **kwargs,
+    )
+
+
+def combine_modes(modes: Iterable[RetrievalMode]) -> RetrievalMode:
+    """
+    Retrieval mode of a search over uploads of the given modes. Points without one kind
+    of embedding are only found by the other, so mixed uploads are searched hybrid.
+    """
+    distinct = set(modes)
+    return distinct.pop() if len(distinct) == 1 else RetrievalMode.HYBRID
+
+
+def to_documents(
+    points: list[models.ScoredPoint], upload_names: dict[int, str] | None = None
+) -> list[Document]:
+    """
+    Convert search results to documents. The metadata holds the score, the upload and
+    position of the chunk, and the upload's name as the source if it is known.
+    """
+    upload_names = upload_names or {}
+    documents: list[Document] = []
+    for point in points:
+        payload = point.payload or {}
+        upload_id: int | None = payload.get("upload_id")
+        source = upload_names.get(upload_id, "") if upload_id is not None else ""
+        document = Document(
+            page_content=payload.get("document", ""),
+            metadata={
+                "score": point.score,
+                "upload_id": upload_id,
+                "chunk_index": payload.get("chunk_index"),
+                "source": source,
+            },
+        )
+        documents.append(document)
+    return documents
+
+
+def neighbour_filter(
+    documents: list[Document], neighbours: int, query_filter: models.Filter | None
+) -> models.Filter | None:
+    """
+    Filter matching the chunks within `neighbours` positions of each document in the
+    same upload. None if no document knows its position, e.g. it was ingested before
+    chunk positions were recorded.
+    """
+    windows = [
+        models.Filter(
+            must=[
+                models.FieldCondition(
+                    key="upload_id",
+                    match=models.MatchValue(value=document.metadata["upload_id"]),
+                ),
+                models.FieldCondition(
+                    key="chunk_index",
+                    range=models.Range(
+                        gte=document.metadata["chunk_index"] - neighbours,
+                        lte=document.metadata["chunk_index"] + neighbours,
+                    ),
+                ),
+            ]
+        )
+        for document in documents
+        if document.metadata.get("chunk_index") is not None
+    ]
+    if not windows:
+        return None
+    return models.Filter(
+        must=[query_filter] if query_filter else None,
+        should=windows,  # type: ignore[arg-type]
+    )
+
+
+def join_chunks(chunks: list[str]) -> str:
+    """Join consecutive chunks, dropping the text they overlap by."""
+    text = chunks[0]
+    for chunk in chunks[1:]:
+        overlap = next(
+            (
+                size
+                for size in range(min(len(text), len(chunk)), MIN_CHUNK_OVERLAP - 1, -1)
+                if text.endswith(chunk[:size])
+            ),
+            0,
+        )
+        text += chunk[overlap:] if overlap else f"\n{chunk}"
+    return text
+
+
+def merge_neighbours(
+    documents: list[Document], neighbour_points: list[models.Record], neighbours: int
+) -> list[Document]:
+    """
+    Extend each document with its neighbouring chunks. A document whose chunk is already
+    part of a higher ranked document's window is dropped.
+    """
+    chunks: dict[tuple[Any, int], str] = {}
+    for point in neighbour_points:
+        payload = point.payload or {}
+        if payload.get("chunk_index") is not None:
+            chunks[(payload.get("upload_id"), payload["chunk_index"])] = payload.get(
+                "document", ""
+            )
+
+    merged: list[Document] = []
+    covered: set[tuple[Any, int]] = set()
+    for document in documents:
+        upload_id = document.metadata.get("upload_id")
+        chunk_index = document.metadata.get("chunk_index")
+        if chunk_index is None:
+            merged.append(document)
+            continue
+        if (upload_id, chunk_index) in covered:
+            continue
+        window = [
+            index
+            for index in range(chunk_index - neighbours, chunk_index + neighbours + 1)
+            if index == chunk_index or (upload_id, index) in chunks
+        ]
+        covered.update((upload_id, index) for index in window)
+        texts = [
+            document.page_content
+            if index == chunk_index
+            else chunks[(upload_id, index)]
+            for index in window
+        ]
+        merged.append(
+            Document(page_content=join_chunks(texts), metadata=document.metadata)
+        )
+    return merged
+
+
+def apply_context_budget(
+    documents: list[Document], max_chars: int | None
+) -> list[Document]:
+    """
+    Keep the highest ranked documents that fit in `max_chars` characters. The document
+    that overflows the budget is truncated to the characters left.
+    """
+    if max_chars is None:
+        return documents
+    kept: list[Document] = []
+    remaining = max_chars
+    for document in documents:
+        if remaining <= 0:
+            break
+        if len(document.page_content) > remaining:
+            document = Document(
+                page_content=document.page_content[:remaining],
+                metadata=document.metadata,
+            )
+        kept.append(document)
+        remaining -= len(document.page_content)
+    return kept
+
+
+class RetrievalCache:
+    """Per-process LRU cache of retrieval results with a TTL on every entry."""
+
+    def __init__(self, ttl: int, max_size: int) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, list[Document]]] = OrderedDict()
+        # Sync retrievals run in threads
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> list[Document] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, documents = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return list(documents)
+
+    def set(self, key: str, documents: list[Document]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, list(documents))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+retrieval_cache = RetrievalCache(
+    ttl=settings.RETRIEVAL_CACHE_TTL, max_size=settings.RETRIEVAL_CACHE_MAX_SIZE
+)
 
 
 class QdrantRetriever(BaseRetriever):
@@ -10,6 +294,8 @@ class QdrantRetriever(BaseRetriever):
 
     Args:
         client (QdrantClient): The Qdrant client instance.
+        get_async_client (Callable): Returns the async Qdrant client of the running event
+            loop, used by async runs so that retrieval does not block a thread.
         collection_name (str): The name of the collection in Qdrant.
         search_kwargs (Optional[Dict]): Keyword arguments to pass to the
             search function. Can include:
@@ -21,15 +307,73 @@ class QdrantRetriever(BaseRetriever):
                     1 for minimum diversity and 0 for maximum. (Default: 0.5)
                 filter: Filter by document metadata
         k (int): Number of documents to return (Default: 5).
+        prefetch_k (int): Number of results of each of the dense and sparse searches
+            that are fused (Default: 10).
+        retrieval_mode (RetrievalMode): Which embeddings the query is searched with
+            (Default: hybrid).
+        score_threshold (Optional[float]): Minimum dense similarity of dense results.
+        search_params (Optional[SearchParams]): Params of the dense search.
+        max_context_chars (Optional[int]): Maximum characters of the returned documents.
+        neighbours (int): Number of chunks on either side of a result merged into it
+            (Default: 0).
+        upload_names (Dict[int, str]): Names of the searched uploads by id, used to
+            attribute results to their upload.
+        upload_versions (Dict[int, str]): Versions of the searched uploads by id. If
+            given, results are cached until an upload changes version.
 
     Returns:
         VectorStoreRetriever: A retriever class for VectorStore.
     """
 
     client: QdrantClient
+    get_async_client: Callable[[], AsyncQdrantClient | LocalAsyncClient]
     collection_name: str
     search_kwargs: models.Filter | None = None
     k: int = 5
+    prefetch_k: int = 10
+    retrieval_mode: RetrievalMode = RetrievalMode.HYBRID
+    score_threshold: float | None = None
+    search_params: models.SearchParams | None = None
+    max_context_chars: int | None = None
+    neighbours: int = 0
+    upload_names: dict[int, str] = {}
+    upload_versions: dict[int, str] = {}
+
+    def _query_kwargs(self, embedding: QueryEmbedding) -> dict[str, Any]:
+        return hybrid_query(
+            embedding,
+            self.search_kwargs,
+            limit=self.k,
+            prefetch_limit=self.prefetch_k,
+            score_threshold=self.score_threshold,
+            search_params=self.search_params,
+        )
+
+    def _cache_key(self, query: str) -> str | None:
+        """
+        Key of the results of the query. Uploads are keyed by version, so results are
+        not served once an upload is re-ingested. None if results are not cached.
+        """
+        if not self.upload_versions or settings.RETRIEVAL_CACHE_TTL <= 0:
+            return None
+        payload = json.dumps(
+            [
+                self.collection_name,
+                self.upload_versions,
+                self.search_kwargs.model_dump() if self.search_kwargs else None,
+                self.search_params.model_dump() if self.search_params else None,
+                self.k,
+                self.prefetch_k,
+                self.retrieval_mode,
+                self.score_threshold,
+                self.max_context_chars,
+                self.neighbours,
+                query,
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
 
     def _get_relevant_documents(
         self, query: str, *, run_manager: CallbackManagerForRetrieverRun
@@ -43,17 +387,174 @@ class QdrantRetriever(BaseRetriever):
         Returns:
             list[Document]: A list of relevant Document objects.
         """
-        search_results = self.client.query(
-            collection_name=self.collection_name,
-            query_text=query,
-            query_filter=self.search_kwargs,
+        key = self._cache_key(query)
+        documents = retrieval_cache.get(key) if key else None
+        if documents is None:
+            documents = self._search(query)
+            if key:
+                retrieval_cache.set(key, documents)
+        return documents
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        """
+        Retrieve relevant documents from the Qdrant VectorStore without blocking the
+        event loop. The query is embedded in the embedding executor.
+
+        Args:
+            query (str): The query text for retrieving documents.
+
+        Returns:
+            list[Document]: A list of relevant Document objects.
+        """
+        key = self._cache_key(query)
+        documents = retrieval_cache.get(key) if key else None
+        if documents is None:
+            documents = await self._asearch(query)
+            if key:
+                retrieval_cache.set(key, documents)
+        return documents
+
+    def _search(self, query: str) -> list[Document]:
+        embedding = embed_query(query, self.retrieval_mode)
+        response = self.client.query_points(
+            collection_name=self.collection_name, **self._query_kwargs(embedding)
         )
-        documents: list[Document] = []
-        for result in search_results:
-            document = Document(
-                page_content=result.document,
-                metadata={"score": result.score},
-                limit=self.k,
+        documents = to_documents(response.points, self.upload_names)
+        scroll_filter = neighbour_filter(documents, self.neighbours, self.search_kwargs)
+        if self.neighbours and scroll_filter:
+            points, _ = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=scroll_filter,
+                limit=len(documents) * (2 * self.neighbours + 1),
             )
-            documents.append(document)
-        return documents
+            documents = merge_neighbours(documents, points, self.neighbours)
+        return apply_context_budget(documents, self.max_context_chars)
+
+    def search_batch(self, queries: list[str]) -> list[list[Document]]:
+        """
+        Retrieve the relevant documents of several queries. The queries are embedded in
+        one batch and searched in one request, and their neighbouring chunks are fetched
+        in one more.
+
+        Returns:
+            list[list[Document]]: The documents of each query, in the order of the
+                queries.
+        """
+        results, missing = self._cached_batch(queries)
+        if missing:
+            embeddings = embed_queries(missing, self.retrieval_mode)
+            responses = self.client.query_batch_points(
+                collection_name=self.collection_name,
+                requests=[
+                    to_query_request(self._query_kwargs(embedding))
+                    for embedding in embeddings
+                ],
+            )
+            found = [
+                to_documents(response.points, self.upload_names)
+                for response in responses
+            ]
+            points: list[models.Record] = []
+            scroll_filter = self._batch_neighbour_filter(found)
+            if scroll_filter:
+                points, _ = self.client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=scroll_filter,
+                    limit=sum(map(len, found)) * (2 * self.neighbours + 1),
+                )
+            results.update(self._finish_batch(missing, found, points))
+        return [results[query] for query in queries]
+
+    async def asearch_batch(self, queries: list[str]) -> list[list[Document]]:
+        """Like `search_batch`, without blocking the event loop."""
+        results, missing = self._cached_batch(queries)
+        if missing:
+            embeddings = await run_in_embedding_executor(
+                embed_queries, missing, self.retrieval_mode
+            )
+            responses = await self.get_async_client().query_batch_points(
+                collection_name=self.collection_name,
+                requests=[
+                    to_query_request(self._query_kwargs(embedding))
+                    for embedding in embeddings
+                ],
+            )
+            found = [
+                to_documents(response.points, self.upload_names)
+                for response in responses
+            ]
+            points: list[models.Record] = []
+            scroll_filter = self._batch_neighbour_filter(found)
+            if scroll_filter:
+                points, _ = await self.get_async_client().scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=scroll_filter,
+                    limit=sum(map(len, found)) * (2 * self.neighbours + 1),
+                )
+            results.update(self._finish_batch(missing, found, points))
+        return [results[query] for query in queries]
+
+    def _cached_batch(
+        self, queries: list[str]
+    ) -> tuple[dict[str, list[Document]], list[str]]:
+        """The cached documents of the queries, and the distinct queries not cached."""
+        results: dict[str, list[Document]] = {}
+        missing: list[str] = []
+        for query in dict.fromkeys(queries):
+            key = self._cache_key(query)
+            documents = retrieval_cache.get(key) if key else None
+            if documents is None:
+                missing.append(query)
+            else:
+                results[query] = documents
+        return results, missing
+
+    def _batch_neighbour_filter(
+        self, found: list[list[Document]]
+    ) -> models.Filter | None:
+        """Filter matching the neighbouring chunks of the results of every query."""
+        if not self.neighbours:
+            return None
+        return neighbour_filter(
+            list(chain.from_iterable(found)), self.neighbours, self.search_kwargs
+        )
+
+    def _finish_batch(
+        self,
+        queries: list[str],
+        found: list[list[Document]],
+        neighbour_points: list[models.Record],
+    ) -> dict[str, list[Document]]:
+        """Merge the neighbours of the results of each query, budget and cache them."""
+        results: dict[str, list[Document]] = {}
+        for query, documents in zip(queries, found, strict=True):
+            if neighbour_points:
+                documents = merge_neighbours(
+                    documents, neighbour_points, self.neighbours
+                )
+            documents = apply_context_budget(documents, self.max_context_chars)
+            key = self._cache_key(query)
+            if key:
+                retrieval_cache.set(key, documents)
+            results[query] = documents
+        return results
+
+    async def _asearch(self, query: str) -> list[Document]:
+        embedding = await run_in_embedding_executor(
+            embed_query, query, self.retrieval_mode
+        )
+        response = await self.get_async_client().query_points(
+            collection_name=self.collection_name, **self._query_kwargs(embedding)
+        )
+        documents = to_documents(response.points, self.upload_names)
+        scroll_filter = neighbour_filter(documents, self.neighbours, self.search_kwargs)
+        if self.neighbours and scroll_filter:
+            points, _ = await self.get_async_client().scroll(
+                collection_name=self.collection_name,
+                scroll_filter=scroll_filter,
+                limit=len(documents) * (2 * self.neighbours + 1),
+            )
+            documents = merge_neighbours(documents, points, self.neighbours)
+        return apply_context_budget(documents, self.max_context_chars)
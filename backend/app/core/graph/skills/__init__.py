@@ -1,45 +1,105 @@
 # mypy: disable-error-code="attr-defined, arg-type"
-from langchain.pydantic_v1 import BaseModel
-from langchain.tools import BaseTool
-from langchain_community.tools import DuckDuckGoSearchRun, WikipediaQueryRun
-from langchain_community.tools.yahoo_finance_news import YahooFinanceNewsTool
-from langchain_community.utilities import (
-    WikipediaAPIWrapper,
-)
+import logging
+from collections.abc import Callable
+from importlib.metadata import entry_points
+from typing import cast
+
+from langchain_core.tools import BaseTool
 
 from .human_tool import AskHuman
 
 # from .calculator import multiply
 
+logger = logging.getLogger(__name__)
+
+# Entry point group under which installed packages register managed skills
+SKILLS_ENTRY_POINT_GROUP = "tribe.skills"
+
+
+class SkillInfo:
+    """
+    A managed skill. Only its description is needed to list it, so its tool is created
+    on first use, and the tool's dependencies are only imported by processes that run it.
+    """
+
+    def __init__(self, description: str, create_tool: Callable[[], BaseTool]) -> None:
+        self.description = description
+        self._create_tool = create_tool
+        self._tool: BaseTool | None = None
+
+    @property
+    def tool(self) -> BaseTool:
+        if self._tool is None:
+            self._tool = self._create_tool()
+        return self._tool
+
+
+def duckduckgo_search() -> BaseTool:
+    from langchain_community.tools import DuckDuckGoSearchRun
+
+    return DuckDuckGoSearchRun()
 
-class SkillInfo(BaseModel):
-    description: str
-    tool: BaseTool
 
+def wikipedia() -> BaseTool:
+    from langchain_community.tools import WikipediaQueryRun
+    from langchain_community.utilities import WikipediaAPIWrapper
 
-managed_skills: dict[str, SkillInfo] = {
+    return WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper())  # type: ignore[call-arg]
+
+
+def yahoo_finance() -> BaseTool:
+    from langchain_community.tools.yahoo_finance_news import YahooFinanceNewsTool
+
+    return YahooFinanceNewsTool()
+
+
+def load_plugin_skills() -> dict[str, SkillInfo]:
+    """
+    Load the managed skills that installed packages register under the `tribe.skills`
+    entry point group. Each entry point is named after its skill and refers to a
+    `SkillInfo`, e.g. `weather = "my_package.skills:weather"`. A plugin's module is
+    imported here, so it should defer its heavy imports to its `create_tool`.
+    """
+    skills: dict[str, SkillInfo] = {}
+    for entry_point in entry_points(group=SKILLS_ENTRY_POINT_GROUP):
+        try:
+            skill = entry_point.load()
+        except Exception:
+            logger.exception(f"Failed to load skill plugin {entry_point.name}")
+            continue
+        if not isinstance(skill, SkillInfo):
+            logger.error(f"Skill plugin {entry_point.name} is not a SkillInfo")
+            continue
+        skills[entry_point.name] = skill
+    return skills
+
+
+builtin_skills: dict[str, SkillInfo] = {
     "duckduckgo-search": SkillInfo(
-        description="Searches the web using DuckDuckGo", tool=DuckDuckGoSearchRun()
-    ),
-    "wikipedia": SkillInfo(
-        description="Searches Wikipedia",
-        tool=WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper()),  # type: ignore[call-arg]
+        description="Searches the web using DuckDuckGo", create_tool=duckduckgo_search
     ),
+    "wikipedia": SkillInfo(description="Searches Wikipedia", create_tool=wikipedia),
     "yahoo-finance": SkillInfo(
         description="Get information from Yahoo Finance News.",
-        tool=YahooFinanceNewsTool(),
+        create_tool=yahoo_finance,
     ),
     "ask-human": SkillInfo(
         description=AskHuman.description,
-        tool=AskHuman,
+        create_tool=lambda: cast(BaseTool, AskHuman),
     ),
     # multiply.name: SkillInfo(
     #     description=multiply.description,
-    #     tool=multiply,
+    #     create_tool=lambda: multiply,
     # ),
 }
 
+# Built-in skills take precedence over plugins of the same name
+managed_skills: dict[str, SkillInfo] = {**load_plugin_skills(), **builtin_skills}
+
 # To add more custom tools, follow these steps:
 # 1. Create a new Python file in the `skills` folder (e.g., `calculator.py`).
 # 2. Define your tool. Refer to `calculator.py` or see https://python.langchain.com/v0.2/docs/how_to/custom_tools/
-# 3. Import your new tool here and add it to the `managed_skills` dictionary above.
+# 3. Add it to the `builtin_skills` dictionary above, with a function that imports and
+#    creates it, so that it is only loaded when it is used.
+# Skills can also be added without changing this package, by installing a package that
+# registers them under the `tribe.skills` entry point group, see `load_plugin_skills`.
@@ -9,6 +9,8 @@ from langchain.tools import StructuredTool
 from langchain_core.tools import ToolException
 from pydantic import BaseModel, ValidationError, field_validator
 
+from app.core.config import settings
+
 
 class ParameterProperties(BaseModel):
     type: str
@@ -141,7 +143,12 @@ def dynamic_api_tool(tool_definition: dict[str, Any]) -> StructuredTool:
 
         try:
             response = requests.request(
-                method, url, headers=headers, json=data, params=params
+                method,
+                url,
+                headers=headers,
+                json=data,
+                params=params,
+                timeout=settings.TOOL_CALL_TIMEOUT,
             )
             response.raise_for_status()  # Raise an HTTPError for bad responses
             return json.dumps(response.json(), indent=2)
@@ -25,15 +25,27 @@ class RetrieverTool(BaseTool):
         )
         return result_string, docs
 
+    async def _arun(
+        self, query: Annotated[str, "query to look up in retriever"]
+    ) -> tuple[str, list[Document]]:
+        """Retrieve documents from knowledge base without blocking a thread."""
+        docs = await self.retriever.ainvoke(query, config={"callbacks": self.callbacks})
+        result_string = self.document_separator.join(
+            [format_document(doc, self.document_prompt) for doc in docs]
+        )
+        return result_string, docs
+
 
 def create_retriever_tool(
     retriever: BaseRetriever,
     document_prompt: BasePromptTemplate | None = None,  # type: ignore [type-arg]
     document_separator: str = "\n\n",
+    description: str = "Query documents for answers.",
 ) -> BaseTool:
     document_prompt = document_prompt or PromptTemplate.from_template("{page_content}")
 
     return RetrieverTool(
+        description=description,
         retriever=retriever,
         document_prompt=document_prompt,
         document_separator=document_separator,
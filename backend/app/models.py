@@ -4,7 +4,7 @@ from typing import Any
 from uuid import UUID, uuid4
 from zoneinfo import ZoneInfo
 
-from pydantic import BaseModel, model_validator
+from pydantic import BaseModel, computed_field, field_validator, model_validator
 from pydantic import Field as PydanticField
 from sqlalchemy import (
     JSON,
@@ -109,6 +109,13 @@ class UsersOut(SQLModel):
 class TeamBase(SQLModel):
     name: str = PydanticField(pattern=r"^[a-zA-Z0-9_-]{1,64}$")
     description: str | None = None
+    # Cache responses of deterministic llm calls, e.g. leader routing decisions
+    enable_llm_cache: bool = False
+    # Serve final answers of similar previous questions to new threads
+    enable_answer_cache: bool = False
+    # Share one run between identical concurrent questions to new threads. Callers
+    # share its side effects, so only for teams whose tools have none.
+    enable_run_coalescing: bool = False
 
 
 class TeamCreate(TeamBase):
@@ -265,6 +272,25 @@ class MemberUploadsLink(SQLModel, table=True):
     )
 
 
+class ModelFallback(BaseModel):
+    provider: str
+    model: str
+    base_url: str | None = None
+
+
+class RetrievalConfig(BaseModel):
+    # Number of results returned to the member
+    limit: int = PydanticField(default=5, ge=1, le=50)
+    # Minimum dense similarity of a result found by dense search
+    score_threshold: float | None = None
+    # Number of candidates of each of the dense and sparse searches that are fused
+    prefetch_limit: int = PydanticField(default=20, ge=1, le=200)
+    # Maximum characters of retrieved text returned to the member
+    max_context_chars: int | None = PydanticField(default=None, ge=1)
+    # Number of chunks on either side of a result that are merged into it
+    neighbours: int = PydanticField(default=0, ge=0, le=5)
+
+
 class MemberBase(SQLModel):
     name: str = PydanticField(pattern=r"^[a-zA-Z0-9_-]{1,64}$")
     backstory: str | None = None
@@ -279,6 +305,25 @@ class MemberBase(SQLModel):
     temperature: float = 0.7
     interrupt: bool = False
     base_url: str | None = None
+    # Alternate (provider, model, base_url) entries, tried in order when the primary is slow or failing
+    fallbacks: list[dict[str, Any]] | None = Field(default=None, sa_column=Column(JSON))
+
+    @field_validator("fallbacks")
+    def fallbacks_must_be_valid(cls, v: Any) -> Any:
+        if v is None:
+            return v
+        return [ModelFallback.model_validate(fallback).model_dump() for fallback in v]
+
+    # Knowledge base retrieval settings, see RetrievalConfig
+    retrieval_config: dict[str, Any] | None = Field(
+        default=None, sa_column=Column(JSON)
+    )
+
+    @field_validator("retrieval_config")
+    def retrieval_config_must_be_valid(cls, v: Any) -> Any:
+        if v is None:
+            return v
+        return RetrievalConfig.model_validate(v).model_dump()
 
 
 class MemberCreate(MemberBase):
@@ -461,13 +506,21 @@ class Write(SQLModel, table=True):
 # ==============Uploads=====================
 
 
+class RetrievalMode(str, Enum):
+    """Which embeddings an upload's chunks are given and searched with."""
+
+    HYBRID = "hybrid"
+    DENSE = "dense"
+    SPARSE = "sparse"
+
+
 class UploadBase(SQLModel):
     name: str
     description: str
 
 
 class UploadCreate(UploadBase):
-    pass
+    retrieval_mode: RetrievalMode = RetrievalMode.HYBRID
 
 
 class UploadUpdate(UploadBase):
@@ -494,6 +547,24 @@ class Upload(UploadBase, table=True):
     status: UploadStatus = Field(
         sa_column=Column(SQLEnum(UploadStatus), nullable=False)
     )
+    retrieval_mode: RetrievalMode = Field(
+        default=RetrievalMode.HYBRID,
+        sa_column=Column(
+            SQLEnum(RetrievalMode), nullable=False, server_default="HYBRID"
+        ),
+    )
+    # Progress of the upload's ingestion, checkpointed after every committed batch
+    pages_total: int | None = None
+    pages_processed: int = 0
+    chunks_embedded: int = 0
+    ingestion_started_at: datetime | None = None
+    batch_id: int | None = Field(default=None, foreign_key="uploadbatch.id")
+    # SHA-256 of the uploaded file, to detect duplicate uploads
+    content_hash: str | None = Field(default=None, index=True)
+    # Chunking of the upload's current version, so that an unchanged file that is sent
+    # again with the same chunking is not ingested again
+    chunk_size: int | None = None
+    chunk_overlap: int | None = None
 
 
 class UploadOut(UploadBase):
@@ -501,6 +572,26 @@ class UploadOut(UploadBase):
     name: str
     last_modified: datetime
     status: UploadStatus
+    retrieval_mode: RetrievalMode
+    pages_total: int | None
+    pages_processed: int
+    chunks_embedded: int
+    ingestion_started_at: datetime | None
+
+    @computed_field  # type: ignore[misc]
+    @property
+    def eta(self) -> float | None:
+        """Estimated seconds until ingestion completes, from its rate so far."""
+        if (
+            self.status != UploadStatus.IN_PROGRESS
+            or not self.pages_total
+            or not self.pages_processed
+            or not self.ingestion_started_at
+        ):
+            return None
+        elapsed = (datetime.now() - self.ingestion_started_at).total_seconds()
+        remaining = self.pages_total - self.pages_processed
+        return max(0.0, elapsed / self.pages_processed * remaining)
 
 
 class UploadsOut(SQLModel):
@@ -508,6 +599,53 @@ class UploadsOut(SQLModel):
     count: int
 
 
+class UploadBatch(SQLModel, table=True):
+    """Uploads created together by a bulk upload."""
+
+    id: int | None = Field(default=None, primary_key=True)
+    owner_id: int | None = Field(default=None, foreign_key="user.id", nullable=False)
+    created_at: datetime = Field(default_factory=lambda: datetime.now())
+    # Documents skipped because they had already been uploaded
+    duplicates: int = 0
+
+
+class UploadBatchOut(SQLModel):
+    id: int
+    created_at: datetime
+    duplicates: int
+    # In progress while any upload is, then failed if any upload failed
+    status: UploadStatus
+    total: int
+    in_progress: int
+    completed: int
+    failed: int
+    uploads: list[UploadOut]
+
+
+class UploadSearch(BaseModel):
+    upload_ids: list[int] = PydanticField(min_length=1)
+    # Searched together, in one batch
+    queries: list[str] = PydanticField(min_length=1, max_length=100)
+    retrieval: RetrievalConfig = PydanticField(default_factory=RetrievalConfig)
+
+
+class UploadSearchDocument(BaseModel):
+    content: str
+    score: float | None
+    upload_id: int
+    source: str
+    chunk_index: int | None
+
+
+class UploadSearchResult(BaseModel):
+    query: str
+    documents: list[UploadSearchDocument]
+
+
+class UploadSearchOut(BaseModel):
+    data: list[UploadSearchResult]
+
+
 # ==============Api Keys=====================
 class ApiKeyBase(SQLModel):
     description: str | None = "Default API Key Description"
@@ -0,0 +1,36 @@
+import logging
+
+from tenacity import after_log, before_log, retry, stop_after_attempt, wait_fixed
+
+from app.core.graph.rag.qdrant import QdrantStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+max_tries = 60 * 5  # 5 minutes
+wait_seconds = 1
+
+
+@retry(
+    stop=stop_after_attempt(max_tries),
+    wait=wait_fixed(wait_seconds),
+    before=before_log(logger, logging.INFO),
+    after=after_log(logger, logging.WARN),
+)
+def init() -> None:
+    try:
+        # Creates the collection if it does not exist and applies its configured layout
+        QdrantStore().migrate()
+    except Exception as e:
+        logger.error(e)
+        raise e
+
+
+def main() -> None:
+    logger.info("Migrating Qdrant collection")
+    init()
+    logger.info("Qdrant collection migrated")
+
+
+if __name__ == "__main__":
+    main()
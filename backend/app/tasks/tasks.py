@@ -1,14 +1,143 @@
 import os
+from collections import Counter
+from collections.abc import Callable
+from datetime import datetime
+from typing import Any, NamedTuple
 
-from sqlmodel import Session
+from celery import chord, group
+from celery.canvas import Signature
+from sqlmodel import Session, col, update
 
-from app.core.celery_app import celery_app
+from app.core.celery_app import celery_app, ingestion_priority
+from app.core.config import settings
 from app.core.db import engine
-from app.core.graph.rag.qdrant import QdrantStore
-from app.models import Upload, UploadStatus
+from app.core.graph.rag.ingestion import (
+    ChunkFingerprint,
+    IngestionPart,
+    IngestionProgress,
+    count_edge_lines,
+    count_pages,
+    extract_pages,
+    page_ranges,
+    select_boilerplate,
+)
+from app.core.graph.rag.qdrant import QdrantStore, fingerprint_page_range
+from app.models import RetrievalMode, Upload, UploadStatus
 
 
-@celery_app.task
+def start_ingestion(
+    session: Session, upload: Upload
+) -> Callable[[IngestionProgress], None]:
+    """
+    Reset the upload's ingestion progress and return a callback that checkpoints it.
+    A redelivered task restarts the clock, and its progress catches up as soon as the
+    chunks committed by the earlier attempt are skipped.
+    """
+    upload.ingestion_started_at = datetime.now()
+    upload.pages_total = None
+    upload.pages_processed = 0
+    upload.chunks_embedded = 0
+    session.add(upload)
+    session.commit()
+
+    def record(progress: IngestionProgress) -> None:
+        upload.pages_total = progress.pages_total
+        upload.pages_processed = progress.pages_processed
+        upload.chunks_embedded = progress.chunks_embedded
+        session.add(upload)
+        session.commit()
+
+    return record
+
+
+class IngestionTask(NamedTuple):
+    """The arguments of a distributed ingestion, passed along its stages."""
+
+    file_path: str
+    upload_id: int
+    user_id: int
+    chunk_size: int
+    chunk_overlap: int
+    ranges: list[tuple[int, int]]
+    retrieval_mode: str
+    priority: int
+
+
+def distribute_ingestion(
+    session: Session,
+    upload: Upload,
+    file_path: str,
+    user_id: int,
+    chunk_size: int,
+    chunk_overlap: int,
+) -> bool:
+    """
+    Ingest a large document with chords of subtasks, one per range of its pages, so
+    that it is spread across workers. Returns whether the document was large enough.
+
+    The ranges' subtasks first count their header and footer lines, then fingerprint
+    their chunks, and finally ingest the chunks that `plan_upload` planned from the
+    fingerprints. The last chord's callback completes the upload and removes its file.
+    """
+    min_pages = settings.INGESTION_DISTRIBUTED_MIN_PAGES
+    try:
+        pages_total = count_pages(file_path)
+    except Exception as e:
+        print(f"distribute_ingestion failed: {e}")
+        fail_upload.delay(None, str(e), None, file_path, upload.id)  # type: ignore[arg-type]
+        return True
+    if min_pages is None or pages_total <= min_pages:
+        return False
+
+    upload.pages_total = pages_total
+    session.add(upload)
+    session.commit()
+    ranges = page_ranges(pages_total, settings.INGESTION_PAGES_PER_SUBTASK)
+    ingestion = IngestionTask(
+        file_path,
+        upload.id,  # type: ignore[arg-type]
+        user_id,
+        chunk_size,
+        chunk_overlap,
+        ranges,
+        upload.retrieval_mode.value,
+        ingestion_priority(os.path.getsize(file_path)),
+    )
+    if settings.INGESTION_STRIP_BOILERPLATE:
+        parts = group(
+            count_upload_part_edge_lines.s(file_path, start, stop).set(
+                priority=ingestion.priority
+            )
+            for start, stop in ranges
+        )
+        callback = fingerprint_upload.s(ingestion)
+    else:
+        parts, callback = fingerprint_parts(ingestion, set())
+    chord(parts)(callback.on_error(fail_upload.s(file_path, upload.id)))
+    return True
+
+
+def fingerprint_parts(
+    ingestion: IngestionTask, boilerplate: set[str]
+) -> tuple[group, Signature]:
+    """The chord that fingerprints the chunks of each range, then plans the upload."""
+    parts = group(
+        fingerprint_upload_part.s(
+            ingestion.file_path,
+            start,
+            stop,
+            sorted(boilerplate),
+            ingestion.chunk_size,
+            ingestion.chunk_overlap,
+        ).set(priority=ingestion.priority)
+        for start, stop in ingestion.ranges
+    )
+    return parts, plan_upload.s(ingestion, sorted(boilerplate))
+
+
+# Tasks are acknowledged once they finish, so that a task whose worker died is
+# redelivered and resumes from the chunks it already committed.
+@celery_app.task(acks_late=True, reject_on_worker_lost=True)
 def add_upload(
     file_path: str, upload_id: int, user_id: int, chunk_size: int, chunk_overlap: int
 ) -> None:
@@ -16,9 +145,24 @@ def add_upload(
         upload = session.get(Upload, upload_id)
         if not upload:
             raise ValueError("Upload not found")
+        progress = start_ingestion(session, upload)
+        if distribute_ingestion(
+            session, upload, file_path, user_id, chunk_size, chunk_overlap
+        ):
+            return
         try:
-            QdrantStore().add(file_path, upload_id, user_id, chunk_size, chunk_overlap)
+            QdrantStore().add(
+                file_path,
+                upload_id,
+                user_id,
+                chunk_size,
+                chunk_overlap,
+                progress=progress,
+                mode=upload.retrieval_mode,
+            )
             upload.status = UploadStatus.COMPLETED
+            # A new version invalidates retrieval results cached for the upload
+            upload.last_modified = datetime.now()
             session.add(upload)
             session.commit()
         except Exception as e:
@@ -31,7 +175,7 @@ def add_upload(
                 os.remove(file_path)
 
 
-@celery_app.task
+@celery_app.task(acks_late=True, reject_on_worker_lost=True)
 def edit_upload(
     file_path: str, upload_id: int, user_id: int, chunk_size: int, chunk_overlap: int
 ) -> None:
@@ -39,11 +183,24 @@ def edit_upload(
         upload = session.get(Upload, upload_id)
         if not upload:
             raise ValueError("Upload not found")
+        progress = start_ingestion(session, upload)
+        if distribute_ingestion(
+            session, upload, file_path, user_id, chunk_size, chunk_overlap
+        ):
+            return
         try:
             QdrantStore().update(
-                file_path, upload_id, user_id, chunk_size, chunk_overlap
+                file_path,
+                upload_id,
+                user_id,
+                chunk_size,
+                chunk_overlap,
+                progress=progress,
+                mode=upload.retrieval_mode,
             )
             upload.status = UploadStatus.COMPLETED
+            # A new version invalidates retrieval results cached for the upload
+            upload.last_modified = datetime.now()
             session.add(upload)
             session.commit()
         except Exception as e:
@@ -56,6 +213,166 @@ def edit_upload(
                 os.remove(file_path)
 
 
+@celery_app.task(acks_late=True, reject_on_worker_lost=True)
+def count_upload_part_edge_lines(
+    file_path: str, start: int, stop: int
+) -> dict[str, int]:
+    """Count the header and footer lines of a range of pages of a distributed upload."""
+    counts, _ = count_edge_lines(extract_pages(file_path, start, stop))
+    return dict(counts)
+
+
+@celery_app.task
+def fingerprint_upload(counts: list[dict[str, int]], ingestion: list[Any]) -> None:
+    """Find the headers and footers of a distributed upload, then fingerprint it."""
+    task = IngestionTask(*ingestion)
+    total: Counter[str] = Counter()
+    for part_counts in counts:
+        total.update(part_counts)
+    pages_total = task.ranges[-1][1] if task.ranges else 0
+    parts, callback = fingerprint_parts(task, select_boilerplate(total, pages_total))
+    chord(parts)(callback.on_error(fail_upload.s(task.file_path, task.upload_id)))
+
+
+@celery_app.task(acks_late=True, reject_on_worker_lost=True)
+def fingerprint_upload_part(
+    file_path: str,
+    start: int,
+    stop: int,
+    boilerplate: list[str],
+    chunk_size: int,
+    chunk_overlap: int,
+) -> list[ChunkFingerprint]:
+    """Fingerprint the chunks of a range of pages of a distributed upload."""
+    return fingerprint_page_range(
+        file_path, start, stop, set(boilerplate), chunk_size, chunk_overlap
+    )
+
+
+@celery_app.task
+def plan_upload(
+    fingerprints: list[list[list[Any]]], ingestion: list[Any], boilerplate: list[str]
+) -> None:
+    """Plan a distributed upload from its chunks' fingerprints, then ingest its parts."""
+    task = IngestionTask(*ingestion)
+    plan = QdrantStore().plan(
+        task.upload_id,
+        task.user_id,
+        task.ranges,
+        [
+            [ChunkFingerprint(*fingerprint) for fingerprint in part]
+            for part in fingerprints
+        ],
+        set(boilerplate),
+    )
+    parts = group(
+        ingest_upload_part.s(
+            task.file_path,
+            task.upload_id,
+            task.user_id,
+            task.chunk_size,
+            task.chunk_overlap,
+            part,
+            task.retrieval_mode,
+        ).set(priority=task.priority)
+        for part in plan.parts
+    )
+    callback = finish_upload.s(
+        task.file_path, task.upload_id, plan.moved, plan.vanished
+    ).on_error(fail_upload.s(task.file_path, task.upload_id))
+    chord(parts)(callback)
+
+
+@celery_app.task(acks_late=True, reject_on_worker_lost=True)
+def ingest_upload_part(
+    file_path: str,
+    upload_id: int,
+    user_id: int,
+    chunk_size: int,
+    chunk_overlap: int,
+    part: list[Any],
+    retrieval_mode: str = RetrievalMode.HYBRID.value,
+) -> None:
+    """Ingest one part of a distributed ingestion. Retrying a part is idempotent."""
+    ingestion_part = IngestionPart(*part)
+    QdrantStore().ingest_part(
+        file_path,
+        upload_id,
+        user_id,
+        chunk_size,
+        chunk_overlap,
+        ingestion_part,
+        RetrievalMode(retrieval_mode),
+    )
+    with Session(engine) as session:
+        # Parts finish in any order, so progress is incremented atomically
+        statement = (
+            update(Upload)
+            .where(col(Upload.id) == upload_id)
+            .values(
+                pages_processed=col(Upload.pages_processed)
+                + ingestion_part.stop
+                - ingestion_part.start,
+                chunks_embedded=col(Upload.chunks_embedded) + len(ingestion_part.ids),
+            )
+        )
+        session.exec(statement)  # type: ignore[call-overload]
+        session.commit()
+
+
+@celery_app.task
+def finish_upload(
+    _results: list[None],
+    file_path: str,
+    upload_id: int,
+    moved: dict[str, int],
+    vanished: list[str],
+) -> None:
+    """Complete a distributed ingestion once all of its parts are ingested."""
+    with Session(engine) as session:
+        upload = session.get(Upload, upload_id)
+        if not upload:
+            raise ValueError("Upload not found")
+        try:
+            QdrantStore().finish_ingestion(moved, vanished)
+            upload.status = UploadStatus.COMPLETED
+            # A new version invalidates retrieval results cached for the upload
+            upload.last_modified = datetime.now()
+            session.add(upload)
+            session.commit()
+        except Exception as e:
+            print(f"finish_upload failed: {e}")
+            upload.status = UploadStatus.FAILED
+            session.add(upload)
+            session.commit()
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+
+@celery_app.task
+def fail_upload(
+    _request: Any,
+    exc: Exception | str,
+    _traceback: Any,
+    file_path: str,
+    upload_id: int,
+) -> None:
+    """
+    Error callback of a distributed ingestion, called if any of its tasks fail. Also
+    sent as a task of its own, with the error's message, if it fails to start.
+    """
+    print(f"Ingestion of upload {upload_id} failed: {exc}")
+    with Session(engine) as session:
+        upload = session.get(Upload, upload_id)
+        if upload:
+            upload.status = UploadStatus.FAILED
+            session.add(upload)
+            session.commit()
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+
 @celery_app.task
 def remove_upload(upload_id: int, user_id: int) -> None:
     with Session(engine) as session:
@@ -0,0 +1,48 @@
+import logging
+import os
+import resource
+import time
+from typing import Any
+
+from celery.signals import worker_process_init
+
+from app.core.config import settings
+from app.core.graph.rag.embeddings import get_dense_model, get_sparse_model
+from app.core.graph.rag.qdrant import QdrantStore
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up() -> None:
+    """
+    Load the embedding models and the Qdrant client into this process's global state,
+    and run an embedding through each model, whose first inference is the slowest.
+    """
+    list(get_dense_model().embed(["warm-up"]))
+    list(get_sparse_model().embed(["warm-up"]))
+    QdrantStore()
+
+
+@worker_process_init.connect  # type: ignore[misc]
+def preload(**_kwargs: Any) -> None:
+    """
+    Warm up each worker child as it starts. Children are recycled as they reach
+    --max-memory-per-child, and otherwise the first upload each one takes would pay
+    for loading the models.
+    """
+    if not settings.WORKER_PRELOAD_MODELS:
+        return
+    start = time.perf_counter()
+    try:
+        warm_up()
+    except Exception as e:
+        # The models and client are still loaded lazily by the first task
+        logger.error(f"Worker process {os.getpid()} failed to preload: {e}")
+        return
+    # Peak resident memory of the process, in kilobytes on Linux
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    logger.info(
+        f"Worker process {os.getpid()} preloaded embedding models and Qdrant client "
+        f"in {time.perf_counter() - start:.1f}s, peak resident memory "
+        f"{max_rss / 1024:.0f} MB"
+    )
@@ -1,10 +1,14 @@
 from io import BytesIO
+from typing import Any
+from zipfile import ZIP_DEFLATED, ZipFile
 
+import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
 from app.core.config import settings
 from app.models import Upload, UploadCreate, UploadStatus
+from app.tasks.tasks import edit_upload
 from app.tests.utils.utils import random_lower_string
 
 
@@ -61,12 +65,18 @@ def test_read_uploads_status_filter(
     assert all(upload["status"] == UploadStatus.IN_PROGRESS for upload in data["data"])
 
 
+def create_pdf_content() -> bytes:
+    # Mock PDF file data, unique so that it is not a duplicate upload
+    return (
+        b"%PDF-1.4\n1 0 obj\n<<\n/Type /Catalog\n/Pages 2 0 R\n>>\nendobj\n%"
+        + random_lower_string().encode()
+    )
+
+
 def test_create_upload(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
-    # Create mock PDF file data
-    pdf_content = b"%PDF-1.4\n1 0 obj\n<<\n/Type /Catalog\n/Pages 2 0 R\n>>\nendobj\n"
-    file = BytesIO(pdf_content)
+    file = BytesIO(create_pdf_content())
     file.name = "test_file.pdf"
 
     data = {
@@ -92,6 +102,27 @@ def test_create_upload(
     assert json_response["description"] == data["description"]
 
 
+def test_create_duplicate_upload(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    pdf_content = create_pdf_content()
+    data = {
+        "name": random_lower_string(),
+        "description": random_lower_string(),
+        "chunk_size": str(1024),
+        "chunk_overlap": str(256),
+    }
+    for expected_status_code in (200, 409):
+        files = {"file": ("test_file.pdf", BytesIO(pdf_content), "application/pdf")}
+        response = client.post(
+            f"{settings.API_V1_STR}/uploads",
+            headers=superuser_token_headers,
+            data=data,
+            files=files,
+        )
+        assert response.status_code == expected_status_code
+
+
 def test_update_upload(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -111,6 +142,45 @@ def test_update_upload(
     assert json_response["description"] == data["description"]
 
 
+def test_update_upload_with_same_file_and_chunking_is_not_ingested_again(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    pdf_content = create_pdf_content()
+    data = {"chunk_size": str(1024), "chunk_overlap": str(256)}
+    response = client.post(
+        f"{settings.API_V1_STR}/uploads",
+        headers=superuser_token_headers,
+        data={**data, "name": random_lower_string(), "description": ""},
+        files={"file": ("test_file.pdf", BytesIO(pdf_content), "application/pdf")},
+    )
+    assert response.status_code == 200
+    upload_id = response.json()["id"]
+
+    enqueued: list[Any] = []
+    monkeypatch.setattr(
+        edit_upload,
+        "apply_async",
+        lambda *args, **kwargs: enqueued.append(args),
+    )
+    updates = [
+        (pdf_content, data),
+        (pdf_content, {**data, "chunk_size": str(512)}),
+        (create_pdf_content(), {**data, "chunk_size": str(512)}),
+    ]
+    for content, update_data in updates:
+        response = client.put(
+            f"{settings.API_V1_STR}/uploads/{upload_id}",
+            headers=superuser_token_headers,
+            data=update_data,
+            files={"file": ("test_file.pdf", BytesIO(content), "application/pdf")},
+        )
+        assert response.status_code == 200
+    # Only new contents or a new chunking are ingested
+    assert len(enqueued) == 2
+
+
 def test_delete_upload(
     client: TestClient,
     superuser_token_headers: dict[str, str],
@@ -132,3 +202,105 @@ def test_delete_upload(
     db.expire_all()
     deleted_upload = db.get(Upload, upload_id)
     assert deleted_upload and deleted_upload.status == UploadStatus.IN_PROGRESS
+
+
+def test_create_upload_batch(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    pdf_content = create_pdf_content()
+    archive = BytesIO()
+    with ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("first.pdf", create_pdf_content())
+        zip_file.writestr("docs/second.pdf", create_pdf_content())
+        zip_file.writestr("notes.txt", b"not a pdf")
+        zip_file.writestr("third.pdf", pdf_content)
+    archive.seek(0)
+
+    files = [
+        ("files", ("archive.zip", archive, "application/zip")),
+        ("files", ("duplicate.pdf", BytesIO(pdf_content), "application/pdf")),
+    ]
+    data = {"chunk_size": str(1024), "chunk_overlap": str(256)}
+    response = client.post(
+        f"{settings.API_V1_STR}/uploads/batches",
+        headers=superuser_token_headers,
+        data=data,
+        files=files,
+    )
+
+    assert response.status_code == 200
+    json_response = response.json()
+    assert json_response["total"] == 3
+    assert json_response["duplicates"] == 1
+    assert sorted(upload["name"] for upload in json_response["uploads"]) == [
+        "first",
+        "second",
+        "third",
+    ]
+
+    response = client.get(
+        f"{settings.API_V1_STR}/uploads/batches/{json_response['id']}",
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["total"] == 3
+
+
+def test_create_upload_batch_without_pdfs(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    files = [("files", ("notes.txt", BytesIO(b"not a pdf"), "text/plain"))]
+    data = {"chunk_size": str(1024), "chunk_overlap": str(256)}
+    response = client.post(
+        f"{settings.API_V1_STR}/uploads/batches",
+        headers=superuser_token_headers,
+        data=data,
+        files=files,
+    )
+    assert response.status_code == 400
+
+
+def test_create_upload_batch_limits_extracted_size(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    archive = BytesIO()
+    with ZipFile(archive, "w", compression=ZIP_DEFLATED) as zip_file:
+        # Compresses to far less than it extracts to
+        for name in ("first.pdf", "second.pdf"):
+            zip_file.writestr(name, create_pdf_content() + b"0" * 100_000)
+    monkeypatch.setattr(settings, "MAX_BULK_UPLOAD_SIZE", 150_000)
+    assert archive.tell() < settings.MAX_BULK_UPLOAD_SIZE
+    archive.seek(0)
+
+    response = client.post(
+        f"{settings.API_V1_STR}/uploads/batches",
+        headers=superuser_token_headers,
+        data={"chunk_size": str(1024), "chunk_overlap": str(256)},
+        files=[("files", ("archive.zip", archive, "application/zip"))],
+    )
+    assert response.status_code == 413
+
+
+def test_search_uploads_not_found(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    response = client.post(
+        f"{settings.API_V1_STR}/uploads/search",
+        headers=superuser_token_headers,
+        json={"upload_ids": [999999], "queries": ["What is Tribe?"]},
+    )
+    assert response.status_code == 404
+
+
+def test_search_uploads_not_enough_permissions(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    upload = create_upload(db, 1)
+    response = client.post(
+        f"{settings.API_V1_STR}/uploads/search",
+        headers=normal_user_token_headers,
+        json={"upload_ids": [upload.id], "queries": ["What is Tribe?"]},
+    )
+    assert response.status_code == 403
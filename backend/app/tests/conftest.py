@@ -8,7 +8,16 @@ from app.core.config import settings
 from app.core.db import engine, init_db
 from app.core.security import get_password_hash
 from app.main import app
-from app.models import Checkpoint, Member, Skill, Team, Thread, Upload, User
+from app.models import (
+    Checkpoint,
+    Member,
+    Skill,
+    Team,
+    Thread,
+    Upload,
+    UploadBatch,
+    User,
+)
 from app.tests.utils.user import authentication_token_from_email
 from app.tests.utils.utils import get_superuser_token_headers
 
@@ -31,6 +40,9 @@ def db() -> Generator[Session, None, None]:
         deleteUpload = delete(Upload)
         session.exec(deleteUpload)  # type: ignore[call-overload]
 
+        deleteUploadBatch = delete(UploadBatch)
+        session.exec(deleteUploadBatch)  # type: ignore[call-overload]
+
         deleteMember = delete(Member)
         session.exec(deleteMember)  # type: ignore[call-overload]
 
@@ -0,0 +1,100 @@
+import asyncio
+import math
+from collections.abc import Iterator
+
+import pytest
+
+from app.core.config import settings
+from app.core.graph.rag import answer_cache
+from app.core.graph.rag.answer_cache import AnswerCache, invalidate_team_answers
+from app.core.graph.rag.embeddings import dense_vector_params
+from app.core.graph.rag.qdrant import get_client
+
+
+def vector(angle: float) -> list[float]:
+    """A unit vector at `angle` radians from the first axis, towards the second."""
+    size = next(iter(dense_vector_params().values())).size
+    return [math.cos(angle), math.sin(angle)] + [0.0] * (size - 2)
+
+
+# Cosine similarity to "What is Tribe?" is cos(angle)
+EMBEDDINGS = {
+    "What is Tribe?": vector(0.0),
+    "what is tribe": vector(0.1),
+    "How do I deploy Tribe?": vector(1.0),
+}
+
+
+@pytest.fixture(autouse=True)
+def local_backend(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    monkeypatch.setattr(settings, "QDRANT_BACKEND", "local")
+    monkeypatch.setattr(settings, "QDRANT_LOCAL_PATH", ":memory:")
+    monkeypatch.setattr(answer_cache, "embed_dense_query", EMBEDDINGS.__getitem__)
+    get_client.cache_clear()
+    yield
+    get_client.cache_clear()
+
+
+def test_answer_cache_hit_and_miss() -> None:
+    async def run() -> None:
+        cache = AnswerCache()
+        assert await cache.alookup(1, "v1", "What is Tribe?") is None
+
+        await cache.astore(1, "v1", "What is Tribe?", "A multi-agent framework.")
+        assert (
+            await cache.alookup(1, "v1", "What is Tribe?") == "A multi-agent framework."
+        )
+        # Similar enough, at a similarity of cos(0.1) > 0.99
+        assert (
+            await cache.alookup(1, "v1", "what is tribe") == "A multi-agent framework."
+        )
+        # Answers are not shared between teams
+        assert await cache.alookup(2, "v1", "What is Tribe?") is None
+
+    asyncio.run(run())
+
+
+def test_answer_cache_similarity_threshold(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def run() -> None:
+        cache = AnswerCache()
+        await cache.astore(1, "v1", "What is Tribe?", "A multi-agent framework.")
+        # At a similarity of cos(1.0) < 0.6
+        assert await cache.alookup(1, "v1", "How do I deploy Tribe?") is None
+
+        monkeypatch.setattr(settings, "ANSWER_CACHE_SIMILARITY_THRESHOLD", 0.5)
+        assert (
+            await cache.alookup(1, "v1", "How do I deploy Tribe?")
+            == "A multi-agent framework."
+        )
+
+    asyncio.run(run())
+
+
+def test_answer_cache_is_invalidated_by_team_version() -> None:
+    async def run() -> None:
+        cache = AnswerCache()
+        await cache.astore(1, "v1", "What is Tribe?", "A multi-agent framework.")
+        assert await cache.alookup(1, "v2", "What is Tribe?") is None
+
+        # Storing an answer of a new version drops those of previous versions
+        await cache.astore(1, "v2", "How do I deploy Tribe?", "With docker compose.")
+        assert await cache.alookup(1, "v1", "What is Tribe?") is None
+        assert (
+            await cache.alookup(1, "v2", "How do I deploy Tribe?")
+            == "With docker compose."
+        )
+
+        invalidate_team_answers(1)
+        assert await cache.alookup(1, "v2", "How do I deploy Tribe?") is None
+
+    asyncio.run(run())
+
+
+def test_invalidate_team_answers_tolerates_failures(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    def unavailable(self: AnswerCache, team_id: int) -> None:
+        raise ConnectionError("Qdrant is unavailable")
+
+    monkeypatch.setattr(AnswerCache, "invalidate", unavailable)
+    invalidate_team_answers(1)
@@ -0,0 +1,40 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.prompt_values import ChatPromptValue
+
+from app.core.graph.cache import InMemoryLLMCache, llm_cache_key
+
+
+def test_llm_cache_key_ignores_message_ids() -> None:
+    first = ChatPromptValue(messages=[HumanMessage(content="hello", id="1")])
+    second = ChatPromptValue(messages=[HumanMessage(content="hello", id="2")])
+    other = ChatPromptValue(messages=[HumanMessage(content="goodbye", id="1")])
+    assert llm_cache_key(["model"], first) == llm_cache_key(["model"], second)
+    assert llm_cache_key(["model"], first) != llm_cache_key(["model"], other)
+    assert llm_cache_key(["model"], first) != llm_cache_key(["other"], first)
+
+
+def test_in_memory_llm_cache_evicts_least_recently_used() -> None:
+    async def run() -> None:
+        cache = InMemoryLLMCache(ttl=60, max_size=2)
+        await cache.update("a", AIMessage(content="a"))
+        await cache.update("b", AIMessage(content="b"))
+        assert await cache.lookup("a") is not None
+        await cache.update("c", AIMessage(content="c"))
+        assert await cache.lookup("b") is None
+        cached = await cache.lookup("a")
+        assert cached is not None and cached.content == "a"
+        assert cache.stats().hits == 2
+        assert cache.stats().misses == 1
+
+    asyncio.run(run())
+
+
+def test_in_memory_llm_cache_expires_entries() -> None:
+    async def run() -> None:
+        cache = InMemoryLLMCache(ttl=-1, max_size=2)
+        await cache.update("a", AIMessage(content="a"))
+        assert await cache.lookup("a") is None
+
+    asyncio.run(run())
@@ -0,0 +1,106 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack
+
+from app.core.graph.coalesce import RunCoalescer, can_coalesce, get_coalesce_key
+from app.models import Member, Team
+
+
+def test_coalesce_key_normalises_query() -> None:
+    assert get_coalesce_key(1, "v1", "What is  Tribe?", True) == get_coalesce_key(
+        1, "v1", " what is tribe? ", True
+    )
+    assert get_coalesce_key(1, "v1", "What is Tribe?", True) != get_coalesce_key(
+        1, "v2", "What is Tribe?", True
+    )
+
+
+def test_followers_receive_all_frames_and_final_values() -> None:
+    async def run() -> None:
+        coalescer = RunCoalescer()
+        leader_run, is_leader = coalescer.join("key")
+        assert is_leader
+        await leader_run.publish("first")
+
+        follower_run, is_leader = coalescer.join("key")
+        assert not is_leader
+
+        async def follow() -> list[str]:
+            return [frame async for frame in follower_run.subscribe()]
+
+        follower = asyncio.create_task(follow())
+        await asyncio.sleep(0)
+        await leader_run.publish("second")
+        await coalescer.finish("key", {"history": []})
+
+        assert await follower == ["first", "second"]
+        assert follower_run.values == {"history": []}
+        # New requests start a new run once the previous one finished
+        _, is_leader = coalescer.join("key")
+        assert is_leader
+
+    asyncio.run(run())
+
+
+def test_shared_run_completes_when_leader_leaves() -> None:
+    async def run() -> None:
+        coalescer = RunCoalescer()
+        released = []
+        resources = AsyncExitStack()
+        resources.callback(lambda: released.append(True))
+        proceed = asyncio.Event()
+
+        async def frames() -> AsyncIterator[str]:
+            yield "first"
+            await proceed.wait()
+            yield "second"
+
+        leader_run, _ = coalescer.join("key")
+        coalescer.start("key", leader_run, frames(), lambda: {"history": []}, resources)
+        follower_run, is_leader = coalescer.join("key")
+        assert not is_leader
+
+        # The leader's client goes away after the first frame
+        leader = leader_run.subscribe()
+        assert await leader.__anext__() == "first"
+        await leader.aclose()
+        proceed.set()
+
+        assert [frame async for frame in follower_run.subscribe()] == [
+            "first",
+            "second",
+        ]
+        assert follower_run.values == {"history": []}
+        assert released == [True]
+
+    asyncio.run(run())
+
+
+def test_shared_run_failure_reaches_followers() -> None:
+    async def run() -> None:
+        coalescer = RunCoalescer()
+
+        async def frames() -> AsyncIterator[str]:
+            yield "first"
+            raise TimeoutError("The run did not complete before its deadline.")
+
+        leader_run, _ = coalescer.join("key")
+        coalescer.start("key", leader_run, frames(), lambda: None, AsyncExitStack())
+
+        assert [frame async for frame in leader_run.subscribe()] == ["first"]
+        assert leader_run.values is None
+        assert leader_run.error == "The run did not complete before its deadline."
+
+    asyncio.run(run())
+
+
+def test_can_coalesce_is_opt_in() -> None:
+    member = Member(
+        name="worker", role="Answers", type="worker", position_x=0, position_y=0
+    )
+    team = Team(name="team", workflow="sequential")
+    assert not can_coalesce(team, [member])
+    team.enable_run_coalescing = True
+    assert can_coalesce(team, [member])
+    member.interrupt = True
+    assert not can_coalesce(team, [member])
@@ -0,0 +1,82 @@
+import asyncio
+from collections.abc import AsyncGenerator
+
+import pytest
+from langchain_core.runnables import RunnableConfig
+
+from app.core.graph import deadline
+from app.core.graph.deadline import (
+    create_deadline_config,
+    get_timeout,
+    is_expired,
+    iterate_with_deadline,
+)
+
+
+def deadline_config(timeout: float | None, reserve: float = 0) -> RunnableConfig:
+    return {"configurable": create_deadline_config(timeout, reserve)}
+
+
+def test_get_timeout_without_deadline() -> None:
+    config = deadline_config(None)
+    assert get_timeout(config, 10) == 10
+    assert not is_expired(config)
+
+
+def test_get_timeout_shrinks_to_deadline() -> None:
+    config = deadline_config(5)
+    assert 4 < get_timeout(config, 10) <= 5
+    assert get_timeout(config, 1) == 1
+
+
+def test_reserve_is_only_available_to_final_calls() -> None:
+    config = deadline_config(5, reserve=5)
+    assert get_timeout(config, 10) == 0
+    assert is_expired(config)
+    assert 4 < get_timeout(config, 10, final=True) <= 5
+    assert not is_expired(config, final=True)
+
+
+async def ticks(delay: float) -> AsyncGenerator[int, None]:
+    for tick in range(3):
+        await asyncio.sleep(delay)
+        yield tick
+
+
+async def collect(
+    stream: AsyncGenerator[int, None], config: RunnableConfig
+) -> list[int]:
+    return [item async for item in iterate_with_deadline(stream, config)]
+
+
+def test_iterate_with_deadline_completes_in_time() -> None:
+    assert asyncio.run(collect(ticks(0), deadline_config(1))) == [0, 1, 2]
+
+
+def test_iterate_with_deadline_completes_without_deadline() -> None:
+    assert asyncio.run(collect(ticks(0), deadline_config(None))) == [0, 1, 2]
+
+
+def test_iterate_with_deadline_stops_at_deadline(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(deadline, "STREAM_GRACE", 0.1)
+    with pytest.raises(TimeoutError):
+        asyncio.run(collect(ticks(1), deadline_config(0.1)))
+
+
+def test_iterate_with_deadline_only_interrupts_the_stream(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(deadline, "STREAM_GRACE", 0)
+
+    async def run() -> list[int]:
+        items = []
+        async for item in iterate_with_deadline(ticks(0), deadline_config(0.1)):
+            items.append(item)
+            # Only the stream is interrupted at the deadline, never its caller
+            await asyncio.sleep(0.1)
+        return items
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(run())
@@ -0,0 +1,56 @@
+import time
+from pathlib import Path
+
+import pytest
+
+from app.core.graph.rag.embedding_cache import SqliteEmbeddingCache, cached_embed
+
+
+def test_sqlite_embedding_cache(tmp_path: Path) -> None:
+    cache = SqliteEmbeddingCache(str(tmp_path / "cache" / "embeddings.sqlite3"), ttl=60)
+    assert cache.get_many(["a", "b"]) == {}
+    cache.set_many({"a": b"1"})
+    assert cache.get_many(["a", "b"]) == {"a": b"1"}
+
+
+def test_sqlite_embedding_cache_expires_entries(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    cache = SqliteEmbeddingCache(str(tmp_path / "embeddings.sqlite3"), ttl=60)
+    cache.set_many({"a": b"1"})
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get_many(["a"]) == {}
+
+    # Expired entries are deleted when new ones are written
+    cache.set_many({"b": b"2"})
+    count = cache._connection.execute("SELECT COUNT(*) FROM embedding_cache")
+    assert count.fetchone() == (1,)
+
+
+def test_cached_embed_only_embeds_missing_texts(tmp_path: Path) -> None:
+    cache = SqliteEmbeddingCache(str(tmp_path / "embeddings.sqlite3"), ttl=60)
+    embedded: list[list[str]] = []
+
+    def embed(texts: list[str]) -> list[int]:
+        embedded.append(texts)
+        return [len(text) for text in texts]
+
+    def run(texts: list[str]) -> list[int]:
+        return cached_embed(
+            cache,
+            "model",
+            texts,
+            embed,
+            encode=lambda value: str(value).encode(),
+            decode=lambda value: int(value),
+        )
+
+    assert run(["a", "bb", "a"]) == [1, 2, 1]
+    assert run(["bb", "ccc"]) == [2, 3]
+    # Duplicates and cached texts are not embedded again
+    assert embedded == [["a", "bb"], ["ccc"]]
+
+
+def test_cached_embed_without_cache() -> None:
+    assert cached_embed(None, "model", ["a"], lambda texts: [0], bytes, int) == [0]
@@ -0,0 +1,101 @@
+import asyncio
+from collections.abc import AsyncIterator
+from typing import Any
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.runnables import Runnable, RunnableGenerator
+
+from app.core.graph.hedging import LatencyTracker, hedged_ainvoke
+
+
+def fake_model(delay: float, text: str, fail: bool = False) -> Runnable[Any, Any]:
+    """Create a streaming runnable that waits before producing its first token."""
+
+    async def stream(input: AsyncIterator[Any]) -> AsyncIterator[AIMessageChunk]:
+        async for _ in input:
+            pass
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError(f"{text} failed")
+        for word in text.split():
+            yield AIMessageChunk(content=f"{word} ")
+
+    return RunnableGenerator(stream)
+
+
+def new_tracker() -> LatencyTracker:
+    return LatencyTracker(
+        window_size=10, min_samples=2, percentile=0.95, default_delay=0.05
+    )
+
+
+def test_latency_tracker_threshold() -> None:
+    tracker = new_tracker()
+    assert tracker.threshold("model") == 0.05
+    for latency in [0.1, 0.2, 0.3, 0.4]:
+        tracker.record("model", latency)
+    assert tracker.threshold("model") == 0.4
+
+
+def test_hedged_ainvoke_returns_primary_when_fast() -> None:
+    tracker = new_tracker()
+    result = asyncio.run(
+        hedged_ainvoke(
+            [
+                ("primary", fake_model(0, "primary")),
+                ("backup", fake_model(0, "backup")),
+            ],
+            "query",
+            {},
+            tracker,
+        )
+    )
+    assert isinstance(result, AIMessage)
+    assert result.content == "primary "
+
+
+def test_hedged_ainvoke_hedges_slow_primary() -> None:
+    tracker = new_tracker()
+    result = asyncio.run(
+        hedged_ainvoke(
+            [
+                ("primary", fake_model(1, "primary")),
+                ("backup", fake_model(0, "backup")),
+            ],
+            "query",
+            {},
+            tracker,
+        )
+    )
+    assert result.content == "backup "
+    assert "backup" in tracker._samples
+
+
+def test_hedged_ainvoke_fails_over_on_error() -> None:
+    tracker = new_tracker()
+    result = asyncio.run(
+        hedged_ainvoke(
+            [
+                ("primary", fake_model(0, "primary", fail=True)),
+                ("backup", fake_model(0.2, "backup")),
+            ],
+            "query",
+            {},
+            tracker,
+        )
+    )
+    assert result.content == "backup "
+
+
+def test_hedged_ainvoke_raises_when_all_fail() -> None:
+    tracker = new_tracker()
+    with pytest.raises(RuntimeError):
+        asyncio.run(
+            hedged_ainvoke(
+                [("primary", fake_model(0, "primary", fail=True))],
+                "query",
+                {},
+                tracker,
+            )
+        )
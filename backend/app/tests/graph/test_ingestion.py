@@ -0,0 +1,177 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+import billiard  # type: ignore[import-untyped]
+import pymupdf  # type: ignore[import-untyped]
+import pytest
+
+from app.core.config import settings
+from app.core.graph.rag.ingestion import (
+    DuplicateFilter,
+    batched,
+    chunk_hash,
+    chunk_id,
+    document_boilerplate,
+    find_boilerplate,
+    identify_chunks,
+    iter_pages,
+    page_ranges,
+    sample_pages,
+    simhash,
+    strip_boilerplate,
+)
+from app.models import RetrievalMode, UploadOut, UploadStatus
+
+
+def test_batched() -> None:
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(batched([], 2)) == []
+
+
+def test_page_ranges() -> None:
+    assert page_ranges(45, 20) == [(0, 20), (20, 40), (40, 45)]
+    assert page_ranges(0, 20) == []
+
+
+def write_pdf(path: Path, page_count: int) -> str:
+    with pymupdf.open() as doc:
+        for number in range(page_count):
+            doc.new_page().insert_text((72, 72), f"Page {number}")
+        doc.save(path)
+    return str(path)
+
+
+def extract_in_daemon(file_path: str, queue: billiard.Queue) -> None:
+    queue.put([page.strip() for page in iter_pages(file_path)])
+
+
+def test_iter_pages_in_parallel_from_a_daemonic_process(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "INGESTION_WORKERS", 2)
+    monkeypatch.setattr(settings, "INGESTION_PAGES_PER_TASK", 2)
+    file_path = write_pdf(tmp_path / "document.pdf", 5)
+    expected = [f"Page {number}" for number in range(5)]
+    assert [page.strip() for page in iter_pages(file_path)] == expected
+
+    # Like Celery's prefork children, whose pages are also extracted in parallel
+    queue = billiard.Queue()
+    process = billiard.Process(
+        target=extract_in_daemon, args=(file_path, queue), daemon=True
+    )
+    process.start()
+    assert queue.get(timeout=30) == expected
+    process.join()
+
+
+def test_chunk_id_is_deterministic() -> None:
+    digest = chunk_hash("text")
+    assert chunk_id(1, digest, 0) == chunk_id(1, digest, 0)
+    assert chunk_id(1, digest, 0) != chunk_id(1, digest, 1)
+    assert chunk_id(1, digest, 0) != chunk_id(2, digest, 0)
+    assert chunk_id(1, digest, 0) != chunk_id(1, chunk_hash("other"), 0)
+
+
+def test_identify_chunks() -> None:
+    texts = [(1, "a"), (1, "b"), (2, "a")]
+    chunks = list(identify_chunks(texts, upload_id=1))
+    assert [chunk.position for chunk in chunks] == [0, 1, 2]
+    assert [chunk.page for chunk in chunks] == [1, 1, 2]
+    # Repeated texts are told apart by their occurrence
+    assert chunks[0].id == chunk_id(1, chunk_hash("a"), 0)
+    assert chunks[2].id == chunk_id(1, chunk_hash("a"), 1)
+
+
+def test_find_and_strip_boilerplate() -> None:
+    bodies = ["Revenue grew.", "Costs fell.", "Margins held.", "Outlook is good."]
+    pages = [
+        f"ACME Annual Report\nSection {number}\n{body}\nPage {number}"
+        for number, body in enumerate(bodies, start=1)
+    ]
+    boilerplate = find_boilerplate(pages)
+    assert boilerplate == {"acme annual report", "section #", "page #"}
+    # Lines are only stripped from the edges of a page
+    page = "ACME Annual Report\nIntro\na\nb\nACME Annual Report\nc\nd\ne\nPage 9"
+    assert (
+        strip_boilerplate(page, boilerplate)
+        == "Intro\na\nb\nACME Annual Report\nc\nd\ne"
+    )
+
+
+def test_find_boilerplate_needs_enough_pages() -> None:
+    assert find_boilerplate(["Header\nbody", "Header\nother body"]) == set()
+
+
+def test_sample_pages() -> None:
+    assert sample_pages(3, 4) == [0, 1, 2]
+    assert sample_pages(100, 4) == [0, 25, 50, 75]
+
+
+def test_document_boilerplate_reads_a_sample_of_pages(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "INGESTION_STRIP_BOILERPLATE", True)
+    monkeypatch.setattr("app.core.graph.rag.ingestion.BOILERPLATE_SAMPLE_PAGES", 4)
+    file_path = str(tmp_path / "report.pdf")
+    with pymupdf.open() as doc:
+        for number in range(40):
+            page = doc.new_page()
+            page.insert_text((72, 72), "ACME Annual Report")
+            page.insert_text((72, 144), f"Revenue grew by {number} percent.")
+        doc.save(file_path)
+    read: list[int] = []
+    get_text = pymupdf.Page.get_text
+
+    def recording_get_text(page: pymupdf.Page, *args: Any) -> Any:
+        read.append(page.number)
+        return get_text(page, *args)
+
+    monkeypatch.setattr(pymupdf.Page, "get_text", recording_get_text)
+    assert "acme annual report" in document_boilerplate(file_path)
+    assert read == [0, 10, 20, 30]
+
+    monkeypatch.setattr(settings, "INGESTION_STRIP_BOILERPLATE", False)
+    assert document_boilerplate(file_path) == set()
+
+
+def test_duplicate_filter() -> None:
+    text = " ".join(f"word{number}" for number in range(100))
+    near = text.replace("word50", "other50")
+    unrelated = " ".join(f"term{number}" for number in range(100))
+    assert bin(simhash(text) ^ simhash(near)).count("1") <= 6
+
+    duplicates = DuplicateFilter(max_distance=6)
+    assert not duplicates.is_duplicate(text)
+    assert duplicates.is_duplicate(text)
+    assert duplicates.is_duplicate(near)
+    assert not duplicates.is_duplicate(unrelated)
+
+    exact = DuplicateFilter(max_distance=0)
+    assert not exact.is_duplicate(text)
+    assert exact.is_duplicate(text)
+    assert not exact.is_duplicate(near)
+
+
+def test_upload_eta() -> None:
+    upload = UploadOut(
+        id=1,
+        name="upload",
+        description="",
+        last_modified=datetime.now(),
+        status=UploadStatus.IN_PROGRESS,
+        retrieval_mode=RetrievalMode.HYBRID,
+        pages_total=40,
+        pages_processed=10,
+        chunks_embedded=100,
+        ingestion_started_at=datetime.now() - timedelta(seconds=60),
+    )
+    assert upload.eta is not None
+    assert 179 < upload.eta <= 181
+
+    upload.status = UploadStatus.COMPLETED
+    assert upload.eta is None
+
+    upload.status = UploadStatus.IN_PROGRESS
+    upload.pages_processed = 0
+    assert upload.eta is None
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+
+from app.core.graph.deadline import create_deadline_config
+from app.core.graph.members import (
+    OUT_OF_TIME_ANSWER,
+    OUT_OF_TIME_MESSAGE,
+    GraphTeam,
+    SummariserNode,
+    TeamState,
+)
+
+
+def expired_state(history: list[AnyMessage]) -> TeamState:
+    return {
+        "all_messages": [],
+        "messages": [],
+        "history": history,
+        "team": GraphTeam(
+            name="team",
+            role="Leads",
+            backstory="",
+            members={},
+            provider="openai",
+            model="gpt-4o-mini",
+            temperature=0,
+        ),
+        "next": "",
+        "main_task": [HumanMessage(content="What is Tribe?")],
+        "task": [],
+    }
+
+
+@pytest.mark.parametrize(
+    "history, answer",
+    [
+        (
+            [AIMessage(content="A multi-agent framework.", name="worker")],
+            OUT_OF_TIME_ANSWER.format(response="A multi-agent framework."),
+        ),
+        ([], OUT_OF_TIME_MESSAGE),
+    ],
+)
+def test_summariser_answers_when_out_of_time(
+    monkeypatch: pytest.MonkeyPatch, history: list[AnyMessage], answer: str
+) -> None:
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    node = SummariserNode("openai", "gpt-4o-mini", None, 0)
+    config: RunnableConfig = {"configurable": create_deadline_config(0, reserve=0)}
+    result = asyncio.run(node.summarise(expired_state(history), config))
+    assert result["history"][0].content == answer
+    assert result["history"][0].name == "team_answer"
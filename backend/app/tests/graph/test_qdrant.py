@@ -0,0 +1,208 @@
+import asyncio
+from collections import Counter
+from collections.abc import Iterator
+from pathlib import Path
+
+import pymupdf  # type: ignore[import-untyped]
+import pytest
+from qdrant_client.http import models as rest
+
+from app.core.config import settings
+from app.core.graph.rag import qdrant, qdrant_retriever
+from app.core.graph.rag.embeddings import QueryEmbedding, dense_vector_name
+from app.core.graph.rag.ingestion import (
+    count_edge_lines,
+    create_duplicate_filter,
+    drop_duplicates,
+    extract_pages,
+    identify_chunks,
+    iter_pages,
+    page_ranges,
+    select_boilerplate,
+    strip_boilerplate,
+)
+from app.core.graph.rag.qdrant import (
+    QdrantStore,
+    fingerprint_page_range,
+    get_async_client,
+    get_client,
+    split_pages,
+)
+from app.core.graph.rag.qdrant_retriever import QdrantRetriever
+from app.models import RetrievalMode
+
+
+@pytest.fixture
+def local_backend(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    monkeypatch.setattr(settings, "QDRANT_BACKEND", "local")
+    monkeypatch.setattr(settings, "QDRANT_LOCAL_PATH", ":memory:")
+    # Each test has a storage of its own, where collections are yet to be created
+    monkeypatch.setattr(qdrant, "_ensured_collections", set())
+    get_client.cache_clear()
+    yield
+    get_client.cache_clear()
+
+
+def test_local_backend_shares_storage_between_clients(local_backend: None) -> None:
+    client = get_client()
+    client.create_collection(
+        collection_name="test",
+        vectors_config=rest.VectorParams(size=2, distance=rest.Distance.COSINE),
+    )
+    client.upsert(
+        collection_name="test",
+        points=[
+            rest.PointStruct(id=1, vector=[1.0, 0.0], payload={"upload_id": 1}),
+            rest.PointStruct(id=2, vector=[0.0, 1.0], payload={"upload_id": 2}),
+        ],
+    )
+
+    async def search() -> list[int | str]:
+        response = await get_async_client().query_points(
+            collection_name="test",
+            query=[1.0, 0.1],
+            query_filter=rest.Filter(
+                must=[
+                    rest.FieldCondition(
+                        key="upload_id", match=rest.MatchAny(any=[1, 2])
+                    )
+                ]
+            ),
+            limit=2,
+        )
+        return [point.id for point in response.points]
+
+    assert asyncio.run(search()) == [1, 2]
+
+
+def test_async_client_is_bound_to_its_event_loop(local_backend: None) -> None:
+    async def clients() -> tuple[object, object]:
+        return get_async_client(), get_async_client()
+
+    first, same = asyncio.run(clients())
+    assert first is same
+    other, _ = asyncio.run(clients())
+    assert other is not first
+
+
+def test_search_batch_groups_results_per_query(
+    local_backend: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    vectors = {"north": [1.0, 0.0], "east": [0.0, 1.0]}
+    embedded: list[list[str]] = []
+
+    def embed_queries(queries: list[str], mode: RetrievalMode) -> list[QueryEmbedding]:
+        embedded.append(queries)
+        return [QueryEmbedding(dense=vectors[query], sparse=None) for query in queries]
+
+    monkeypatch.setattr(qdrant_retriever, "embed_queries", embed_queries)
+    client = get_client()
+    client.create_collection(
+        collection_name="test",
+        vectors_config={
+            dense_vector_name(): rest.VectorParams(
+                size=2, distance=rest.Distance.COSINE
+            )
+        },
+    )
+    client.upsert(
+        collection_name="test",
+        points=[
+            rest.PointStruct(
+                id=index,
+                vector={dense_vector_name(): vector},
+                payload={"upload_id": 1, "chunk_index": index, "document": query},
+            )
+            for index, (query, vector) in enumerate(vectors.items())
+        ],
+    )
+    retriever = QdrantRetriever(
+        client=client,
+        get_async_client=get_async_client,
+        collection_name="test",
+        k=1,
+        retrieval_mode=RetrievalMode.DENSE,
+        upload_names={1: "compass"},
+    )
+
+    results = retriever.search_batch(["east", "north", "east"])
+    assert [
+        [document.page_content for document in documents] for documents in results
+    ] == [
+        ["east"],
+        ["north"],
+        ["east"],
+    ]
+    assert results[0][0].metadata["source"] == "compass"
+    # Repeated queries are embedded and searched once
+    assert embedded == [["east", "north"]]
+
+    results = asyncio.run(retriever.asearch_batch(["north"]))
+    assert results[0][0].page_content == "north"
+
+
+def test_migrate_sets_tenants_and_skips_points_without_user(
+    local_backend: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "QDRANT_MULTITENANT", True)
+    store = QdrantStore()
+    store.client.upsert(
+        collection_name=store.collection_name,
+        points=[
+            rest.PointStruct(id=1, vector={}, payload={"user_id": 1}),
+            rest.PointStruct(id=2, vector={}, payload={"user_id": 2}),
+            rest.PointStruct(id=3, vector={}, payload={}),
+        ],
+    )
+
+    store.migrate()
+    points, _ = store.client.scroll(collection_name=store.collection_name)
+    assert {point.id: (point.payload or {}).get("group_id") for point in points} == {
+        1: "1",
+        2: "2",
+        3: None,
+    }
+
+
+def test_plan_from_fingerprints_matches_serial_ingestion(
+    local_backend: None, tmp_path: Path
+) -> None:
+    file_path = str(tmp_path / "document.pdf")
+    with pymupdf.open() as doc:
+        for name in ["one", "two", "three", "four", "five", "six", "seven"]:
+            # A header, then a paragraph of the page's own and one shared by every page
+            doc.new_page().insert_text(
+                (72, 72),
+                f"Handbook\nAbout {name}\nOnly {name} is here\n\n"
+                "Every page repeats this\n\n"
+                f"The end of {name}\nSigned {name}\nGoodbye {name}",
+            )
+        doc.save(file_path)
+    ranges = page_ranges(7, 3)
+    counts: Counter[str] = Counter()
+    for start, stop in ranges:
+        counts.update(count_edge_lines(extract_pages(file_path, start, stop))[0])
+    boilerplate = select_boilerplate(counts, 7)
+    assert boilerplate == {"handbook"}
+
+    store = QdrantStore()
+    plan = store.plan(
+        1,
+        1,
+        ranges,
+        [
+            fingerprint_page_range(file_path, start, stop, boilerplate, 30, 0)
+            for start, stop in ranges
+        ],
+        boilerplate,
+    )
+
+    pages = (strip_boilerplate(page, boilerplate) for page in iter_pages(file_path))
+    serial = identify_chunks(
+        drop_duplicates(split_pages(pages, 1, 30, 0), create_duplicate_filter()), 1
+    )
+    assert [point_id for part in plan.parts for point_id in part.ids] == [
+        chunk.id for chunk in serial
+    ]
+    # Repeats of the shared paragraph are dropped from every part
+    assert all(part.dropped for part in plan.parts)
@@ -0,0 +1,138 @@
+from langchain_core.documents import Document
+from qdrant_client import models
+
+from app.core.graph.rag.embeddings import QueryEmbedding
+from app.core.graph.rag.qdrant_retriever import (
+    RetrievalCache,
+    apply_context_budget,
+    combine_modes,
+    hybrid_query,
+    join_chunks,
+    merge_neighbours,
+    neighbour_filter,
+    to_query_request,
+)
+from app.models import RetrievalMode
+
+
+def chunk(upload_id: int, chunk_index: int | None, text: str) -> Document:
+    return Document(
+        page_content=text,
+        metadata={"score": 1.0, "upload_id": upload_id, "chunk_index": chunk_index},
+    )
+
+
+def record(upload_id: int, chunk_index: int, text: str) -> models.Record:
+    return models.Record(
+        id=upload_id * 100 + chunk_index,
+        payload={"upload_id": upload_id, "chunk_index": chunk_index, "document": text},
+    )
+
+
+def test_join_chunks_drops_overlap() -> None:
+    assert (
+        join_chunks(["The quick brown fox jumps", "brown fox jumps over the dog"])
+        == "The quick brown fox jumps over the dog"
+    )
+
+
+def test_join_chunks_without_overlap() -> None:
+    assert (
+        join_chunks(["First chunk.", "Second chunk."]) == "First chunk.\nSecond chunk."
+    )
+
+
+def test_neighbour_filter_skips_documents_without_position() -> None:
+    assert neighbour_filter([chunk(1, None, "text")], 1, None) is None
+    scroll_filter = neighbour_filter([chunk(1, 3, "text")], 1, None)
+    assert scroll_filter is not None
+    assert isinstance(scroll_filter.should, list)
+    assert len(scroll_filter.should) == 1
+
+
+def test_merge_neighbours() -> None:
+    documents = [chunk(1, 2, "two"), chunk(1, 3, "three"), chunk(2, 0, "other")]
+    points = [
+        record(1, 1, "one"),
+        record(1, 2, "two"),
+        record(1, 3, "three"),
+        record(1, 4, "four"),
+        record(2, 1, "next"),
+    ]
+    merged = merge_neighbours(documents, points, neighbours=1)
+    # The second result is part of the first result's window
+    assert [document.page_content for document in merged] == [
+        "one\ntwo\nthree",
+        "other\nnext",
+    ]
+
+
+def test_apply_context_budget() -> None:
+    documents = [chunk(1, 0, "a" * 6), chunk(1, 1, "b" * 6), chunk(1, 2, "c" * 6)]
+    kept = apply_context_budget(documents, max_chars=10)
+    assert [document.page_content for document in kept] == ["a" * 6, "b" * 4]
+    assert apply_context_budget(documents, max_chars=None) == documents
+
+
+def test_retrieval_cache() -> None:
+    cache = RetrievalCache(ttl=60, max_size=2)
+    documents = [chunk(1, 0, "text")]
+    cache.set("a", documents)
+    cache.set("b", documents)
+    assert cache.get("a") == documents
+    # "b" is the least recently used entry
+    cache.set("c", documents)
+    assert cache.get("b") is None
+    assert cache.get("a") == documents
+
+
+def test_retrieval_cache_expiry() -> None:
+    cache = RetrievalCache(ttl=-1, max_size=2)
+    cache.set("a", [chunk(1, 0, "text")])
+    assert cache.get("a") is None
+
+
+def test_combine_modes() -> None:
+    assert combine_modes([RetrievalMode.SPARSE]) == RetrievalMode.SPARSE
+    assert combine_modes([RetrievalMode.DENSE] * 2) == RetrievalMode.DENSE
+    assert (
+        combine_modes([RetrievalMode.DENSE, RetrievalMode.SPARSE])
+        == RetrievalMode.HYBRID
+    )
+
+
+def test_hybrid_query_with_one_embedding() -> None:
+    sparse = models.SparseVector(indices=[1], values=[0.5])
+    kwargs = hybrid_query(
+        QueryEmbedding(dense=None, sparse=sparse), None, limit=5, prefetch_limit=10
+    )
+    assert kwargs["query"] == sparse
+    assert "prefetch" not in kwargs
+
+    kwargs = hybrid_query(
+        QueryEmbedding(dense=[0.1, 0.2], sparse=sparse),
+        None,
+        limit=5,
+        prefetch_limit=10,
+    )
+    assert len(kwargs["prefetch"]) == 2
+
+
+def test_to_query_request() -> None:
+    query_filter = models.Filter(
+        must=[models.FieldCondition(key="upload_id", match=models.MatchValue(value=1))]
+    )
+    search_params = models.SearchParams(hnsw_ef=64)
+    request = to_query_request(
+        hybrid_query(
+            QueryEmbedding(dense=[0.1, 0.2], sparse=None),
+            query_filter,
+            limit=5,
+            prefetch_limit=10,
+            search_params=search_params,
+        )
+    )
+    assert request.query == [0.1, 0.2]
+    assert request.filter == query_filter
+    assert request.params == search_params
+    assert request.limit == 5
@@ -0,0 +1,34 @@
+import asyncio
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.core.graph.skills.retriever_tool import create_retriever_tool
+
+
+class FakeRetriever(BaseRetriever):
+    """Retriever that reports whether it was called through the sync or async path."""
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return [Document(page_content=f"sync {query}")]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return [Document(page_content=f"async {query}")]
+
+
+def test_retriever_tool_run() -> None:
+    tool = create_retriever_tool(FakeRetriever())
+    assert tool.invoke({"query": "test"}) == "sync test"
+
+
+def test_retriever_tool_arun_uses_async_retrieval() -> None:
+    tool = create_retriever_tool(FakeRetriever())
+    assert asyncio.run(tool.ainvoke({"query": "test"})) == "async test"
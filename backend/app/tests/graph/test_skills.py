@@ -0,0 +1,50 @@
+from importlib.metadata import EntryPoint
+from typing import cast
+
+import pytest
+from langchain_core.tools import BaseTool
+
+from app.core.graph import skills
+from app.core.graph.skills import SkillInfo, load_plugin_skills
+from app.core.graph.skills.calculator import multiply as multiply_tool
+
+# The tool decorator is not typed as returning a tool
+multiply = cast(BaseTool, multiply_tool)
+created: list[BaseTool] = []
+
+
+def create_multiply() -> BaseTool:
+    created.append(multiply)
+    return multiply
+
+
+plugin_skill = SkillInfo(description="Multiplies numbers", create_tool=create_multiply)
+not_a_skill = "multiply"
+
+
+def test_skill_tool_is_created_on_first_use() -> None:
+    created.clear()
+    skill = SkillInfo(description="Multiplies numbers", create_tool=create_multiply)
+    assert created == []
+    assert skill.tool is multiply
+    assert skill.tool is multiply
+    assert created == [multiply]
+
+
+def test_builtin_skills_are_listed_without_creating_tools() -> None:
+    for skill in skills.builtin_skills.values():
+        assert skill.description
+        assert skill._tool is None
+
+
+def test_load_plugin_skills(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        skills,
+        "entry_points",
+        lambda group: [
+            EntryPoint("multiply", f"{__name__}:plugin_skill", group),
+            EntryPoint("broken", f"{__name__}:missing", group),
+            EntryPoint("invalid", f"{__name__}:not_a_skill", group),
+        ],
+    )
+    assert load_plugin_skills() == {"multiply": plugin_skill}
@@ -6,5 +6,8 @@ python /app/app/backend_pre_start.py
 # Run migrations
 alembic upgrade head
 
+# Create or migrate the Qdrant collection
+python /app/app/qdrant_pre_start.py
+
 # Create initial data in DB
 python /app/app/initial_data.py
@@ -26,6 +26,7 @@ export type { MembersOut } from './models/MembersOut';
 export type { MemberUpdate } from './models/MemberUpdate';
 export type { Message } from './models/Message';
 export type { NewPassword } from './models/NewPassword';
+export type { RetrievalMode } from './models/RetrievalMode';
 export type { Skill } from './models/Skill';
 export type { SkillCreate } from './models/SkillCreate';
 export type { SkillOut } from './models/SkillOut';
@@ -77,6 +78,7 @@ export { $MembersOut } from './schemas/$MembersOut';
 export { $MemberUpdate } from './schemas/$MemberUpdate';
 export { $Message } from './schemas/$Message';
 export { $NewPassword } from './schemas/$NewPassword';
+export { $RetrievalMode } from './schemas/$RetrievalMode';
 export { $Skill } from './schemas/$Skill';
 export { $SkillCreate } from './schemas/$SkillCreate';
 export { $SkillOut } from './schemas/$SkillOut';
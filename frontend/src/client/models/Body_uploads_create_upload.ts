@@ -3,11 +3,14 @@
 /* tslint:disable */
 /* eslint-disable */
 
+import type { RetrievalMode } from './RetrievalMode';
+
 export type Body_uploads_create_upload = {
     name: string;
     description: string;
     file: Blob;
     chunk_size: number;
     chunk_overlap: number;
+    retrieval_mode?: RetrievalMode;
 };
 
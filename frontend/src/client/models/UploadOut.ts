@@ -3,6 +3,7 @@
 /* tslint:disable */
 /* eslint-disable */
 
+import type { RetrievalMode } from './RetrievalMode';
 import type { UploadStatus } from './UploadStatus';
 
 export type UploadOut = {
@@ -11,5 +12,11 @@ export type UploadOut = {
     id: number;
     last_modified: string;
     status: UploadStatus;
+    retrieval_mode: RetrievalMode;
+    pages_total: (number | null);
+    pages_processed: number;
+    chunks_embedded: number;
+    ingestion_started_at: (string | null);
+    readonly eta: (number | null);
 };
 
@@ -25,5 +25,8 @@ export const $Body_uploads_create_upload = {
             type: 'number',
             isRequired: true,
         },
+        retrieval_mode: {
+            type: 'RetrievalMode',
+        },
     },
 } as const;
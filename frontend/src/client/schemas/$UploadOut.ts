@@ -25,5 +25,46 @@ export const $UploadOut = {
             type: 'UploadStatus',
             isRequired: true,
         },
+        retrieval_mode: {
+            type: 'RetrievalMode',
+            isRequired: true,
+        },
+        pages_total: {
+            type: 'any-of',
+            contains: [{
+                type: 'number',
+            }, {
+                type: 'null',
+            }],
+            isRequired: true,
+        },
+        pages_processed: {
+            type: 'number',
+            isRequired: true,
+        },
+        chunks_embedded: {
+            type: 'number',
+            isRequired: true,
+        },
+        ingestion_started_at: {
+            type: 'any-of',
+            contains: [{
+                type: 'string',
+                format: 'date-time',
+            }, {
+                type: 'null',
+            }],
+            isRequired: true,
+        },
+        eta: {
+            type: 'any-of',
+            contains: [{
+                type: 'number',
+            }, {
+                type: 'null',
+            }],
+            isReadOnly: true,
+            isRequired: true,
+        },
     },
 } as const;
@@ -126,7 +126,11 @@ const MessageBox = ({ message, onResume }: MessageBoxProps) => {
         {documents && (
           <Accordion mt={2} allowMultiple>
             {(
-              JSON.parse(documents) as { score: number; content: string }[]
+              JSON.parse(documents) as {
+                score: number
+                content: string
+                source?: string
+              }[]
             ).map((document, index) => (
               <AccordionItem key={index}>
                 <h2>
@@ -136,6 +140,7 @@ const MessageBox = ({ message, onResume }: MessageBoxProps) => {
                         <Text flex={1} noOfLines={1}>
                           {document.content}
                         </Text>
+                        {document.source && <Tag>{document.source}</Tag>}
                         <Tag ml="auto" mr={0}>
                           {document.score.toFixed(2)}
                         </Tag>
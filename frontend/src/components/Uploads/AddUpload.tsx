@@ -16,6 +16,7 @@ import {
   NumberInput,
   NumberInputField,
   NumberInputStepper,
+  Select,
 } from "@chakra-ui/react"
 import { type SubmitHandler, useForm, Controller } from "react-hook-form"
 import { useMutation, useQueryClient } from "react-query"
@@ -48,6 +49,7 @@ const AddUpload = ({ isOpen, onClose }: AddUploadProps) => {
     defaultValues: {
       chunk_size: 500,
       chunk_overlap: 50,
+      retrieval_mode: "hybrid",
     },
   })
 
@@ -181,6 +183,14 @@ const AddUpload = ({ isOpen, onClose }: AddUploadProps) => {
                 </FormControl>
               )}
             />
+            <FormControl mt={4}>
+              <FormLabel htmlFor="retrieval_mode">Retrieval Mode</FormLabel>
+              <Select id="retrieval_mode" {...register("retrieval_mode")}>
+                <option value="hybrid">Hybrid</option>
+                <option value="dense">Dense only (semantic)</option>
+                <option value="sparse">Sparse only (keywords)</option>
+              </Select>
+            </FormControl>
           </ModalBody>
           <ModalFooter gap={3}>
             <Button
@@ -10,6 +10,7 @@ import {
   Th,
   Tbody,
   Td,
+  Text,
 } from "@chakra-ui/react"
 import { createFileRoute } from "@tanstack/react-router"
 import { useQuery } from "react-query"
@@ -71,7 +72,18 @@ function Uploads() {
                       <Td>{upload.id}</Td>
                       <Td>{upload.name}</Td>
                       <Td>{upload.last_modified}</Td>
-                      <Td>{upload.status}</Td>
+                      <Td>
+                        {upload.status}
+                        {upload.status === "In Progress" &&
+                          !!upload.pages_total && (
+                            <Text fontSize="sm" color="gray.500">
+                              {upload.pages_processed}/{upload.pages_total}{" "}
+                              pages
+                              {upload.eta !== null &&
+                                ` · ~${Math.ceil(upload.eta / 60)} min left`}
+                            </Text>
+                          )}
+                      </Td>
                       <Td>
                         <ActionsMenu type={"Upload"} value={upload} />
                       </Td>